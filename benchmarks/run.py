@@ -0,0 +1,264 @@
+"""Benchmark the collection and compilation of synthetic LaTeX projects.
+
+Each case generates a project with a number of LaTeX tasks whose documents include a
+tree of files with a given depth. All documents share the tree and each document has
+one file of its own. Every case runs in a fresh process and measures
+
+- the time to collect the tasks with pytask,
+- the time to scan all documents for dependencies with a cold and a warm cache,
+- the time of the whole build, and
+- the peak resident memory of the process.
+
+The build uses a compilation step which writes the document without TeX to measure the
+overhead of pytask and pytask-latex. Pass ``--toolchain fake-latexmk`` to run latexmk
+from the fake TeX toolchain in :mod:`pytask_latex.testing`, which adds the overhead of
+subprocesses, or ``--toolchain latexmk`` to compile the documents with TeX.
+
+The results are written as JSON to ``benchmarks/results/<timestamp>.json`` together with
+information about the environment. Pass ``--compare`` with an older result to show the
+relative changes.
+
+.. code-block:: console
+
+    $ python benchmarks/run.py --tasks 1 100 10000 --depths 1 100
+    $ python benchmarks/run.py --compare benchmarks/results/20240101-120000.json
+
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+TASK_MODULE = """
+from pathlib import Path
+
+from pytask import mark
+from pytask import task
+
+from pytask_latex import compilation_steps as cs
+
+
+def write_document(path_to_tex, path_to_document):
+    path_to_document.write_bytes(path_to_tex.read_bytes())
+
+
+STEPS = {{
+    "fake": write_document,
+    "fake-latexmk": cs.latexmk(),
+    "latexmk": cs.latexmk(),
+}}
+
+for i in range({n_tasks}):
+
+    @task(id=str(i))
+    @mark.latex(
+        script=Path(f"document_{{i}}.tex"),
+        document=Path(f"bld/document_{{i}}.pdf"),
+        compilation_steps=STEPS[{toolchain!r}],
+    )
+    def task_compile_document():
+        pass
+"""
+
+DOCUMENT = r"""
+\documentclass{{article}}
+\begin{{document}}
+\input{{tree/level_0}}
+\input{{own/section_{i}}}
+\end{{document}}
+"""
+
+
+def create_project(root: Path, n_tasks: int, depth: int, toolchain: str) -> None:
+    """Create a project with LaTeX tasks and an include tree."""
+    root.joinpath("task_documents.py").write_text(
+        TASK_MODULE.format(n_tasks=n_tasks, toolchain=toolchain)
+    )
+    root.joinpath("tree").mkdir()
+    for level in range(depth):
+        content = f"Level {level}.\n"
+        if level + 1 < depth:
+            content += f"\\input{{tree/level_{level + 1}}}\n"
+        root.joinpath("tree", f"level_{level}.tex").write_text(content)
+
+    root.joinpath("own").mkdir()
+    for i in range(n_tasks):
+        root.joinpath(f"document_{i}.tex").write_text(
+            textwrap.dedent(DOCUMENT.format(i=i))
+        )
+        root.joinpath("own", f"section_{i}.tex").write_text(f"Section {i}.\n")
+
+
+def run_case(n_tasks: int, depth: int, toolchain: str) -> dict[str, Any]:
+    """Run one case and return the measurements.
+
+    This function is executed in a fresh process to measure the peak memory.
+
+    """
+    from pytask import ExitCode  # noqa: PLC0415
+    from pytask import build  # noqa: PLC0415
+
+    from pytask_latex.scanner import IncludeGraph  # noqa: PLC0415
+    from pytask_latex.scanner import ScanCache  # noqa: PLC0415
+    from pytask_latex.scanner import scan_documents  # noqa: PLC0415
+    from pytask_latex.testing import FakeTeXToolchain  # noqa: PLC0415
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = Path(tmp_dir)
+        create_project(root, n_tasks, depth, toolchain)
+        if toolchain == "fake-latexmk":
+            fake_tex = FakeTeXToolchain(root / "bin")
+            fake_tex.install()
+            os.environ["PATH"] = fake_tex.path
+        paths_to_tex = [root / f"document_{i}.tex" for i in range(n_tasks)]
+
+        start = time.perf_counter()
+        scan_documents(paths_to_tex, IncludeGraph())
+        scan_time_cold = time.perf_counter() - start
+
+        session = build(paths=root, capture="sys", verbose=0)
+        if session.exit_code != ExitCode.OK:
+            msg = f"The build failed with exit code {session.exit_code}."
+            raise RuntimeError(msg)
+
+        cache = ScanCache(path=root / ".pytask" / "latex" / "scan_cache.json")
+        cache.load()
+        start = time.perf_counter()
+        scan_documents(paths_to_tex, IncludeGraph(cache))
+        scan_time_warm = time.perf_counter() - start
+
+    return {
+        "n_tasks": n_tasks,
+        "depth": depth,
+        "toolchain": toolchain,
+        "collection_time": session.collection_end - session.collection_start,
+        "scan_time_cold": scan_time_cold,
+        "scan_time_warm": scan_time_warm,
+        "build_time": session.execution_end - session.collection_start,
+        "peak_memory": _get_peak_memory(),
+    }
+
+
+def _get_peak_memory() -> int | None:
+    """Return the peak resident memory of the process in bytes."""
+    try:
+        import resource  # noqa: PLC0415
+    except ImportError:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def _run_case_in_subprocess(n_tasks: int, depth: int, toolchain: str) -> dict[str, Any]:
+    cmd = [
+        sys.executable,
+        __file__,
+        "--case",
+        json.dumps({"n_tasks": n_tasks, "depth": depth, "toolchain": toolchain}),
+    ]
+    result = subprocess.run(cmd, check=True, capture_output=True, text=True)  # noqa: S603
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def _get_environment() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],  # noqa: S607
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pytask": version("pytask"),
+        "pytask-latex": version("pytask-latex"),
+    }
+
+
+def _compare(results: list[dict[str, Any]], path: Path) -> None:
+    """Print the relative changes compared to older results."""
+    old = {
+        (r["n_tasks"], r["depth"], r["toolchain"]): r
+        for r in json.loads(path.read_text())["results"]
+    }
+    metrics = (
+        "collection_time",
+        "scan_time_cold",
+        "scan_time_warm",
+        "build_time",
+        "peak_memory",
+    )
+    for result in results:
+        reference = old.get((result["n_tasks"], result["depth"], result["toolchain"]))
+        if reference is None:
+            continue
+        changes = ", ".join(
+            f"{metric} {result[metric] / reference[metric] - 1:+.1%}"
+            for metric in metrics
+            if result[metric] and reference[metric]
+        )
+        print(f"tasks={result['n_tasks']} depth={result['depth']}: {changes}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    """Run the benchmarks."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--tasks", nargs="+", type=int, default=[1, 10, 100, 1_000, 10_000]
+    )
+    parser.add_argument("--depths", nargs="+", type=int, default=[1, 10, 100])
+    parser.add_argument(
+        "--toolchain", choices=["fake", "fake-latexmk", "latexmk"], default="fake"
+    )
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None)
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        print(json.dumps(run_case(**json.loads(args.case))))
+        return
+
+    results = []
+    for n_tasks in args.tasks:
+        for depth in args.depths:
+            result = _run_case_in_subprocess(n_tasks, depth, args.toolchain)
+            print(
+                f"tasks={n_tasks:>6} depth={depth:>4} "
+                f"collection={result['collection_time']:.3f}s "
+                f"scan={result['scan_time_cold']:.3f}s/{result['scan_time_warm']:.3f}s "
+                f"build={result['build_time']:.3f}s"
+            )
+            results.append(result)
+
+    output = args.output or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(
+        json.dumps({"environment": _get_environment(), "results": results}, indent=2)
+    )
+    print(f"Results are written to {output}.")
+
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
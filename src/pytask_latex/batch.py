@@ -0,0 +1,270 @@
+"""Contains the compilation of several documents with one call to latexmk.
+
+latexmk accepts multiple root files. Every call starts a Perl interpreter and analyzes
+the dependencies of the documents which is a large fixed cost for small documents. The
+step :func:`~pytask_latex.compilation_steps.latexmk` with ``batch=True`` opts into
+compiling compatible documents together.
+
+When the first task of a group is set up, the other tasks of the group whose upstream
+tasks have already been executed are planned into one :class:`Batch`. The step of the
+first task which runs compiles the whole batch. The other tasks receive their result
+when they are executed, so success and failure are still reported per task. Tasks whose
+documents are up to date are skipped by pytask as usual, and latexmk does not rebuild
+them.
+
+Batches are only formed if tasks are executed sequentially in one process and without a
+scratch directory.
+
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
+from subprocess import CalledProcessError
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import cast
+
+from pytask import PPathNode
+from pytask import PTask
+from pytask import PythonNode
+from pytask import Session
+from pytask import has_mark
+from pytask import hookimpl
+
+from pytask_latex.errors import ErrorWatcher
+from pytask_latex.logs import TAIL_LINES
+from pytask_latex.logs import get_current_log
+from pytask_latex.utils import is_skipped
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+
+_BatchKey = tuple[tuple[str, ...], Path]
+
+
+@dataclass
+class Batch:
+    """Documents which are compiled with one call to latexmk.
+
+    Attributes
+    ----------
+    options
+        The options passed to latexmk.
+    output_directory
+        The directory where latexmk writes the documents and auxiliary files.
+    documents
+        A mapping from the LaTeX source files to the documents.
+    errors
+        The errors of the documents after the batch is compiled, ``None`` for documents
+        which compiled successfully.
+    task_name
+        The name of the task which compiled the batch.
+    log_path
+        The log file with the output of latexmk.
+
+    """
+
+    options: tuple[str, ...]
+    output_directory: Path
+    documents: dict[Path, Path]
+    errors: dict[Path, CalledProcessError | None] | None = None
+    task_name: str = ""
+    log_path: Path | None = None
+
+    def run(self, path_to_tex: Path, *, executable: str, task_name: str) -> None:
+        """Compile the batch if necessary and raise the error of a document, if any."""
+        if self.errors is None:
+            self._compile(executable, task_name)
+        else:
+            self._write_note()
+        errors = cast("dict[Path, CalledProcessError | None]", self.errors)
+        error = errors[path_to_tex]
+        if error is not None:
+            raise error
+
+    def _compile(self, executable: str, task_name: str) -> None:
+        cmd = [
+            executable,
+            *self.options,
+            f"--output-directory={self.output_directory.as_posix()}",
+            *(path.as_posix() for path in self.documents),
+        ]
+        paths_to_logs = {
+            path: self.output_directory / f"{path.stem}.log" for path in self.documents
+        }
+        before = {path: _get_signature(log) for path, log in paths_to_logs.items()}
+
+        # Imported here to avoid circular imports. Importing pytask loads the plugin.
+        from pytask_latex.metrics import run_command  # noqa: PLC0415
+
+        returncode = run_command(cmd, check=False).returncode
+
+        log = get_current_log()
+        self.task_name = task_name
+        self.log_path = None if log is None else log.path
+        self.errors = {}
+        for path_to_tex, path_to_document in self.documents.items():
+            path_to_log = paths_to_logs[path_to_tex]
+            output = _read_tail(path_to_log)
+            is_rewritten = _get_signature(path_to_log) != before[path_to_tex]
+            failed = bool(returncode) and (
+                not path_to_document.exists()
+                or (is_rewritten and _has_error(output.splitlines()))
+            )
+            self.errors[path_to_tex] = (
+                CalledProcessError(returncode, cmd, output=output) if failed else None
+            )
+
+    def _write_note(self) -> None:
+        """Point the log file of a task to the output of the batch."""
+        log = get_current_log()
+        if log is None or log.path is None:
+            return
+        note = f"The document was compiled together with {self.task_name!r}."
+        if self.log_path is not None:
+            note += f" The output of latexmk is in {self.log_path}."
+        log.path.write_text(note + "\n")
+
+
+@dataclass
+class Batches:
+    """The planned batches of a session.
+
+    Attributes
+    ----------
+    batches
+        A mapping from the LaTeX source files to the batches which compile them.
+
+    """
+
+    batches: dict[Path, Batch] = field(default_factory=dict)
+    _groups: dict[_BatchKey, list[PTask]] | None = field(default=None, repr=False)
+
+    def add(self, batch: Batch) -> None:
+        """Plan a batch."""
+        for path_to_tex in batch.documents:
+            self.batches[path_to_tex] = batch
+
+    def pop(self, path_to_tex: Path) -> Batch | None:
+        """Return the batch of a LaTeX source file, if any, and remove the entry."""
+        return self.batches.pop(path_to_tex, None)
+
+    def get_group(self, session: Session, key: _BatchKey) -> list[PTask]:
+        """Get the tasks of the session which can be compiled with the same call."""
+        if self._groups is None:
+            self._groups = {}
+            for task in session.tasks:
+                if has_mark(task, "latex") and not is_skipped(task):
+                    task_key = _get_batch_key(task)
+                    if task_key is not None:
+                        self._groups.setdefault(task_key, []).append(task)
+        return self._groups.get(key, [])
+
+
+def get_batch_options(step: Callable[..., Any]) -> tuple[str, ...] | None:
+    """Get the latexmk options of a step which compiles documents in batches."""
+    return getattr(step, "batch_options", None)
+
+
+def _get_batch_key(task: PTask) -> _BatchKey | None:
+    """Get the key of the tasks which can be compiled with one call to latexmk.
+
+    Only tasks with a single batching step are grouped. Since latexmk names the outputs
+    after the source files, the document must have the same name.
+
+    """
+    steps = task.depends_on["_compilation_steps"]
+    if not isinstance(steps, PythonNode):
+        return None
+    steps = cast("list[Callable[..., Any]]", steps.value)
+    path_to_tex, path_to_document = _get_documents(task)
+    if len(steps) != 1 or path_to_tex.stem != path_to_document.stem:
+        return None
+    options = get_batch_options(steps[0])
+    if options is None:
+        return None
+    return options, path_to_document.parent
+
+
+def _get_documents(task: PTask) -> tuple[Path, Path]:
+    path_to_tex = cast("PPathNode", task.depends_on["_path_to_tex"])
+    path_to_document = cast("PPathNode", task.produces["_path_to_document"])
+    return cast("Path", path_to_tex.path), cast("Path", path_to_document.path)
+
+
+def _get_upstream_tasks(session: Session, task: PTask) -> set[str]:
+    tasks = {t.signature for t in session.tasks}
+    return session.dag.ancestors(task.signature) & tasks
+
+
+def _get_signature(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_tail(path: Path) -> str:
+    if not path.exists():
+        return ""
+    lines = path.read_text(encoding="utf-8", errors="replace").splitlines()
+    return "\n".join(lines[-TAIL_LINES:])
+
+
+def _has_error(lines: list[str]) -> bool:
+    watcher = ErrorWatcher()
+    for line in lines:
+        if watcher(line):
+            break
+    return watcher.error is not None
+
+
+@hookimpl(trylast=True)
+def pytask_execute_task_setup(session: Session, task: PTask) -> None:
+    """Plan a batch with the tasks which can be compiled together with this task.
+
+    The other tasks of the group must not be executed yet, and their upstream tasks
+    must be upstream tasks of this task, so that their dependencies are up to date.
+    Tasks whose products will be restored from the output cache are not compiled.
+
+    """
+    batches = session.config.get("latex_batches")
+    if (
+        batches is None
+        or session.config.get("n_workers", 1) > 1
+        or session.config.get("latex_scratch_dir") is not None
+        or not has_mark(task, "latex")
+    ):
+        return
+
+    key = _get_batch_key(task)
+    if key is None:
+        return
+    path_to_tex, path_to_document = _get_documents(task)
+    if path_to_tex in batches.batches:
+        return
+
+    # Imported here to avoid circular imports. Importing pytask loads the plugin.
+    from pytask_latex.store import is_restorable  # noqa: PLC0415
+
+    executed = {report.task.signature for report in session.execution_reports}
+    upstream = _get_upstream_tasks(session, task)
+    documents = {path_to_tex: path_to_document}
+    for other in batches.get_group(session, key):
+        other_tex, other_document = _get_documents(other)
+        if (
+            other is not task
+            and other.signature not in executed
+            and other_tex not in batches.batches
+            and _get_upstream_tasks(session, other) <= upstream
+            and not is_restorable(session, other)
+        ):
+            documents[other_tex] = other_document
+
+    if len(documents) > 1:
+        batches.add(Batch(*key, documents=documents))
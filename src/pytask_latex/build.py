@@ -0,0 +1,26 @@
+"""Extend the build command."""
+
+from __future__ import annotations
+
+import click
+from pytask import hookimpl
+
+
+@hookimpl
+def pytask_extend_command_line_interface(cli: click.Group) -> None:
+    """Extend the command line interface."""
+    additional_parameters = [
+        click.Option(
+            ["--clear-latex-cache"],
+            is_flag=True,
+            default=False,
+            help="Clear the caches of pytask-latex before the build.",
+        ),
+        click.Option(
+            ["--watch-latex"],
+            is_flag=True,
+            default=False,
+            help="Keep running and execute the tasks affected by changed files again.",
+        ),
+    ]
+    cli.commands["build"].params.extend(additional_parameters)
@@ -2,16 +2,20 @@
 
 from __future__ import annotations
 
+import hashlib
+import shutil
 import warnings
+from contextlib import contextmanager
+from contextlib import nullcontext
 from pathlib import Path
 from subprocess import CalledProcessError
 from typing import TYPE_CHECKING
 from typing import Any
 
-import latex_dependency_scanner as lds
 from pytask import Mark
 from pytask import NodeInfo
 from pytask import NodeNotCollectedError
+from pytask import NodeNotFoundError
 from pytask import PathNode
 from pytask import PNode
 from pytask import PPathNode
@@ -29,13 +33,23 @@ from pytask import remove_marks
 from pytask.tree_util import tree_leaves
 from pytask.tree_util import tree_map
 
-from pytask_latex import compilation_steps as cs
+from pytask_latex.utils import accepts_context
 from pytask_latex.utils import to_list
 
 if TYPE_CHECKING:
     from collections.abc import Callable
+    from collections.abc import Generator
     from collections.abc import Sequence
 
+    from pytask_latex.compilation_steps import CompilationContext
+    from pytask_latex.filesystem import FileSystemIndex
+    from pytask_latex.scanner import IncludeGraph
+
+
+_DELAY_MARK = Mark("try_last", (), {})
+"""Mark: The marker which delays tasks whose documents include unresolved files. It is
+recognized by its identity, so that a marker added by the user is never removed."""
+
 
 def latex(
     *,
@@ -45,10 +59,12 @@ def latex(
     | Callable[..., Any]
     | Sequence[str | Callable[..., Any]]
     | None = None,
+    resources: dict[str, int] | None = None,
 ) -> tuple[
     str | Path,
     str | Path,
     str | Callable[..., Any] | Sequence[str | Callable[..., Any]] | None,
+    dict[str, int] | None,
 ]:
     """Specify command line options for latexmk.
 
@@ -60,15 +76,19 @@ def latex(
         The path to the compiled document.
     compilation_steps
         Compilation steps to compile the document.
+    resources
+        The resources the compilation demands, a ``"weight"`` and the ``"memory"`` in
+        megabytes, which are limited by the configuration value ``latex_resources``.
 
     """
-    return script, document, compilation_steps
+    return script, document, compilation_steps, resources
 
 
 def compile_latex_document(
     _compilation_steps: list[Callable[..., Any]],
     _path_to_tex: Path,
     _path_to_document: Path,
+    _context: CompilationContext | None = None,
     **kwargs: Any,  # noqa: ARG001
 ) -> None:
     """Compile a LaTeX document iterating over compilations steps.
@@ -76,15 +96,78 @@ def compile_latex_document(
     Replaces the placeholder function provided by the user.
 
     """
+    # Imported here to keep the startup of pytask fast and to avoid circular imports.
+    # Importing pytask loads the plugin.
+    from pytask_latex.errors import FatalTeXError  # noqa: PLC0415
+    from pytask_latex.logs import capture_output  # noqa: PLC0415
+    from pytask_latex.metrics import measure_step  # noqa: PLC0415
+
+    if _context is None:
+        from pytask_latex.compilation_steps import CompilationContext  # noqa: PLC0415
+
+        _context = CompilationContext(cache_dir=Path.cwd() / ".pytask" / "latex")
+
+    resource_pool = _context.resource_pool
     try:
-        for step in _compilation_steps:
-            step(path_to_tex=_path_to_tex, path_to_document=_path_to_document)
+        with (
+            resource_pool.acquire(_context.resources)
+            if resource_pool is not None
+            else nullcontext(),
+            capture_output(_context.log_path),
+            _use_scratch_dir(_context.scratch_dir),
+        ):
+            for step in _compilation_steps:
+                step_kwargs = {
+                    "path_to_tex": _path_to_tex,
+                    "path_to_document": _path_to_document,
+                }
+                if accepts_context(step):
+                    step_kwargs["context"] = _context
+                with measure_step(
+                    _context.task_name,
+                    _get_step_name(step),
+                    _path_to_document,
+                    _context.metrics_path,
+                ):
+                    step(**step_kwargs)
     except CalledProcessError as e:
-        step_name = getattr(step, "__name__", step.__class__.__name__)
-        msg = f"Compilation step {step_name} failed."
+        parts = [f"Compilation step {_get_step_name(step)} failed."]
+        if isinstance(e, FatalTeXError):
+            parts = [
+                f"Compilation step {_get_step_name(step)} failed with a fatal error:",
+                str(e.error),
+            ]
+        if e.output:
+            parts += ["The last lines of the output are:", e.output]
+        if _context.log_path is not None:
+            parts.append(f"The full output is in {_context.log_path}.")
+        msg = "\n\n".join(parts)
         raise RuntimeError(msg) from e
 
 
+@contextmanager
+def _use_scratch_dir(scratch_dir: Path | None) -> Generator[None, None, None]:
+    """Create an empty scratch directory and remove it after the compilation.
+
+    The directory is also removed if a step fails or the build is interrupted. Leftovers
+    of processes which were killed are removed before the next compilation.
+
+    """
+    if scratch_dir is None:
+        yield
+        return
+    shutil.rmtree(scratch_dir, ignore_errors=True)
+    scratch_dir.mkdir(parents=True)
+    try:
+        yield
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def _get_step_name(step: Callable[..., Any]) -> str:
+    return getattr(step, "__name__", step.__class__.__name__)
+
+
 @hookimpl
 def pytask_collect_task(
     session: Session, path: Path | None, name: str, obj: Any
@@ -97,6 +180,8 @@ def pytask_collect_task(
         and is_task_function(obj)
         and has_mark(obj, "latex")
     ):
+        from pytask_latex.compilation_steps import CompilationContext  # noqa: PLC0415
+
         # Parse the @pytask.mark.latex decorator.
         obj, marks = remove_marks(obj, "latex")
         if len(marks) > 1:
@@ -106,9 +191,17 @@ def pytask_collect_task(
             )
             raise ValueError(msg)
         latex_mark = marks[0]
-        script, document, compilation_steps = latex(**latex_mark.kwargs)
+        script, document, compilation_steps, resources = latex(**latex_mark.kwargs)
         parsed_compilation_steps = _parse_compilation_steps(compilation_steps)
 
+        # Imported here to avoid circular imports. Importing pytask loads the plugin.
+        from pytask_latex.resources import parse_resources  # noqa: PLC0415
+
+        resources = parse_resources(resources, "resources")
+        resource_pool = session.config.get("latex_resource_pool")
+        if resource_pool is not None:
+            resource_pool.check(resources, name)
+
         pytask_meta = getattr(obj, "pytask_meta", None)
         if pytask_meta is not None:
             pytask_meta.markers.append(latex_mark)
@@ -183,6 +276,35 @@ def pytask_collect_task(
             ),
         )
 
+        context_node = session.hook.pytask_collect_node(
+            session=session,
+            path=path_nodes,
+            node_info=NodeInfo(
+                arg_name="_context",
+                path=(),
+                value=CompilationContext(
+                    cache_dir=session.config["latex_cache_dir"],
+                    build_dir=_get_build_dir(
+                        session.config["latex_cache_dir"], path, name
+                    ),
+                    scratch_dir=_get_scratch_dir(
+                        session.config.get("latex_scratch_dir"), path, name
+                    ),
+                    task_name=name,
+                    metrics_path=session.config.get("latex_metrics_path"),
+                    log_path=_get_log_path(
+                        session.config["latex_cache_dir"], path, name
+                    ),
+                    resources=resources,
+                    resource_pool=resource_pool,
+                    toolchain=session.config.get("latex_toolchain"),
+                    batches=session.config.get("latex_batches"),
+                ),
+                task_path=path,
+                task_name=name,
+            ),
+        )
+
         # Parse other dependencies and products.
         dependencies = parse_dependencies_from_task_function(
             session, path, name, path_nodes, obj
@@ -194,6 +316,7 @@ def pytask_collect_task(
         # Add script and document
         dependencies["_path_to_tex"] = script_node
         dependencies["_compilation_steps"] = compilation_steps_node
+        dependencies["_context"] = context_node
         products["_path_to_document"] = document_node
 
         markers = pytask_meta.markers if pytask_meta is not None else []
@@ -225,19 +348,198 @@ def pytask_collect_task(
 def pytask_collect_modify_tasks(session: Session, tasks: list[PTask]) -> None:
     """Add dependencies from from LaTeX documents to tasks."""
     if session.config["infer_latex_dependencies"]:
-        all_products = {
-            product.path
-            for task in tasks
-            for product in tree_leaves(task.produces)  # ty: ignore[invalid-argument-type]
-            if isinstance(product, PPathNode)
-        }
         latex_tasks = [task for task in tasks if has_mark(task, "latex")]
-        for task in latex_tasks:
-            _add_latex_dependencies_retroactively(task, session, all_products)
+        if not latex_tasks:
+            return
+
+        # The scanner is only imported if there are LaTeX tasks to keep the startup of
+        # pytask fast.
+        from pytask_latex.filesystem import FileSystemIndex  # noqa: PLC0415
+        from pytask_latex.scanner import IncludeGraph  # noqa: PLC0415
+        from pytask_latex.scanner import ScanBackend  # noqa: PLC0415
+        from pytask_latex.scanner import ScanCache  # noqa: PLC0415
+        from pytask_latex.scanner import scan_documents  # noqa: PLC0415
+
+        scan_cache = ScanCache(
+            path=session.config["latex_cache_dir"] / "scan_cache.json",
+            max_entries=session.config["latex_scan_cache_size"],
+        )
+        scan_cache.load()
+        graph = IncludeGraph(scan_cache, FileSystemIndex())
+        session.config["latex_include_graph"] = graph
+
+        paths_to_tex = [
+            node.path
+            for task in latex_tasks
+            if isinstance(node := task.depends_on["_path_to_tex"], PPathNode)
+        ]
+        scan_results = scan_documents(
+            paths_to_tex,  # ty: ignore[invalid-argument-type]
+            graph,
+            backend=ScanBackend(session.config["latex_scan_backend"]),
+            n_workers=session.config["latex_scan_workers"],
+        )
+        scan_cache.save()
+
+        add_latex_dependencies(session, tasks, scan_results)
+
+
+def add_latex_dependencies(
+    session: Session,
+    tasks: list[PTask],
+    scan_results: dict[Path, list[Path] | Exception],
+) -> None:
+    """Add the files included by the scanned LaTeX documents to the LaTeX tasks.
+
+    Dependencies which have been added by an earlier scan are replaced.
+
+    """
+    all_products = _get_all_products(tasks)
+    for task in tasks:
+        if has_mark(task, "latex"):
+            _add_latex_dependencies_retroactively(
+                task, session, all_products, scan_results
+            )
+
+
+def rescan_latex_dependencies(session: Session, task: PTask) -> None:
+    """Scan the document of a task again before it is executed.
+
+    Files which are generated by other tasks might not exist during the collection or
+    they have been changed by the execution, so the files they include are unknown. If
+    the document includes generated TeX files, the products of all tasks are resolved
+    again, and the newly discovered dependencies are added to the task and the DAG.
+    Edges of files which the document does not include anymore are removed. pytask
+    records the states of the dependencies after the task is executed, so that later
+    builds skip the task if none of them changed.
+
+    The scan cache is saved once after all tasks are executed.
+
+    """
+    graph: IncludeGraph | None = session.config.get("latex_include_graph")
+    path_to_tex = task.depends_on["_path_to_tex"]
+    if (
+        graph is None
+        or not isinstance(path_to_tex, PPathNode)
+        or not _includes_generated_tex_files(session, task)
+    ):
+        return
+
+    from pytask_latex.scanner import scan_documents  # noqa: PLC0415
+
+    all_products = _get_all_products(session.tasks)
+    graph.invalidate(all_products)
+    scan_results = scan_documents([path_to_tex.path], graph)  # ty: ignore[invalid-argument-type]
+    previous = tree_leaves(task.depends_on.get("_scanned_dependencies", []))  # ty: ignore[invalid-argument-type]
+    _add_latex_dependencies_retroactively(task, session, all_products, scan_results)
+    _check_producers_of_scanned_dependencies(session, task)
+    update_dag(session, task, previous)
+
+
+def _get_all_products(tasks: list[PTask]) -> set[Path]:
+    return {
+        product.path
+        for task in tasks
+        for product in tree_leaves(task.produces)  # ty: ignore[invalid-argument-type]
+        if isinstance(product, PPathNode)
+    }
+
+
+def _includes_generated_tex_files(session: Session, task: PTask) -> bool:
+    """Check whether the task depends on TeX files which are produced by other tasks."""
+    from latex_dependency_scanner.scanner import COMMON_TEX_EXTENSIONS  # noqa: PLC0415
+
+    dag = session.dag
+    return any(
+        isinstance(node, PPathNode)
+        and node.path.suffix in COMMON_TEX_EXTENSIONS
+        and node.signature in dag.nodes
+        and any(True for _ in dag.predecessors(node.signature))
+        for node in tree_leaves(task.depends_on)  # ty: ignore[invalid-argument-type]
+    )
+
+
+def _check_producers_of_scanned_dependencies(session: Session, task: PTask) -> None:
+    """Check that the scanned dependencies are not produced by pending tasks.
+
+    Raises
+    ------
+    NodeNotFoundError
+        If a dependency is produced by a task which has not been executed yet.
+
+    """
+    dag = session.dag
+    executed = {report.task.signature for report in session.execution_reports}
+    for node in tree_leaves(task.depends_on["_scanned_dependencies"]):  # ty: ignore[invalid-argument-type]
+        if node.signature not in dag.nodes:
+            continue
+        producers = [
+            dag.nodes[signature].name
+            for signature in dag.predecessors(node.signature)
+            if signature not in executed
+        ]
+        if producers:
+            msg = (
+                f"The document of task {task.name!r} includes {node.name!r} which is "
+                f"produced by {', '.join(producers)}, but the task has not been "
+                "executed yet. Add the file as a dependency of the task."
+            )
+            raise NodeNotFoundError(msg)
+
+
+def update_dag(session: Session, task: PTask, previous: list[PNode]) -> None:
+    """Replace the edges of the dependencies from an earlier scan in the DAG.
+
+    Edges of files which the document does not include anymore are removed, and edges
+    of the currently scanned dependencies are added.
+
+    Parameters
+    ----------
+    session : pytask.Session
+        The session.
+    task
+        The LaTeX task whose dependencies have been scanned again.
+    previous
+        The scanned dependencies of the task before the scan.
+
+    """
+    dag = session.dag
+    current = tree_leaves(task.depends_on["_scanned_dependencies"])  # ty: ignore[invalid-argument-type]
+    signatures = {node.signature for node in current}
+    for node in previous:
+        if node.signature not in signatures and node.signature in dag.nodes:
+            _remove_edge(dag, node.signature, task.signature)
+    for node in current:
+        if node.signature not in dag.nodes:
+            dag.add_node(node.signature, node)
+        dag.add_edge(node.signature, task.signature)
+
+
+def _remove_edge(dag: Any, source: str, target: str) -> None:
+    """Remove an edge from the DAG and the source if it has no edges left.
+
+    The DAG cannot remove single edges. Instead, the source is removed and added again
+    with all other edges.
+
+    """
+    data = dag.nodes[source]
+    predecessors = list(dag.predecessors(source))
+    successors = [i for i in dag.successors(source) if i != target]
+    dag.remove_nodes_from([source])
+    if not predecessors and not successors:
+        return
+    dag.add_node(source, data)
+    for node in predecessors:
+        dag.add_edge(node, source)
+    for node in successors:
+        dag.add_edge(source, node)
 
 
 def _add_latex_dependencies_retroactively(
-    task: PTask, session: Session, all_products: set[Path]
+    task: PTask,
+    session: Session,
+    all_products: set[Path],
+    scan_results: dict[Path, list[Path] | Exception],
 ) -> None:
     """Add dependencies from LaTeX document to task.
 
@@ -247,8 +549,13 @@ def _add_latex_dependencies_retroactively(
 
     1. Collect all possible files from the LaTeX document.
     2. Keep only files which exist or which are produced by some other task. Note that
-       only tasks are considered which have been collected until this point.
-    3. Mark the task such that it will be evaluated at last.
+       only tasks are considered which have been collected until this point. Files
+       produced by other tasks become edges of the DAG.
+    3. Mark the task such that it will be evaluated at last if the document includes
+       files which neither exist nor are produced by a task. They might be generated
+       by another task without being declared as products. The same applies to
+       generated TeX files which do not exist yet since the files they include are
+       unknown until :func:`rescan_latex_dependencies` scans them.
 
     Parameters
     ----------
@@ -256,31 +563,40 @@ def _add_latex_dependencies_retroactively(
         The LaTeX task.
     session : pytask.Session
         The session.
+    all_products
+        The paths of all products of collected tasks.
+    scan_results
+        The included files of the scanned LaTeX documents or the exceptions raised
+        while scanning them.
 
     """
-    # Scan the LaTeX document for included files.
-    try:
-        path_to_tex = task.depends_on["_path_to_tex"]
-        scanned_deps = (
-            set(lds.scan(path_to_tex.path))  # ty: ignore[invalid-argument-type]
-            if isinstance(path_to_tex, PPathNode)
-            else set()
-        )
-    except Exception:  # noqa: BLE001
+    # Look up the included files of the LaTeX document.
+    path_to_tex = task.depends_on["_path_to_tex"]
+    scan_result = (
+        scan_results.get(path_to_tex.path, [])
+        if isinstance(path_to_tex, PPathNode)
+        else []
+    )
+    scan_failed = isinstance(scan_result, Exception)
+    if scan_failed:
         warnings.warn(
             "pytask-latex failed to scan latex document for dependencies.", stacklevel=1
         )
-        scanned_deps = set()
+        scan_result = []
+    scanned_deps = set(scan_result)
 
     # Remove duplicated dependencies which have already been added by the user and those
     # which do not exist.
     task_deps = {
         i.path
-        for i in tree_leaves(task.depends_on)  # ty: ignore[invalid-argument-type]
+        for name, value in task.depends_on.items()
+        if name != "_scanned_dependencies"
+        for i in tree_leaves(value)  # ty: ignore[invalid-argument-type]
         if isinstance(i, PPathNode)
     }
     additional_deps = scanned_deps - task_deps
-    new_deps = [i for i in additional_deps if i in all_products or i.exists()]
+    index = session.config["latex_include_graph"].index
+    new_deps = [i for i in additional_deps if i in all_products or index.exists(i)]
 
     # Collect new dependencies and add them to the task.
     task_path = task.path if isinstance(task, PTaskWithPath) else None
@@ -302,8 +618,87 @@ def _add_latex_dependencies_retroactively(
     )
     task.depends_on["_scanned_dependencies"] = collected_dependencies
 
-    # Mark the task as being delayed to avoid conflicts with unmatched dependencies.
-    task.markers.append(Mark("try_last", (), {}))
+    # Delay the task only if its inputs are not known completely. The marker of an
+    # earlier scan is replaced.
+    task.markers[:] = [marker for marker in task.markers if marker is not _DELAY_MARK]
+    is_incomplete = (
+        scan_failed
+        or _has_unresolved_includes(additional_deps, all_products, index)
+        or _has_missing_generated_tex_files(scanned_deps, all_products, index)
+    )
+    if is_incomplete and not has_mark(task, "try_last"):
+        task.markers.append(_DELAY_MARK)
+
+
+def _has_unresolved_includes(
+    paths: set[Path], all_products: set[Path], index: FileSystemIndex
+) -> bool:
+    """Check whether some included files neither exist nor are produced by a task.
+
+    Files which are included without an extension are looked up with all common
+    extensions. Such an include is resolved if one of the candidates exists or is
+    produced by a task.
+
+    """
+    resolved = {
+        path.with_suffix("")
+        for path in paths
+        if path in all_products or index.exists(path)
+    }
+    return any(path.with_suffix("") not in resolved for path in paths)
+
+
+def _has_missing_generated_tex_files(
+    paths: set[Path], all_products: set[Path], index: FileSystemIndex
+) -> bool:
+    """Check whether some included TeX files are produced by a task but do not exist.
+
+    The files they include are unknown until they are generated.
+
+    """
+    from latex_dependency_scanner.scanner import COMMON_TEX_EXTENSIONS  # noqa: PLC0415
+
+    return any(
+        path.suffix in COMMON_TEX_EXTENSIONS
+        and path in all_products
+        and not index.exists(path)
+        for path in paths
+    )
+
+
+def _get_build_dir(cache_dir: Path, path: Path | None, name: str) -> Path:
+    """Get the persistent build directory of a task.
+
+    The directory is derived from the path and the name of the task which includes the
+    id of parametrized tasks. Tasks compiling the same LaTeX document never share a
+    build directory.
+
+    """
+    return cache_dir / "build" / _get_task_key(path, name)
+
+
+def _get_scratch_dir(
+    scratch_dir: Path | None, path: Path | None, name: str
+) -> Path | None:
+    """Get the scratch directory of a task or ``None`` if none is configured.
+
+    The directory is unique per task, so that tasks of several projects and concurrent
+    tasks can share the configured directory.
+
+    """
+    if scratch_dir is None:
+        return None
+    return scratch_dir / "pytask-latex" / _get_task_key(path, name)
+
+
+def _get_log_path(cache_dir: Path, path: Path | None, name: str) -> Path:
+    """Get the log file which receives the output of the commands of a task."""
+    return cache_dir / "logs" / f"{_get_task_key(path, name)}.log"
+
+
+def _get_task_key(path: Path | None, name: str) -> str:
+    task_id = name if path is None else f"{path.as_posix()}::{name}"
+    return hashlib.sha256(task_id.encode()).hexdigest()[:16]
 
 
 def _collect_node(
@@ -339,6 +734,8 @@ def _parse_compilation_steps(
     """Parse compilation steps."""
     __tracebackhide__ = True
 
+    from pytask_latex import compilation_steps as cs  # noqa: PLC0415
+
     compilation_steps = ["latexmk"] if compilation_steps is None else compilation_steps
 
     parsed_compilation_steps = []
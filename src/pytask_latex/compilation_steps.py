@@ -9,19 +9,94 @@ Each compilation step must have the following signature:
 
 A compilation step constructor must yield a function with this signature.
 
+A compilation step can accept an additional keyword argument ``context`` to receive a
+:class:`CompilationContext` with information about the session, for example, the
+directory for caches.
+
 """
 
 from __future__ import annotations
 
+import contextlib
+import contextvars
+import hashlib
+import json
+import os
+import re
 import subprocess
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+from pathlib import Path
 from typing import TYPE_CHECKING
 from typing import Any
 
+from pytask_latex.errors import ErrorWatcher
+from pytask_latex.logs import TAIL_LINES
+from pytask_latex.metrics import add_search_paths
+from pytask_latex.metrics import record
+from pytask_latex.metrics import run_command
+from pytask_latex.utils import accepts_context
+from pytask_latex.utils import copy_file_atomically
 from pytask_latex.utils import to_list
+from pytask_latex.utils import write_file_atomically
 
 if TYPE_CHECKING:
     from collections.abc import Callable
-    from pathlib import Path
+
+    from pytask_latex.batch import Batches
+    from pytask_latex.resources import ResourcePool
+    from pytask_latex.toolchain import Toolchain
+
+
+@dataclass(frozen=True)
+class CompilationContext:
+    """Information about the session which is passed to compilation steps.
+
+    Attributes
+    ----------
+    cache_dir
+        The directory where compilation steps store caches.
+    build_dir
+        A directory which belongs to the task and persists between runs. Compilation
+        steps can keep auxiliary files in it.
+    scratch_dir
+        A directory which belongs to the task and only exists while it is executed or
+        ``None`` if no scratch directory is configured. Compilation steps write the
+        document and auxiliary files into it unless they use the persistent build
+        directory.
+    task_name
+        The name of the task.
+    metrics_path
+        The file where the measurements of the compilation steps are written or
+        ``None`` if they are not recorded.
+    log_path
+        The file which receives the output of the commands of the compilation steps or
+        ``None`` if the output is not captured.
+    resources
+        The resources which the task demands from the resource pool.
+    resource_pool
+        The pool of resources shared by all tasks of the session or ``None`` if the
+        resources are unlimited.
+    toolchain
+        The programs which are resolved for the session or ``None`` if the programs
+        are looked up on the ``PATH`` when they are called.
+    batches
+        The batches of documents which are compiled with one call to latexmk.
+
+    """
+
+    cache_dir: Path
+    build_dir: Path | None = None
+    scratch_dir: Path | None = None
+    task_name: str = ""
+    metrics_path: Path | None = None
+    log_path: Path | None = None
+    resources: dict[str, int] = field(default_factory=dict)
+    resource_pool: ResourcePool | None = None
+    toolchain: Toolchain | None = None
+    batches: Batches | None = None
 
 
 def latexmk(
@@ -31,14 +106,1379 @@ def latexmk(
         "--synctex=1",
         "--cd",
     ),
+    *,
+    persistent_build_dir: bool = False,
+    fail_fast: bool = False,
+    batch: bool = False,
 ) -> Callable[..., Any]:
-    """Compilation step that calls latexmk."""
-    options = [str(i) for i in to_list(options)]
+    """Compilation step that calls latexmk.
 
-    def run_latexmk(path_to_tex: Path, path_to_document: Path) -> None:
-        job_name_opt = [f"--jobname={path_to_document.stem}"]
-        out_dir_opt = [f"--output-directory={path_to_document.parent.as_posix()}"]
-        cmd = ["latexmk", *options, *job_name_opt, *out_dir_opt, path_to_tex.as_posix()]
-        subprocess.run(cmd, check=True)  # noqa: S603
+    Parameters
+    ----------
+    options
+        The options passed to latexmk.
+    persistent_build_dir
+        Whether latexmk writes all files into the build directory of the task which
+        persists between runs. Only the final document is copied to its destination.
+        Keeping the auxiliary files allows latexmk to finish in fewer passes.
+    fail_fast
+        Whether latexmk and the engine are terminated at the first fatal error in the
+        output instead of finishing all passes. The task fails with the location of the
+        error which is reported with ``-file-line-error``.
+    batch
+        Whether documents of tasks with the same options and output directory are
+        compiled with one call to latexmk. A task is only batched if this is its only
+        compilation step and the document has the same name as the LaTeX source file.
+        Tasks are still reported individually. Batching cannot be combined with
+        ``persistent_build_dir`` and ``fail_fast``.
 
+    """
+    if batch and (persistent_build_dir or fail_fast):
+        msg = (
+            "'batch' cannot be combined with 'persistent_build_dir' or 'fail_fast' "
+            "since the documents of a batch share one output directory and one call "
+            "to latexmk."
+        )
+        raise ValueError(msg)
+    options = _add_fail_fast_options(to_list(options), fail_fast=fail_fast)
+
+    def run_latexmk(
+        path_to_tex: Path,
+        path_to_document: Path,
+        context: CompilationContext | None = None,
+    ) -> None:
+        planned = (
+            context.batches.pop(path_to_tex)
+            if batch and context is not None and context.batches is not None
+            else None
+        )
+        if context is not None and planned is not None:
+            planned.run(
+                path_to_tex,
+                executable=_get_executable(context, "latexmk"),
+                task_name=context.task_name,
+            )
+            return
+        _run_latexmk(
+            options,
+            path_to_tex,
+            path_to_document,
+            _get_output_directory(
+                path_to_document, context, persistent_build_dir=persistent_build_dir
+            ),
+            executable=_get_executable(context, "latexmk"),
+            watch=ErrorWatcher() if fail_fast else None,
+        )
+
+    run_latexmk.executables = (  # ty: ignore[unresolved-attribute]
+        "latexmk",
+        *_get_latexmk_engines(options),
+    )
+    if batch:
+        run_latexmk.batch_options = tuple(options)  # ty: ignore[unresolved-attribute]
     return run_latexmk
+
+
+def _run_latexmk(
+    options: list[str],
+    path_to_tex: Path,
+    path_to_document: Path,
+    output_directory: Path,
+    executable: str = "latexmk",
+    **kwargs: Any,
+) -> None:
+    """Run latexmk and copy the document if it is built in another directory.
+
+    Additional keyword arguments are passed to :func:`run_command`.
+
+    """
+    job_name_opt = [f"--jobname={path_to_document.stem}"]
+    out_dir_opt = [f"--output-directory={output_directory.as_posix()}"]
+    cmd = [executable, *options, *job_name_opt, *out_dir_opt, path_to_tex.as_posix()]
+    run_command(cmd, **kwargs)
+
+    if output_directory != path_to_document.parent:
+        copy_file_atomically(output_directory / path_to_document.name, path_to_document)
+
+
+# The engines which latexmk calls for its options to choose the type of the output.
+_LATEXMK_ENGINES = {
+    "pdf": "pdflatex",
+    "pdflatex": "pdflatex",
+    "pdflua": "lualatex",
+    "lualatex": "lualatex",
+    "pdfxe": "xelatex",
+    "xelatex": "xelatex",
+    "dvi": "latex",
+    "ps": "latex",
+}
+
+
+def _get_latexmk_engines(options: list[str]) -> list[str]:
+    """Get the engines which latexmk calls with the given options."""
+    engines = {_LATEXMK_ENGINES.get(option.lstrip("-")) for option in options}
+    return sorted(engine for engine in engines if engine is not None)
+
+
+def _get_executable(context: CompilationContext | None, name: str) -> str:
+    """Get the path to a program which is resolved by the toolchain of the session."""
+    if context is None or context.toolchain is None:
+        return name
+    return context.toolchain.path(name)
+
+
+def _add_fail_fast_options(options: list[Any], *, fail_fast: bool) -> list[str]:
+    """Convert the options and request errors with their location for fail-fast."""
+    options = [str(i) for i in options]
+    if fail_fast and not any("file-line-error" in i for i in options):
+        options.append("-file-line-error")
+    return options
+
+
+def _get_output_directory(
+    path_to_document: Path,
+    context: CompilationContext | None,
+    *,
+    persistent_build_dir: bool,
+) -> Path:
+    """Get the directory where latexmk writes the document and auxiliary files."""
+    if persistent_build_dir and context is not None and context.build_dir is not None:
+        context.build_dir.mkdir(parents=True, exist_ok=True)
+        return context.build_dir
+    if context is not None and context.scratch_dir is not None:
+        context.scratch_dir.mkdir(parents=True, exist_ok=True)
+        return context.scratch_dir
+    return path_to_document.parent
+
+
+_REGEX_BEGIN_DOCUMENT = re.compile(
+    r"^[^%\n]*?(\\begin\{document\}|\\endofdump)", re.MULTILINE
+)
+
+_REGEX_LOCAL_PACKAGE = re.compile(
+    r"\\(?:usepackage|RequirePackage)(?:\[[^\]]*\])?{([^}]*)}"
+)
+
+
+def precompiled_preamble(
+    options: str | list[str] | tuple[str, ...] = (
+        "--pdf",
+        "--interaction=nonstopmode",
+        "--synctex=1",
+        "--cd",
+    ),
+    engine: str | None = None,
+    *,
+    persistent_build_dir: bool = False,
+    fail_fast: bool = False,
+) -> Callable[..., Any]:
+    r"""Compilation step that calls latexmk with a precompiled preamble.
+
+    The preamble of the document, everything before ``\begin{document}`` or
+    ``\endofdump``, is dumped into a format file with the mylatexformat package. The
+    format is cached in the ``formats`` folder of the cache directory and keyed by the
+    content of the preamble, the local files it includes, and the version of the engine.
+    All documents with the same preamble share one format.
+
+    Parameters
+    ----------
+    options
+        The options passed to latexmk.
+    engine
+        The engine used to dump the format and to compile the document, for example,
+        ``"pdflatex"`` or ``"xelatex"``. By default, it is derived from the options of
+        latexmk like ``--pdf``, ``--xelatex``, or ``--lualatex``.
+
+    Raises
+    ------
+    ValueError
+        If the options do not choose exactly one engine or if it differs from
+        ``engine``.
+    persistent_build_dir
+        Whether latexmk writes all files into the persistent build directory of the
+        task. See :func:`latexmk`.
+    fail_fast
+        Whether latexmk is terminated at the first fatal error. See :func:`latexmk`.
+
+    """
+    options = _add_fail_fast_options(to_list(options), fail_fast=fail_fast)
+    engines = _get_latexmk_engines(options)
+    if len(engines) != 1:
+        msg = (
+            "The options of 'precompiled_preamble' must choose exactly one engine, "
+            f"for example, with '--pdf', '--xelatex', or '--lualatex', but they choose "
+            f"{', '.join(engines) or 'none'}."
+        )
+        raise ValueError(msg)
+    if engine is not None and engine != engines[0]:
+        msg = (
+            f"The engine {engine!r} of 'precompiled_preamble' differs from the engine "
+            f"{engines[0]!r} chosen by the options of latexmk."
+        )
+        raise ValueError(msg)
+    engine = engines[0]
+
+    def run_latexmk_with_precompiled_preamble(
+        path_to_tex: Path, path_to_document: Path, context: CompilationContext
+    ) -> None:
+        format_name = _dump_preamble_format(path_to_tex, engine, context)
+
+        executable = _get_executable(context, engine)
+        engine_opt = (
+            [f'-{engine}="{executable}" -fmt={format_name} %O %S']
+            if format_name
+            else []
+        )
+        env = {
+            **os.environ,
+            "TEXFORMATS": f"{context.cache_dir / 'formats'}{os.pathsep}",
+        }
+        _run_latexmk(
+            [*options, *engine_opt],
+            path_to_tex,
+            path_to_document,
+            _get_output_directory(
+                path_to_document, context, persistent_build_dir=persistent_build_dir
+            ),
+            env=env,
+            executable=_get_executable(context, "latexmk"),
+            watch=ErrorWatcher() if fail_fast else None,
+        )
+
+    run_latexmk_with_precompiled_preamble.executables = (  # ty: ignore[unresolved-attribute]
+        "latexmk",
+        engine,
+    )
+    return run_latexmk_with_precompiled_preamble
+
+
+def _dump_preamble_format(
+    path_to_tex: Path, engine: str, context: CompilationContext
+) -> str:
+    """Dump the preamble of a document into a format file unless it is cached.
+
+    Returns the name of the format or an empty string if the document has no preamble.
+
+    """
+    formats_dir = context.cache_dir / "formats"
+    text = path_to_tex.read_text(encoding="utf-8")
+    match = _REGEX_BEGIN_DOCUMENT.search(text)
+    if match is None:
+        return ""
+    preamble = text[: match.start(1)]
+    hash_ = _hash_preamble(path_to_tex, preamble, engine, context)
+    format_name = f"preamble-{hash_.hexdigest()[:16]}"
+
+    if formats_dir.joinpath(f"{format_name}.fmt").exists():
+        return format_name
+
+    with write_file_atomically(formats_dir / f"{format_name}.fmt") as path_to_format:
+        cmd = [
+            _get_executable(context, engine),
+            "-ini",
+            "-interaction=nonstopmode",
+            f"-jobname={format_name}",
+            f"-output-directory={path_to_format.parent.as_posix()}",
+            f"&{engine}",
+            "mylatexformat.ltx",
+            path_to_tex.name,
+        ]
+        run_command(cmd, cwd=path_to_tex.parent)
+
+    return format_name
+
+
+def _hash_preamble(
+    path_to_tex: Path, preamble: str, engine: str, context: CompilationContext
+) -> hashlib._Hash:
+    """Hash a preamble, the local files it includes, and the version of the engine."""
+    hash_ = hashlib.sha256()
+    version = _get_version(context, engine)
+    hash_.update(f"{engine}\n{version}\n{preamble}".encode())
+    for path in _get_local_preamble_files(path_to_tex, preamble):
+        hash_.update(path.as_posix().encode())
+        hash_.update(path.read_bytes())
+    return hash_
+
+
+def _get_local_preamble_files(path_to_tex: Path, preamble: str) -> list[Path]:
+    """Get local files and packages which are included in the preamble of a document."""
+    from pytask_latex.scanner import IncludeGraph  # noqa: PLC0415
+
+    paths = IncludeGraph().text_dependencies(preamble, path_to_tex)
+    paths.extend(
+        path_to_tex.parent / f"{name.strip()}.sty"
+        for match in _REGEX_LOCAL_PACKAGE.finditer(preamble)
+        for name in match.group(1).split(",")
+    )
+    return sorted({path for path in paths if path.is_file()})
+
+
+def _get_version(context: CompilationContext, name: str) -> str:
+    """Get the version of a program which is part of the keys of caches.
+
+    The version is empty if the step is called without a toolchain, for example,
+    outside of pytask.
+
+    """
+    if context.toolchain is None:
+        return ""
+    context.toolchain.resolve([name])
+    version = context.toolchain.version(name)
+    return "" if version is None else version
+
+
+# Comments are matched as well, so that pictures which are commented out are skipped.
+_REGEX_TIKZPICTURE = re.compile(
+    r"(?<!\\)%[^\n]*|(?P<figure>\\begin\{tikzpicture\}.*?\\end\{tikzpicture\})",
+    re.DOTALL,
+)
+
+_REGEX_PGFPLOTS_TABLE = re.compile(r"\btable\s*(?:\[[^\]]*\])?\s*\{([^}]+)\}")
+
+_FIGURE_PREAMBLE = (
+    "\\usepackage[active,tightpage]{preview}\n\\PreviewEnvironment{tikzpicture}\n"
+)
+
+
+def externalize_figures(
+    step: Callable[..., Any] | None = None,
+    *,
+    engine: str = "pdflatex",
+    options: str | list[str] | tuple[str, ...] = (
+        "-interaction=nonstopmode",
+        "-halt-on-error",
+    ),
+    max_workers: int | None = None,
+) -> Callable[..., Any]:
+    r"""Compilation step that builds TikZ figures separately and caches them.
+
+    Every ``tikzpicture`` environment in the body of the document, including pgfplots
+    figures, is compiled on its own with the preamble of the document and cropped with
+    the preview package. The figures are built in parallel and cached in the
+    ``figures`` folder of the cache directory. They are keyed by the preamble, the local
+    files it includes, the source of the figure, the tables it reads, and the version of
+    the engine, so a figure is only built again if one of them changes. Pictures in
+    comments are skipped. Nested ``tikzpicture`` environments are not supported since a
+    picture ends at the first ``\end{tikzpicture}``.
+
+    Afterwards, ``step`` compiles a copy of the document in the build directory of the
+    task in which the figures are replaced by the cached PDFs. Relative paths in the
+    copy are resolved against the directory of the document with ``\input@path``. The
+    directory is also added to the search paths of TeX, BibTeX, and biber, so that the
+    bibliography next to the document is found.
+
+    Parameters
+    ----------
+    step
+        The compilation step which compiles the document, by default :func:`latexmk`.
+    engine
+        The engine which compiles the figures.
+    options
+        The options passed to the engine.
+    max_workers
+        The maximum number of figures which are built at the same time. By default, the
+        number of CPUs.
+
+    """
+    step = latexmk() if step is None else step
+    options = to_list(options)
+
+    def run_externalize_figures(
+        path_to_tex: Path, path_to_document: Path, context: CompilationContext
+    ) -> None:
+        text = path_to_tex.read_text(encoding="utf-8")
+        match = _REGEX_BEGIN_DOCUMENT.search(text)
+        figures = (
+            []
+            if match is None
+            else [
+                figure.group("figure")
+                for figure in _REGEX_TIKZPICTURE.finditer(text, match.start(1))
+                if figure.group("figure")
+            ]
+        )
+        if match is None or not figures:
+            _run_step(step, path_to_tex, path_to_document, context)
+            return
+
+        preamble = text[: match.start(1)]
+        paths_to_figures = _build_figures(
+            figures,
+            preamble,
+            path_to_tex,
+            engine=engine,
+            options=options,
+            context=context,
+            max_workers=max_workers,
+        )
+
+        paths = iter(paths_to_figures)
+        body = _REGEX_TIKZPICTURE.sub(
+            lambda figure: (
+                f"\\includegraphics{{{next(paths).as_posix()}}}"
+                if figure.group("figure")
+                else figure.group(0)
+            ),
+            text[match.start(1) :],
+        )
+        path_to_copy = _write_copy(
+            path_to_tex,
+            f"{preamble}\\usepackage{{graphicx}}\n{body}",
+            context,
+        )
+        with add_search_paths(path_to_tex.parent):
+            _run_step(step, path_to_copy, path_to_document, context)
+
+    run_externalize_figures.executables = tuple(  # ty: ignore[unresolved-attribute]
+        dict.fromkeys([*getattr(step, "executables", ()), engine])
+    )
+    return run_externalize_figures
+
+
+def _run_step(
+    step: Callable[..., Any],
+    path_to_tex: Path,
+    path_to_document: Path,
+    context: CompilationContext,
+) -> None:
+    """Run a compilation step which is wrapped by another step."""
+    kwargs = {"context": context} if accepts_context(step) else {}
+    step(path_to_tex=path_to_tex, path_to_document=path_to_document, **kwargs)
+
+
+def _write_copy(
+    path_to_tex: Path,
+    text: str,
+    context: CompilationContext,
+    root: Path | None = None,
+) -> Path:
+    r"""Write a modified copy of a LaTeX file into the build directory of the task.
+
+    If ``root`` is ``None``, the file is the document. Its copy resolves relative paths
+    against the directory of the original with ``\input@path``. Otherwise, the file is
+    included by the document in ``root`` and the copy keeps the path relative to it.
+    Since TeX looks up files in the working directory first, copies of included files
+    take precedence over the originals.
+
+    """
+    build_dir = context.build_dir or context.cache_dir / "documents"
+    if root is None:
+        path_to_copy = build_dir / path_to_tex.name
+        text = (
+            "\\makeatletter"
+            f"\\def\\input@path{{{{{path_to_tex.parent.as_posix()}/}}}}"
+            f"\\makeatother\n{text}"
+        )
+    else:
+        path_to_copy = build_dir / path_to_tex.relative_to(root)
+    path_to_copy.parent.mkdir(parents=True, exist_ok=True)
+    path_to_copy.write_text(text, encoding="utf-8")
+    return path_to_copy
+
+
+def _run_in_threads(
+    function: Callable[..., Any], jobs: list[tuple[Any, ...]], max_workers: int | None
+) -> None:
+    """Run a function for every job in a thread pool and raise the first error."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, function, *job)
+            for job in jobs
+        ]
+        for future in futures:
+            future.result()
+
+
+def _build_figures(  # noqa: PLR0913
+    figures: list[str],
+    preamble: str,
+    path_to_tex: Path,
+    *,
+    engine: str,
+    options: list[str],
+    context: CompilationContext,
+    max_workers: int | None,
+) -> list[Path]:
+    """Build the figures which are not cached in parallel and return their paths."""
+    figures_dir = context.cache_dir / "figures"
+    preamble_hash = _hash_preamble(path_to_tex, preamble, engine, context)
+    preamble_hash.update(json.dumps(options).encode())
+
+    paths_to_figures = []
+    missing = {}
+    for figure in figures:
+        hash_ = preamble_hash.copy()
+        hash_.update(figure.encode())
+        for match in _REGEX_PGFPLOTS_TABLE.finditer(figure):
+            path = path_to_tex.parent / match.group(1).strip()
+            if path.is_file():
+                hash_.update(path.read_bytes())
+        path_to_figure = figures_dir / f"figure-{hash_.hexdigest()[:16]}.pdf"
+        paths_to_figures.append(path_to_figure)
+        if not path_to_figure.exists():
+            missing[path_to_figure] = figure
+
+    if missing:
+        figures_dir.mkdir(parents=True, exist_ok=True)
+        cmd = [_get_executable(context, engine), *options]
+        jobs = [
+            (
+                cmd,
+                (
+                    f"{preamble}{_FIGURE_PREAMBLE}\\begin{{document}}\n{figure}\n"
+                    "\\end{document}\n"
+                ),
+                path_to_figure,
+                path_to_tex.parent,
+            )
+            for path_to_figure, figure in missing.items()
+        ]
+        _run_in_threads(_build_figure, jobs, max_workers)
+
+    return paths_to_figures
+
+
+def _build_figure(cmd: list[str], source: str, path_to_figure: Path, cwd: Path) -> None:
+    """Compile one figure in a temporary directory and move it into the cache.
+
+    The engine runs in the directory of the document to resolve relative paths. Its
+    output is not captured since figures are built concurrently. A failing figure
+    reports the end of its ``.log`` file.
+
+    """
+    with write_file_atomically(path_to_figure) as path_to_tmp:
+        path_to_source = path_to_tmp.with_name("figure.tex")
+        path_to_source.write_text(source, encoding="utf-8")
+        figure_cmd = [
+            *cmd,
+            f"-jobname={path_to_tmp.stem}",
+            f"-output-directory={path_to_tmp.parent.as_posix()}",
+            path_to_source.as_posix(),
+        ]
+        try:
+            run_command(
+                figure_cmd,
+                cwd=cwd,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.STDOUT,
+            )
+        except subprocess.CalledProcessError as e:
+            path_to_log = path_to_tmp.with_suffix(".log")
+            lines = (
+                path_to_log.read_text(encoding="utf-8", errors="replace").splitlines()
+                if path_to_log.exists()
+                else []
+            )
+            e.output = "\n".join(lines[-TAIL_LINES:])
+            raise
+
+
+_REGEX_INCLUDEGRAPHICS = re.compile(
+    r"(\\includegraphics\*?\s*(?:\[[^\]]*\])?\s*\{)([^}]+)(\})"
+)
+
+# The extensions which graphicx tries for images without extension, like pdflatex.
+_GRAPHICS_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg", ".tif", ".tiff")
+
+_RASTER_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff")
+
+
+def preprocess_images(  # noqa: PLR0913
+    step: Callable[..., Any] | None = None,
+    *,
+    dpi: int = 150,
+    max_width: float = 6.5,
+    extension: str | None = None,
+    quality: int = 85,
+    max_workers: int | None = None,
+) -> Callable[..., Any]:
+    r"""Compilation step that downsamples and recompresses images before compiling.
+
+    Raster images included with ``\includegraphics`` in the document and the LaTeX files
+    it includes are processed with ImageMagick. Images wider or higher than
+    ``dpi * max_width`` pixels are downsampled, metadata is stripped, and the images are
+    recompressed and converted to ``extension``. The processed images are cached in the
+    ``images`` folder of the cache directory and keyed by the content of the image, the
+    settings, and the version of ImageMagick. Only new or changed images are processed,
+    in parallel.
+
+    Afterwards, ``step`` compiles copies of the LaTeX files in the build directory of
+    the task which include the processed images. Relative paths are resolved against
+    the directory of the document. Wrap other steps which modify the document like
+    :func:`externalize_figures`, so that the images are found.
+
+    Parameters
+    ----------
+    step
+        The compilation step which compiles the document, by default :func:`latexmk`.
+    dpi
+        The resolution of the images in dots per inch at ``max_width``.
+    max_width
+        The largest width or height in inches at which images are displayed. By
+        default, the width of the text on a letter page with one inch margins.
+    extension
+        The extension of the processed images, for example, ``".jpg"``, or ``None`` to
+        keep the format. TIFF images are converted to PNG since pdflatex does not
+        support them.
+    quality
+        The compression quality passed to ImageMagick.
+    max_workers
+        The maximum number of images which are processed at the same time. By default,
+        the number of CPUs.
+
+    """
+    step = latexmk() if step is None else step
+    max_pixels = round(dpi * max_width)
+    options = [
+        "-strip",
+        "-resize",
+        f"{max_pixels}x{max_pixels}>",
+        "-units",
+        "PixelsPerInch",
+        "-density",
+        str(dpi),
+        "-quality",
+        str(quality),
+    ]
+
+    def run_preprocess_images(
+        path_to_tex: Path, path_to_document: Path, context: CompilationContext
+    ) -> None:
+        from pytask_latex.scanner import IncludeGraph  # noqa: PLC0415
+
+        root = path_to_tex.parent
+        texts = {
+            path: path.read_text(encoding="utf-8")
+            for path in [path_to_tex, *IncludeGraph().dependencies(path_to_tex)]
+            if path.suffix == ".tex" and path.is_relative_to(root) and path.is_file()
+        }
+        images = {
+            image: None
+            for text in texts.values()
+            for match in _REGEX_INCLUDEGRAPHICS.finditer(text)
+            if (image := _resolve_image(root, match.group(2).strip())) is not None
+        }
+        if not images:
+            _run_step(step, path_to_tex, path_to_document, context)
+            return
+
+        processed = _process_images(
+            list(images), options, extension, context, max_workers
+        )
+
+        def replace(match: re.Match[str]) -> str:
+            image = _resolve_image(root, match.group(2).strip())
+            if image is None:
+                return match.group(0)
+            return f"{match.group(1)}{processed[image].as_posix()}{match.group(3)}"
+
+        for path, text in texts.items():
+            if path != path_to_tex and _REGEX_INCLUDEGRAPHICS.search(text):
+                _write_copy(
+                    path, _REGEX_INCLUDEGRAPHICS.sub(replace, text), context, root
+                )
+        path_to_copy = _write_copy(
+            path_to_tex,
+            _REGEX_INCLUDEGRAPHICS.sub(replace, texts[path_to_tex]),
+            context,
+        )
+        with add_search_paths(path_to_tex.parent):
+            _run_step(step, path_to_copy, path_to_document, context)
+
+    run_preprocess_images.executables = tuple(  # ty: ignore[unresolved-attribute]
+        dict.fromkeys([*getattr(step, "executables", ()), "magick"])
+    )
+    return run_preprocess_images
+
+
+def _resolve_image(root: Path, name: str) -> Path | None:
+    """Resolve an image like graphicx and return it if it is a raster image."""
+    path = root / name
+    candidates = (
+        [path]
+        if path.suffix.lower() in _GRAPHICS_EXTENSIONS
+        else [
+            path.with_name(path.name + extension) for extension in _GRAPHICS_EXTENSIONS
+        ]
+    )
+    for candidate in candidates:
+        if candidate.is_file():
+            return candidate if candidate.suffix.lower() in _RASTER_EXTENSIONS else None
+    return None
+
+
+def _process_images(
+    images: list[Path],
+    options: list[str],
+    extension: str | None,
+    context: CompilationContext,
+    max_workers: int | None,
+) -> dict[Path, Path]:
+    """Process the images which are not cached in parallel and return their paths."""
+    images_dir = context.cache_dir / "images"
+    version = _get_version(context, "magick")
+
+    processed = {}
+    jobs = []
+    for image in images:
+        suffix = extension or (
+            ".png" if image.suffix.lower() in (".tif", ".tiff") else image.suffix
+        )
+        hash_ = hashlib.sha256(f"{version}\n{options}\n{suffix}\n".encode())
+        hash_.update(image.read_bytes())
+        path_to_image = images_dir / f"image-{hash_.hexdigest()[:16]}{suffix}"
+        processed[image] = path_to_image
+        if not path_to_image.exists():
+            jobs.append(
+                (
+                    [_get_executable(context, "magick"), image.as_posix(), *options],
+                    path_to_image,
+                )
+            )
+
+    if jobs:
+        images_dir.mkdir(parents=True, exist_ok=True)
+        _run_in_threads(_process_image, jobs, max_workers)
+    return processed
+
+
+def _process_image(cmd: list[str], path_to_image: Path) -> None:
+    """Process one image into a temporary file and move it into the cache."""
+    with write_file_atomically(path_to_image) as path_to_tmp:
+        run_command(
+            [*cmd, path_to_tmp.as_posix()],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.STDOUT,
+        )
+
+
+# qpdf exits with 3 if it succeeded, but reported warnings, for example, about damaged
+# objects which it repaired.
+_QPDF_EXIT_WITH_WARNINGS = 3
+
+
+def optimize_pdf(
+    *,
+    linearize: bool = True,
+    deduplicate: bool = True,
+    compression_level: int = 9,
+    cache_size: int = 256,
+) -> Callable[..., Any]:
+    """Compilation step that shrinks the compiled document.
+
+    Ghostscript rewrites the document and stores identical images only once. Then, qpdf
+    recompresses all streams, packs objects into compressed object streams, removes
+    unused resources, and linearizes the document. The optimized document only replaces
+    the compiled one if it is smaller.
+
+    The ``pdfs`` folder of the cache directory keeps the optimized documents under the
+    hash of the compiled document, the settings, and the versions of the programs. A
+    document which has been optimized before is replaced with the cached version, and a
+    document which is already optimized is not optimized again. The least recently used
+    documents are evicted once the folder exceeds ``cache_size``. The number of bytes
+    saved is recorded in the measurements of the step.
+
+    Add the step after the steps which compile the document.
+
+    Parameters
+    ----------
+    linearize
+        Whether the document is linearized for fast web view, so that viewers show the
+        first page before the whole document is downloaded.
+    deduplicate
+        Whether identical images are stored only once with Ghostscript.
+    compression_level
+        The level from 1 to 9 at which qpdf compresses streams.
+    cache_size
+        The maximum size of the cached documents in megabytes.
+
+    """
+    if not 1 <= compression_level <= 9:  # noqa: PLR2004
+        msg = (
+            "'compression_level' must be between 1 and 9, but it is "
+            f"{compression_level}."
+        )
+        raise ValueError(msg)
+    gs_options = [
+        "-sDEVICE=pdfwrite",
+        "-dNOPAUSE",
+        "-dBATCH",
+        "-dQUIET",
+        "-dSAFER",
+        "-dAutoRotatePages=/None",
+        "-dDetectDuplicateImages=true",
+    ]
+    qpdf_options = [
+        "--object-streams=generate",
+        "--recompress-flate",
+        f"--compression-level={compression_level}",
+        "--remove-unreferenced-resources=yes",
+        "--deterministic-id",
+        *(["--linearize"] if linearize else []),
+    ]
+    executables = ("gs", "qpdf") if deduplicate else ("qpdf",)
+
+    def run_optimize_pdf(
+        path_to_tex: Path,  # noqa: ARG001
+        path_to_document: Path,
+        context: CompilationContext,
+    ) -> None:
+        versions = [_get_version(context, name) for name in executables]
+        key = json.dumps([versions, deduplicate, qpdf_options])
+        directory = context.cache_dir / "pdfs"
+        path_to_entry = directory / f"{_hash_pdf(path_to_document, key)}.pdf"
+        size = path_to_document.stat().st_size
+
+        if not _restore_optimized_pdf(path_to_entry, path_to_document):
+            _optimize_pdf(
+                path_to_document,
+                path_to_entry,
+                gs_cmd=(
+                    [_get_executable(context, "gs"), *gs_options]
+                    if deduplicate
+                    else None
+                ),
+                qpdf_cmd=[_get_executable(context, "qpdf"), *qpdf_options],
+            )
+            # The optimized document is an entry of itself, so that it is not
+            # optimized again if the step runs without recompiling the document.
+            path_to_output = directory / f"{_hash_pdf(path_to_document, key)}.pdf"
+            if path_to_output != path_to_entry:
+                with contextlib.suppress(OSError):
+                    os.link(path_to_entry, path_to_output)
+            _evict_optimized_pdfs(directory, cache_size * 1024**2)
+
+        record(bytes_saved=size - path_to_document.stat().st_size)
+
+    run_optimize_pdf.executables = executables  # ty: ignore[unresolved-attribute]
+    return run_optimize_pdf
+
+
+def _hash_pdf(path: Path, key: str) -> str:
+    """Hash a document in chunks since documents can be large."""
+    hash_ = hashlib.sha256(key.encode())
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(2**20), b""):
+            hash_.update(chunk)
+    return hash_.hexdigest()[:16]
+
+
+def _restore_optimized_pdf(path_to_entry: Path, path_to_document: Path) -> bool:
+    """Replace a document with its cached optimized version if it exists."""
+    try:
+        # Mark the entry as recently used.
+        os.utime(path_to_entry)
+        if path_to_entry.stat().st_size < path_to_document.stat().st_size:
+            copy_file_atomically(path_to_entry, path_to_document)
+    except FileNotFoundError:
+        # The entry does not exist or was evicted by another task.
+        return False
+    return True
+
+
+def _optimize_pdf(
+    path_to_document: Path,
+    path_to_entry: Path,
+    *,
+    gs_cmd: list[str] | None,
+    qpdf_cmd: list[str],
+) -> None:
+    """Optimize a document, cache it, and replace the document if it is smaller."""
+    with write_file_atomically(path_to_entry) as path_to_tmp:
+        path_to_input = path_to_document
+        if gs_cmd is not None:
+            path_to_input = path_to_tmp.with_name("deduplicated.pdf")
+            run_command(
+                [
+                    *gs_cmd,
+                    f"-sOutputFile={path_to_input.as_posix()}",
+                    path_to_document.as_posix(),
+                ]
+            )
+
+        cmd = [*qpdf_cmd, path_to_input.as_posix(), path_to_tmp.as_posix()]
+        returncode = run_command(cmd, check=False).returncode
+        if returncode not in (0, _QPDF_EXIT_WITH_WARNINGS):
+            raise subprocess.CalledProcessError(returncode, cmd)
+
+    if path_to_entry.stat().st_size < path_to_document.stat().st_size:
+        copy_file_atomically(path_to_entry, path_to_document)
+
+
+def _evict_optimized_pdfs(directory: Path, max_size: int) -> None:
+    """Evict the least recently used documents until the cache fits its size."""
+    entries = []
+    for entry in directory.glob("*.pdf"):
+        with contextlib.suppress(FileNotFoundError):
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry))
+
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total_size <= max_size:
+            break
+        entry.unlink(missing_ok=True)
+        total_size -= size
+
+
+_REGEX_BCF_DATASOURCE = re.compile(r"<bcf:datasource[^>]*>([^<]+)</bcf:datasource>")
+
+_REGEX_AUX_INPUT = re.compile(r"^\\@input\{([^}]+)\}", re.MULTILINE)
+
+_REGEX_AUX_CITATION_DATA = re.compile(
+    r"^\\(?:citation|bibdata|bibstyle)\{[^}]*\}$", re.MULTILINE
+)
+
+_REGEX_AUX_BIBDATA = re.compile(r"^\\bibdata\{([^}]*)\}$", re.MULTILINE)
+
+
+def biber(
+    options: str | list[str] | tuple[str, ...] = (),
+    *,
+    persistent_build_dir: bool = False,
+) -> Callable[..., Any]:
+    """Compilation step that calls biber if the bibliography changed.
+
+    The step must run after a LaTeX pass which writes the ``.bcf`` file. biber is
+    skipped if the ``.bcf`` file and the ``.bib`` files it lists are unchanged since the
+    last run and the ``.bbl`` file still exists. The ``.bbl`` file is not touched, so
+    that no additional LaTeX pass is necessary.
+
+    Parameters
+    ----------
+    options
+        The options passed to biber.
+    persistent_build_dir
+        Whether the auxiliary files are in the persistent build directory of the task.
+        It must match the option of the preceding step.
+
+    """
+    options = [str(i) for i in to_list(options)]
+
+    def run_biber(
+        path_to_tex: Path, path_to_document: Path, context: CompilationContext
+    ) -> None:
+        output_directory = _get_output_directory(
+            path_to_document, context, persistent_build_dir=persistent_build_dir
+        )
+        path_to_bcf = output_directory / f"{path_to_document.stem}.bcf"
+        bcf = path_to_bcf.read_text(encoding="utf-8")
+        bib_files = [
+            path_to_tex.parent / name.strip()
+            for name in _REGEX_BCF_DATASOURCE.findall(bcf)
+        ]
+
+        cmd = [
+            _get_executable(context, "biber"),
+            *options,
+            f"--output-directory={output_directory.as_posix()}",
+            path_to_document.stem,
+        ]
+        _run_bibliography_tool(
+            cmd,
+            citation_data=bcf,
+            bib_files=bib_files,
+            path_to_bbl=output_directory / f"{path_to_document.stem}.bbl",
+            context=context,
+            cwd=path_to_tex.parent,
+        )
+
+    run_biber.executables = ("biber",)  # ty: ignore[unresolved-attribute]
+    return run_biber
+
+
+def bibtex(
+    options: str | list[str] | tuple[str, ...] = (),
+    *,
+    persistent_build_dir: bool = False,
+) -> Callable[..., Any]:
+    r"""Compilation step that calls bibtex if the bibliography changed.
+
+    The step must run after a LaTeX pass which writes the ``.aux`` file. bibtex is
+    skipped if the citations, ``\bibdata`` and ``\bibstyle`` in the ``.aux`` files and
+    the ``.bib`` files are unchanged since the last run and the ``.bbl`` file still
+    exists. The ``.bbl`` file is not touched, so that no additional LaTeX pass is
+    necessary.
+
+    Parameters
+    ----------
+    options
+        The options passed to bibtex.
+    persistent_build_dir
+        Whether the auxiliary files are in the persistent build directory of the task.
+        It must match the option of the preceding step.
+
+    """
+    options = [str(i) for i in to_list(options)]
+
+    def run_bibtex(
+        path_to_tex: Path, path_to_document: Path, context: CompilationContext
+    ) -> None:
+        output_directory = _get_output_directory(
+            path_to_document, context, persistent_build_dir=persistent_build_dir
+        )
+        citation_data = _read_aux_citation_data(
+            output_directory / f"{path_to_document.stem}.aux"
+        )
+        bib_files = [
+            path_to_tex.parent / f"{name.strip()}.bib"
+            for match in _REGEX_AUX_BIBDATA.finditer(citation_data)
+            for name in match.group(1).split(",")
+        ]
+
+        search_path = f"{path_to_tex.parent}{os.pathsep}"
+        env = {**os.environ, "BIBINPUTS": search_path, "BSTINPUTS": search_path}
+        _run_bibliography_tool(
+            [_get_executable(context, "bibtex"), *options, path_to_document.stem],
+            citation_data=citation_data,
+            bib_files=bib_files,
+            path_to_bbl=output_directory / f"{path_to_document.stem}.bbl",
+            context=context,
+            cwd=output_directory,
+            env=env,
+        )
+
+    run_bibtex.executables = ("bibtex",)  # ty: ignore[unresolved-attribute]
+    return run_bibtex
+
+
+def _read_aux_citation_data(path_to_aux: Path) -> str:
+    r"""Read the lines which are relevant for bibtex from ``.aux`` files.
+
+    ``.aux`` files of included documents are read as well since bibtex follows
+    ``\@input``.
+
+    """
+    lines = []
+    paths = [path_to_aux]
+    seen = set()
+    while paths:
+        path = paths.pop(0)
+        if path in seen or not path.exists():
+            continue
+        seen.add(path)
+        text = path.read_text(encoding="utf-8", errors="replace")
+        lines.extend(_REGEX_AUX_CITATION_DATA.findall(text))
+        paths.extend(
+            path_to_aux.parent / name for name in _REGEX_AUX_INPUT.findall(text)
+        )
+    return "\n".join(lines)
+
+
+def _run_bibliography_tool(  # noqa: PLR0913
+    cmd: list[str],
+    *,
+    citation_data: str,
+    bib_files: list[Path],
+    path_to_bbl: Path,
+    context: CompilationContext,
+    cwd: Path,
+    env: dict[str, str] | None = None,
+) -> None:
+    """Run a bibliography tool unless its inputs are unchanged since the last run."""
+    hash_ = hashlib.sha256(f"{cmd}\n{citation_data}".encode())
+    for path in bib_files:
+        hash_.update(f"\0{path.as_posix()}\0".encode())
+        if path.exists():
+            hash_.update(path.read_bytes())
+    digest = hash_.hexdigest()
+
+    path_to_state = (
+        context.cache_dir
+        / "bibliography"
+        / hashlib.sha256(path_to_bbl.as_posix().encode()).hexdigest()[:16]
+    )
+    if (
+        path_to_bbl.exists()
+        and path_to_state.exists()
+        and path_to_state.read_text() == digest
+    ):
+        return
+
+    run_command(cmd, cwd=cwd, env=env)
+    path_to_state.parent.mkdir(parents=True, exist_ok=True)
+    path_to_state.write_text(digest)
+
+
+# Requests to run biber or bibtex first, like "rerun LaTeX afterwards", are ignored
+# since another pass cannot satisfy them.
+_REGEX_RERUN = re.compile(
+    r"Rerun to get|Rerun LaTeX|Please rerun LaTeX|has changed\. Rerun|"
+    r"\(rerunfilecheck\)\s+Rerun"
+)
+
+_AUXILIARY_SUFFIXES = (
+    ".aux",
+    ".bbl",
+    ".toc",
+    ".lof",
+    ".lot",
+    ".out",
+    ".nav",
+    ".snm",
+    ".ind",
+    ".gls",
+)
+
+_DEFAULT_ENGINE_OPTIONS = ("-interaction=nonstopmode", "-synctex=1")
+
+
+def pdflatex(
+    options: str | list[str] | tuple[str, ...] = _DEFAULT_ENGINE_OPTIONS,
+    max_passes: int = 5,
+    *,
+    persistent_build_dir: bool = False,
+    fail_fast: bool = False,
+) -> Callable[..., Any]:
+    """Compilation step that calls pdflatex until the document converged.
+
+    See :func:`_engine` for how the number of passes is determined.
+
+    Parameters
+    ----------
+    options
+        The options passed to pdflatex.
+    max_passes
+        The maximum number of passes.
+    persistent_build_dir
+        Whether pdflatex writes all files into the persistent build directory of the
+        task. See :func:`latexmk`.
+    fail_fast
+        Whether pdflatex is terminated at the first fatal error. See :func:`latexmk`.
+
+    """
+    return _engine(
+        "pdflatex",
+        options,
+        max_passes,
+        persistent_build_dir=persistent_build_dir,
+        fail_fast=fail_fast,
+    )
+
+
+def lualatex(
+    options: str | list[str] | tuple[str, ...] = _DEFAULT_ENGINE_OPTIONS,
+    max_passes: int = 5,
+    *,
+    persistent_build_dir: bool = False,
+    fail_fast: bool = False,
+) -> Callable[..., Any]:
+    """Compilation step that calls lualatex until the document converged.
+
+    The parameters are the same as for :func:`pdflatex`.
+
+    """
+    return _engine(
+        "lualatex",
+        options,
+        max_passes,
+        persistent_build_dir=persistent_build_dir,
+        fail_fast=fail_fast,
+    )
+
+
+def xelatex(
+    options: str | list[str] | tuple[str, ...] = _DEFAULT_ENGINE_OPTIONS,
+    max_passes: int = 5,
+    *,
+    persistent_build_dir: bool = False,
+    fail_fast: bool = False,
+) -> Callable[..., Any]:
+    """Compilation step that calls xelatex until the document converged.
+
+    The parameters are the same as for :func:`pdflatex`.
+
+    """
+    return _engine(
+        "xelatex",
+        options,
+        max_passes,
+        persistent_build_dir=persistent_build_dir,
+        fail_fast=fail_fast,
+    )
+
+
+def _engine(
+    engine: str,
+    options: str | list[str] | tuple[str, ...],
+    max_passes: int,
+    *,
+    persistent_build_dir: bool,
+    fail_fast: bool = False,
+) -> Callable[..., Any]:
+    """Create a compilation step which runs a TeX engine directly.
+
+    The engine records the files it reads in the ``.fls`` file. Before every pass, the
+    step compares the files read by the last pass with their current state. Another pass
+    is only necessary if one of them changed, for example, the ``.aux`` file after
+    labels moved or the ``.bbl`` file after biber ran, or if the ``.log`` file requests
+    a rerun. The state of the last pass is kept in the cache directory, so that a step
+    following a skipped bibliography step does not run at all.
+
+    """
+    if max_passes < 1:
+        msg = f"'max_passes' must be at least 1, but it is {max_passes}."
+        raise ValueError(msg)
+    options = _add_fail_fast_options(to_list(options), fail_fast=fail_fast)
+
+    def run_engine(
+        path_to_tex: Path, path_to_document: Path, context: CompilationContext
+    ) -> None:
+        output_directory = _get_output_directory(
+            path_to_document, context, persistent_build_dir=persistent_build_dir
+        )
+        output_directory.mkdir(parents=True, exist_ok=True)
+        job = output_directory / path_to_document.stem
+        path_to_output = job.with_suffix(path_to_document.suffix)
+        path_to_state = (
+            context.cache_dir
+            / "passes"
+            / hashlib.sha256(job.as_posix().encode()).hexdigest()[:16]
+        )
+        cmd = [
+            _get_executable(context, engine),
+            *options,
+            "-recorder",
+            f"-jobname={path_to_document.stem}",
+            f"-output-directory={output_directory.as_posix()}",
+            path_to_tex.name,
+        ]
+
+        n_passes = 0
+        while not (
+            path_to_output.exists() and _is_pass_up_to_date(path_to_state, path_to_tex)
+        ):
+            if n_passes == max_passes:
+                warnings.warn(
+                    f"{engine} did not converge for {path_to_tex.name!r} after "
+                    f"{max_passes} passes.",
+                    stacklevel=1,
+                )
+                break
+            previous = _read_pass_inputs(path_to_state)
+            before = {
+                path: _get_file_signature(path, previous.get(path.as_posix(), ""))
+                for path in _get_pass_inputs(job, path_to_tex)
+            }
+            run_command(
+                cmd,
+                cwd=path_to_tex.parent,
+                watch=ErrorWatcher() if fail_fast else None,
+            )
+            n_passes += 1
+            _save_pass_state(path_to_state, job, before)
+
+        record(passes=n_passes)
+
+        if output_directory != path_to_document.parent:
+            copy_file_atomically(path_to_output, path_to_document)
+
+    run_engine.executables = (engine,)  # ty: ignore[unresolved-attribute]
+    return run_engine
+
+
+def _get_pass_inputs(job: Path, path_to_tex: Path) -> set[Path]:
+    """Get the files which might be read by the next pass.
+
+    These are the files read by the last pass, the document, and all auxiliary files of
+    the job which might be created by the next pass.
+
+    """
+    paths = {path_to_tex, *_read_fls_inputs(job.with_suffix(".fls"))}
+    if job.parent.exists():
+        paths.update(
+            path
+            for path in job.parent.iterdir()
+            if path.stem == job.name and path.suffix not in (".fls", ".log")
+        )
+    return paths
+
+
+def _read_fls_inputs(path_to_fls: Path) -> list[Path]:
+    """Read the input files from the file written by ``-recorder``."""
+    if not path_to_fls.exists():
+        return []
+
+    inputs = []
+    working_directory = path_to_fls.parent
+    for line in path_to_fls.read_text(encoding="utf-8", errors="replace").splitlines():
+        kind, _, value = line.partition(" ")
+        if kind == "PWD":
+            working_directory = Path(value)
+        elif kind == "INPUT":
+            inputs.append(working_directory.joinpath(value))
+    return inputs
+
+
+def _get_file_signature(path: Path, previous: str = "") -> str:
+    """Get a signature of a file which changes with its content.
+
+    The signature consists of the size, the modification time, and the hash of the
+    file. The file is only hashed if its size or modification time differ from the
+    previous signature, so that unchanged files, like the many files of the TeX
+    distribution, are not read on every pass.
+
+    """
+    try:
+        stat = path.stat()
+    except OSError:
+        return ""
+    prefix = f"{stat.st_size}:{stat.st_mtime_ns}:"
+    if previous.startswith(prefix):
+        return previous
+    return prefix + hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _has_same_content(path: Path, signature: str) -> bool:
+    """Check whether a file has the content recorded in its signature."""
+    current = _get_file_signature(path, signature)
+    return current.rpartition(":")[2] == signature.rpartition(":")[2]
+
+
+def _save_pass_state(path_to_state: Path, job: Path, before: dict[Path, str]) -> None:
+    """Save the state of the files read by a pass and whether a rerun is requested."""
+    path_to_log = job.with_suffix(".log")
+    log = (
+        path_to_log.read_text(encoding="utf-8", errors="replace")
+        if path_to_log.exists()
+        else ""
+    )
+    inputs = {
+        path.as_posix(): before.get(path, "")
+        for path in _read_fls_inputs(job.with_suffix(".fls"))
+        if path.suffix != ".fls"
+    }
+    # Auxiliary files which did not exist before the pass, for example, the .bbl file
+    # which is created by biber afterwards, require another pass once they exist.
+    for suffix in _AUXILIARY_SUFFIXES:
+        path = job.with_suffix(suffix)
+        if not before.get(path):
+            inputs[path.as_posix()] = ""
+    state = {"rerun": _REGEX_RERUN.search(log) is not None, "inputs": inputs}
+    path_to_state.parent.mkdir(parents=True, exist_ok=True)
+    path_to_state.write_text(json.dumps(state))
+
+
+def _is_pass_up_to_date(path_to_state: Path, path_to_tex: Path) -> bool:
+    """Check whether the last pass converged and no file it read has changed."""
+    state = _read_pass_state(path_to_state)
+    if state is None or state["rerun"] or path_to_tex.as_posix() not in state["inputs"]:
+        return False
+    return all(
+        _has_same_content(Path(path), signature)
+        for path, signature in state["inputs"].items()
+    )
+
+
+def _read_pass_state(path_to_state: Path) -> dict[str, Any] | None:
+    try:
+        return json.loads(path_to_state.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def _read_pass_inputs(path_to_state: Path) -> dict[str, str]:
+    """Read the signatures of the files read by the last pass."""
+    state = _read_pass_state(path_to_state)
+    return {} if state is None else state["inputs"]
@@ -2,13 +2,154 @@
 
 from __future__ import annotations
 
+import importlib
+import os
+import shutil
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
 from typing import Any
 
 from pytask import hookimpl
 
+if TYPE_CHECKING:
+    from pluggy import PluginManager
+
+_SCAN_BACKENDS = ("none", "threads", "processes")
+"""tuple[str, ...]: The values of :class:`pytask_latex.scanner.ScanBackend`. The scanner
+is only imported if there are LaTeX tasks to keep the startup of pytask fast."""
+
 
 @hookimpl
 def pytask_parse_config(config: dict[str, Any]) -> None:
     """Register the latex marker in the configuration."""
     config["markers"]["latex"] = "Tasks which compile LaTeX documents."
     config["infer_latex_dependencies"] = config.get("infer_latex_dependencies", True)
+
+    latex_cache_dir = Path(
+        config.get("latex_cache_dir", config["root"] / ".pytask" / "latex")
+    )
+    if not latex_cache_dir.is_absolute():
+        latex_cache_dir = config["root"] / latex_cache_dir
+    config["latex_cache_dir"] = latex_cache_dir
+
+    latex_scratch_dir = config.get("latex_scratch_dir")
+    if latex_scratch_dir is not None:
+        latex_scratch_dir = Path(latex_scratch_dir)
+        if not latex_scratch_dir.is_absolute():
+            latex_scratch_dir = config["root"] / latex_scratch_dir
+    config["latex_scratch_dir"] = latex_scratch_dir
+
+    latex_scan_cache_size = config.get("latex_scan_cache_size", 10_000)
+    if not isinstance(latex_scan_cache_size, int) or latex_scan_cache_size < 0:
+        msg = (
+            "'latex_scan_cache_size' must be a non-negative integer, but it is "
+            f"{latex_scan_cache_size!r}."
+        )
+        raise ValueError(msg)
+    config["latex_scan_cache_size"] = latex_scan_cache_size
+
+    latex_scan_backend = config.get("latex_scan_backend", "none")
+    # Members of ScanBackend are accepted as well.
+    latex_scan_backend = getattr(latex_scan_backend, "value", latex_scan_backend)
+    if latex_scan_backend not in _SCAN_BACKENDS:
+        msg = (
+            f"Invalid value for 'latex_scan_backend'. Got {latex_scan_backend!r}. "
+            f"Choose one of {', '.join(_SCAN_BACKENDS)}."
+        )
+        raise ValueError(msg)
+    config["latex_scan_backend"] = latex_scan_backend
+
+    latex_scan_workers = config.get("latex_scan_workers", "auto")
+    if latex_scan_workers == "auto":
+        latex_scan_workers = os.cpu_count() or 1
+    if not isinstance(latex_scan_workers, int) or latex_scan_workers < 1:
+        msg = (
+            "'latex_scan_workers' must be an integer >= 1 or 'auto', but it is "
+            f"{latex_scan_workers!r}."
+        )
+        raise ValueError(msg)
+    config["latex_scan_workers"] = latex_scan_workers
+
+    config["latex_output_cache"] = config.get("latex_output_cache", False)
+    latex_output_cache_size = config.get("latex_output_cache_size", 1024)
+    if not isinstance(latex_output_cache_size, int) or latex_output_cache_size < 0:
+        msg = (
+            "'latex_output_cache_size' must be a non-negative integer of megabytes, "
+            f"but it is {latex_output_cache_size!r}."
+        )
+        raise ValueError(msg)
+    config["latex_output_cache_size"] = latex_output_cache_size
+
+    config["latex_metrics"] = config.get("latex_metrics", False)
+    # Imported here to keep the startup of pytask fast.
+    from pytask_latex.resources import parse_resources  # noqa: PLC0415
+
+    config["latex_resources"] = parse_resources(
+        config.get("latex_resources"), "latex_resources"
+    )
+
+
+@hookimpl
+def pytask_post_parse(config: dict[str, Any]) -> None:
+    """Clear the caches of pytask-latex if requested and set up the session."""
+    # Imported here to keep the startup of pytask fast and to avoid circular imports.
+    # Importing pytask loads the plugin.
+    from pytask_latex.batch import Batches  # noqa: PLC0415
+    from pytask_latex.resources import ResourcePool  # noqa: PLC0415
+    from pytask_latex.toolchain import Toolchain  # noqa: PLC0415
+
+    _register_hooks(config["pm"], config)
+
+    if config.get("clear_latex_cache", False):
+        shutil.rmtree(config["latex_cache_dir"], ignore_errors=True)
+
+    if config["latex_output_cache"]:
+        # Imported here to avoid circular imports. Importing pytask loads the plugin.
+        from pytask_latex.store import OutputStore  # noqa: PLC0415
+
+        config["latex_output_store"] = OutputStore(
+            path=config["latex_cache_dir"] / "outputs",
+            max_size=config["latex_output_cache_size"] * 1024**2,
+            root=config["root"],
+        )
+
+    config["latex_toolchain"] = Toolchain()
+    config["latex_batches"] = Batches()
+
+    session_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    if config["latex_metrics"]:
+        config["latex_metrics_path"] = (
+            config["latex_cache_dir"] / "metrics" / f"{session_id}.jsonl"
+        )
+
+    if config["latex_resources"]:
+        config["latex_resource_pool"] = ResourcePool(
+            path=config["latex_cache_dir"] / "resources" / f"{session_id}.json",
+            capacity=config["latex_resources"],
+        )
+
+
+def _register_hooks(pm: PluginManager, config: dict[str, Any]) -> None:
+    """Register the hooks which are only needed after the configuration is parsed.
+
+    The modules are imported here and not in :mod:`pytask_latex.plugin` because pytask
+    loads the plugin whenever it is imported. Modules of features which are disabled
+    are not imported at all.
+
+    """
+    # pluggy calls implementations with trylast in the order of their registration, so
+    # the store restores products before batches are planned for the remaining tasks.
+    modules = {
+        "metrics": config["latex_metrics"],
+        "resources": bool(config["latex_resources"]),
+        "store": config["latex_output_cache"],
+        "batch": True,
+        "watch": config.get("watch_latex", False),
+    }
+    for name, is_enabled in modules.items():
+        if not is_enabled:
+            continue
+        module = importlib.import_module(f"pytask_latex.{name}")
+        if not pm.is_registered(module):
+            pm.register(module)
@@ -0,0 +1,112 @@
+"""Contains the detection of fatal errors in the output of TeX.
+
+Compilation steps with ``fail_fast=True`` pass an :class:`ErrorWatcher` to
+:func:`~pytask_latex.metrics.run_command`. It reads the output line by line while the
+program runs and reports the first fatal error, so that the program can be terminated
+instead of finishing all passes in nonstop mode.
+
+"""
+
+from __future__ import annotations
+
+import re
+import subprocess
+from dataclasses import dataclass
+
+# Errors in the format of ``-file-line-error`` like "./document.tex:3: Undefined ...".
+_REGEX_FILE_LINE_ERROR = re.compile(
+    r"^(?P<file>[^\s:()]+\.[A-Za-z]+):(?P<line>\d+): (?P<message>.+)$"
+)
+
+# The line of the input where TeX stopped like "l.3 \undefinedmacro".
+_REGEX_LINE_NUMBER = re.compile(r"^l\.(?P<line>\d+)")
+
+_REGEX_MISSING_FILE = re.compile(
+    r"(?:File `[^']+' not found|I can't find file|Missing input file)"
+)
+
+_CONTEXT_LINES = 5
+"""The number of lines after an error in which the line number is searched."""
+
+
+@dataclass
+class TeXError:
+    """A fatal error reported by TeX.
+
+    Attributes
+    ----------
+    message
+        The error message.
+    file
+        The file where the error occurred if it is known.
+    line
+        The line where the error occurred if it is known.
+
+    """
+
+    message: str
+    file: str | None = None
+    line: int | None = None
+
+    def __str__(self) -> str:
+        """Show the error with its location like ``-file-line-error``."""
+        if self.file is not None and self.line is not None:
+            return f"{self.file}:{self.line}: {self.message}"
+        if self.line is not None:
+            return f"l.{self.line}: {self.message}"
+        return self.message
+
+
+class FatalTeXError(subprocess.CalledProcessError):
+    """A program failed with a fatal error which was found in its output."""
+
+    def __init__(
+        self,
+        returncode: int,
+        cmd: list[str],
+        output: str | None = None,
+        error: TeXError | None = None,
+    ) -> None:
+        super().__init__(returncode, cmd, output=output)
+        self.error = error
+
+    def __str__(self) -> str:
+        """Show the command and the error."""
+        return f"Command {self.cmd!r} failed with the fatal error {self.error}"
+
+
+class ErrorWatcher:
+    """Watch the output of a program for the first fatal error.
+
+    Fatal errors are lines starting with ``!``, errors in the format of
+    ``-file-line-error``, emergency stops, and missing files. After an error starting
+    with ``!``, the watcher waits a few lines for the line number which TeX prints
+    below the message.
+
+    """
+
+    def __init__(self) -> None:
+        self.error: TeXError | None = None
+        self._remaining = _CONTEXT_LINES
+
+    def __call__(self, line: str) -> bool:
+        """Process one line of output and return whether the program should stop."""
+        if self.error is not None:
+            self._remaining -= 1
+            if match := _REGEX_LINE_NUMBER.match(line):
+                self.error.line = int(match["line"])
+                return True
+            return self._remaining == 0 or "Emergency stop" in line
+
+        if match := _REGEX_FILE_LINE_ERROR.match(line):
+            self.error = TeXError(
+                match["message"].strip(), match["file"], int(match["line"])
+            )
+            return True
+        if line.startswith("!"):
+            self.error = TeXError(line.lstrip("! ").strip())
+            return "Emergency stop" in line
+        if "Emergency stop" in line or _REGEX_MISSING_FILE.search(line):
+            self.error = TeXError(line.strip())
+            return True
+        return False
@@ -2,20 +2,127 @@
 
 from __future__ import annotations
 
-import shutil
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import cast
 
+from pytask import ExecutionError
 from pytask import PTask
+from pytask import PythonNode
+from pytask import Session
+from pytask import console
 from pytask import has_mark
 from pytask import hookimpl
 
+from pytask_latex.utils import is_skipped
 
-@hookimpl(trylast=True)
-def pytask_execute_task_setup(task: PTask) -> None:
-    """Check that latexmk is found on the PATH if a LaTeX task should be executed."""
-    _rich_traceback_omit = True
-    if has_mark(task, "latex") and shutil.which("latexmk") is None:
-        msg = (
-            "latexmk is needed to compile LaTeX documents, but it is not found on "
-            "your PATH."
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from collections.abc import Generator
+
+    from pytask_latex.scanner import IncludeGraph
+    from pytask_latex.toolchain import Toolchain
+
+
+@hookimpl(tryfirst=True)
+def pytask_execute(session: Session) -> None:
+    """Resolve the programs needed by LaTeX tasks before the execution starts.
+
+    A missing program fails the build before any task is executed instead of halfway
+    through it. Tasks which are skipped by markers do not need their programs, and dry
+    runs do not need any.
+
+    """
+    toolchain = _get_toolchain(session)
+    if toolchain is None:
+        return
+
+    # Imported here to keep the startup of pytask fast.
+    from pytask_latex.toolchain import get_executables  # noqa: PLC0415
+
+    needed_by: dict[str, list[str]] = {}
+    for task in session.tasks:
+        if not has_mark(task, "latex") or is_skipped(task):
+            continue
+        for step in _get_compilation_steps(task):
+            for name in get_executables(step):
+                needed_by.setdefault(name, []).append(task.name)
+
+    missing = toolchain.resolve(needed_by)
+    if missing:
+        lines = [
+            f"- {name}, needed by {', '.join(needed_by[name])}" for name in missing
+        ]
+        console.print(
+            "The following programs are needed to compile LaTeX documents, but they "
+            "are not found on your PATH.\n\n" + "\n".join(lines),
+            style="failed",
+        )
+        msg = "Programs needed by LaTeX tasks are missing."
+        raise ExecutionError(msg)
+
+
+@hookimpl(wrapper=True)
+def pytask_execute_task_setup(
+    session: Session, task: PTask
+) -> Generator[None, None, None]:
+    """Prepare the execution of a LaTeX task.
+
+    1. Scan the document again if it includes TeX files generated by other tasks. This
+       happens before pytask checks whether the dependencies of the task changed, so
+       that the newly discovered dependencies are checked as well.
+    2. Look up the paths of the programs needed by the task if no other implementation
+       skipped it. The programs are usually resolved when the execution starts, but
+       other plugins or the watch loop might execute tasks which were skipped then.
+
+    """
+    if not has_mark(task, "latex"):
+        return (yield)
+
+    if not is_skipped(task):
+        # Imported here to avoid circular imports. Importing pytask loads the plugin.
+        from pytask_latex.collect import rescan_latex_dependencies  # noqa: PLC0415
+
+        rescan_latex_dependencies(session, task)
+
+    result = yield
+
+    toolchain = _get_toolchain(session)
+    if toolchain is not None:
+        # Imported here to keep the startup of pytask fast.
+        from pytask_latex.toolchain import get_executables  # noqa: PLC0415
+
+        missing = toolchain.resolve(
+            name
+            for step in _get_compilation_steps(task)
+            for name in get_executables(step)
         )
-        raise RuntimeError(msg)
+        if missing:
+            msg = (
+                "The following programs are needed to compile the LaTeX document, but "
+                f"they are not found on your PATH: {', '.join(missing)}."
+            )
+            raise RuntimeError(msg)
+    return result
+
+
+def _get_toolchain(session: Session) -> Toolchain | None:
+    """Get the toolchain unless tasks are not executed, like in dry runs."""
+    if session.config.get("dry_run") or session.config.get("explain"):
+        return None
+    return session.config.get("latex_toolchain")
+
+
+def _get_compilation_steps(task: PTask) -> list[Callable[..., Any]]:
+    node = task.depends_on.get("_compilation_steps")
+    if not isinstance(node, PythonNode):
+        return []
+    return cast("list[Callable[..., Any]]", node.value)
+
+
+@hookimpl
+def pytask_execute_log_end(session: Session) -> None:
+    """Save the scan cache after documents have been scanned again during the build."""
+    graph: IncludeGraph | None = session.config.get("latex_include_graph")
+    if graph is not None:
+        graph.cache.save()
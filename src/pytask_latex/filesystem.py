@@ -0,0 +1,113 @@
+"""Contains an in-memory index of the file system."""
+
+from __future__ import annotations
+
+import os
+import sys
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+_IS_CASE_INSENSITIVE = sys.platform in ("darwin", "win32")
+
+
+class FileSystemIndex:
+    """An in-memory index of the file system.
+
+    Scanning LaTeX documents asks whether many candidate paths exist. On network file
+    systems, every stat call is expensive. The index lists each directory once and
+    answers all queries for files in this directory from memory. The status of a file,
+    for example, its modification time, is only requested if it is needed and then
+    memoized.
+
+    The index is a snapshot. Call :meth:`invalidate` after files have been changed.
+
+    """
+
+    def __init__(self) -> None:
+        self._directories: dict[Path, dict[str, os.DirEntry[str]]] = {}
+        self._resolved_directories: dict[Path, Path] = {}
+        self._lock = threading.Lock()
+
+    def exists(self, path: Path) -> bool:
+        """Check whether a path exists.
+
+        The type of the directory entry is known from listing the directory, so no
+        status is requested unless the path is a symlink.
+
+        """
+        entry = self._get_entry(path)
+        return entry is not None and (entry.is_file() or entry.is_dir())
+
+    def stat(self, path: Path) -> os.stat_result | None:
+        """Return the status of a path or ``None`` if it does not exist.
+
+        The status is cached by the directory entry until the directory is invalidated.
+
+        """
+        entry = self._get_entry(path)
+        try:
+            return None if entry is None else entry.stat()
+        except OSError:
+            # For example, a broken symlink.
+            return None
+
+    def resolve(self, path: Path) -> Path:
+        """Make a path absolute and resolve symlinks like :meth:`pathlib.Path.resolve`.
+
+        Only the parent directory is resolved with a system call, once per directory.
+
+        """
+        if path.name in ("", ".", ".."):
+            return path.resolve()
+
+        parent = self._resolved_directories.get(path.parent)
+        if parent is None:
+            parent = path.parent.resolve()
+            with self._lock:
+                self._resolved_directories[path.parent] = parent
+
+        resolved = parent / path.name
+        entry = self._get_entry(resolved)
+        if entry is not None and entry.is_symlink():
+            return resolved.resolve()
+        return resolved
+
+    def invalidate(self, path: Path | None = None) -> None:
+        """Forget a path and its directory or, if no path is given, everything."""
+        with self._lock:
+            if path is None:
+                self._directories = {}
+                self._resolved_directories = {}
+            else:
+                self._directories.pop(path.parent, None)
+                self._directories.pop(path, None)
+
+    def _get_entry(self, path: Path) -> os.DirEntry[str] | None:
+        entries = self._list_directory(path.parent)
+        entry = entries.get(path.name)
+        if entry is None and _IS_CASE_INSENSITIVE:
+            entry = entries.get(path.name.casefold())
+        return entry
+
+    def _list_directory(self, directory: Path) -> dict[str, os.DirEntry[str]]:
+        entries = self._directories.get(directory)
+        if entries is not None:
+            return entries
+
+        try:
+            with os.scandir(directory) as iterator:
+                entries = {entry.name: entry for entry in iterator}
+        except OSError:
+            entries = {}
+        if _IS_CASE_INSENSITIVE:
+            entries = {
+                **{name.casefold(): entry for name, entry in entries.items()},
+                **entries,
+            }
+
+        with self._lock:
+            self._directories[directory] = entries
+        return entries
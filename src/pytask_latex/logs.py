@@ -0,0 +1,124 @@
+"""Contains the capture of the output of compilation steps.
+
+:func:`compile_latex_document` captures the output of all commands which are started
+with :func:`~pytask_latex.metrics.run_command` while a task runs. The output is streamed
+to a log file per task as it arrives, so that parallel tasks do not interleave their
+output on the terminal, and only the last lines are kept in memory to report them when
+a command fails.
+
+"""
+
+from __future__ import annotations
+
+import contextvars
+import shlex
+import sys
+from collections import deque
+from contextlib import contextmanager
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from collections.abc import Generator
+    from collections.abc import Sequence
+    from io import BufferedReader
+    from pathlib import Path
+
+
+TAIL_LINES = 40
+"""The number of lines of the output which are kept to report failures."""
+
+_CHUNK_SIZE = 64 * 1024
+_MAX_LINE_LENGTH = 4096
+
+
+@dataclass(frozen=True)
+class OutputLog:
+    """The log file which receives the output of the commands of a task.
+
+    Attributes
+    ----------
+    path
+        The path to the log file or ``None`` to forward the output to stdout.
+    tail_lines
+        The number of lines of the output which are kept in memory.
+
+    """
+
+    path: Path | None
+    tail_lines: int = TAIL_LINES
+
+    def stream(
+        self,
+        cmd: Sequence[str],
+        stream: BufferedReader,
+        watch: Callable[[str], bool] | None = None,
+    ) -> tuple[str, bool]:
+        """Append the output of a command to the log file.
+
+        ``watch`` is called with every line of the output and stops reading when it
+        returns ``True``. Returns the tail of the output and whether it was stopped.
+
+        """
+        tail: deque[bytes] = deque(maxlen=self.tail_lines)
+        partial = b""
+        stopped = False
+        with (
+            nullcontext(sys.stdout.buffer)
+            if self.path is None
+            else self.path.open("ab")
+        ) as f:
+            if self.path is not None:
+                f.write(f"$ {shlex.join(cmd)}\n".encode())
+                f.flush()
+            while not stopped and (chunk := stream.read1(_CHUNK_SIZE)):
+                f.write(chunk)
+                f.flush()
+                *lines, partial = (partial + chunk).split(b"\n")
+                lines = [line[-_MAX_LINE_LENGTH:] for line in lines]
+                tail.extend(lines)
+                partial = partial[-_MAX_LINE_LENGTH:]
+                if watch is not None:
+                    stopped = any(
+                        watch(line.decode(errors="replace").rstrip()) for line in lines
+                    )
+        if partial and not stopped:
+            tail.append(partial)
+            if watch is not None:
+                stopped = watch(partial.decode(errors="replace").rstrip())
+        decoded = [line.decode(errors="replace").rstrip() for line in tail]
+        return "\n".join(decoded).strip("\n"), stopped
+
+
+_CURRENT_LOG: contextvars.ContextVar[OutputLog | None] = contextvars.ContextVar(
+    "_CURRENT_LOG", default=None
+)
+
+
+@contextmanager
+def capture_output(path: Path | None) -> Generator[OutputLog | None, None, None]:
+    """Capture the output of commands in a log file.
+
+    The log file is truncated. If ``path`` is ``None``, the output is not captured and
+    commands inherit the standard streams.
+
+    """
+    if path is None:
+        yield None
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"")
+    log = OutputLog(path)
+    token = _CURRENT_LOG.set(log)
+    try:
+        yield log
+    finally:
+        _CURRENT_LOG.reset(token)
+
+
+def get_current_log() -> OutputLog | None:
+    """Return the log file which captures the output of commands, if any."""
+    return _CURRENT_LOG.get()
@@ -0,0 +1,303 @@
+"""Contains the instrumentation of compilation steps.
+
+:func:`compile_latex_document` measures every compilation step while it runs. The
+commands of the built-in steps are started with :func:`run_command` which collects the
+CPU time and the peak memory of each child process. Steps report other measurements with
+:func:`record`, like the number of passes of engines or the bytes saved by optimizing
+the document. The measurements are appended to a JSON-lines file per session, which also
+works when tasks are executed in other processes, and shown in a table at the end of the
+build.
+
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from contextlib import suppress
+from dataclasses import asdict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import cast
+
+from pytask import ExecutionReport
+from pytask import Session
+from pytask import console
+from pytask import hookimpl
+
+from pytask_latex.errors import ErrorWatcher
+from pytask_latex.errors import FatalTeXError
+from pytask_latex.logs import OutputLog
+from pytask_latex.logs import get_current_log
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+    from collections.abc import Sequence
+    from io import BufferedReader
+    from pathlib import Path
+
+
+@dataclass
+class StepMetrics:
+    """The measurements of one compilation step.
+
+    Attributes
+    ----------
+    task
+        The name of the task.
+    step
+        The name of the compilation step.
+    status
+        ``"success"`` or ``"failed"``.
+    wall_time
+        The duration of the step in seconds.
+    cpu_time
+        The user and system CPU time of the commands run by the step in seconds.
+    peak_rss
+        The largest resident set size of the commands run by the step in bytes.
+    n_commands
+        The number of commands run by the step.
+    passes
+        The number of passes of the engine if the step reports it.
+    output_size
+        The size of the document after the step in bytes.
+    bytes_saved
+        The number of bytes by which the step shrank the document if the step reports
+        it.
+
+    """
+
+    task: str
+    step: str
+    status: str = "success"
+    wall_time: float = 0.0
+    cpu_time: float | None = None
+    peak_rss: int | None = None
+    n_commands: int = 0
+    passes: int | None = None
+    output_size: int | None = None
+    bytes_saved: int | None = None
+
+
+_CURRENT_STEP: contextvars.ContextVar[StepMetrics | None] = contextvars.ContextVar(
+    "_CURRENT_STEP", default=None
+)
+
+_SEARCH_PATHS: contextvars.ContextVar[tuple[Path, ...]] = contextvars.ContextVar(
+    "_SEARCH_PATHS", default=()
+)
+
+_SEARCH_PATH_VARIABLES = ("TEXINPUTS", "BIBINPUTS", "BSTINPUTS")
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS.
+_RSS_FACTOR = 1 if sys.platform == "darwin" else 1024
+
+
+@contextmanager
+def measure_step(
+    task: str, step: str, path_to_document: Path, path_to_metrics: Path | None
+) -> Generator[StepMetrics, None, None]:
+    """Measure a compilation step and append the result to the metrics file."""
+    metrics = StepMetrics(task=task, step=step)
+    token = _CURRENT_STEP.set(metrics)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    except BaseException:
+        metrics.status = "failed"
+        raise
+    finally:
+        metrics.wall_time = time.perf_counter() - start
+        _CURRENT_STEP.reset(token)
+        if path_to_document.exists():
+            metrics.output_size = path_to_document.stat().st_size
+        if path_to_metrics is not None:
+            _append_metrics(path_to_metrics, metrics)
+
+
+def record(*, passes: int | None = None, bytes_saved: int | None = None) -> None:
+    """Record the engine passes or the bytes saved by the current compilation step."""
+    metrics = _CURRENT_STEP.get()
+    if metrics is None:
+        return
+    if passes is not None:
+        metrics.passes = (metrics.passes or 0) + passes
+    if bytes_saved is not None:
+        metrics.bytes_saved = (metrics.bytes_saved or 0) + bytes_saved
+
+
+@contextmanager
+def add_search_paths(*paths: Path) -> Generator[None, None, None]:
+    """Add directories in which the commands run by :func:`run_command` look up files.
+
+    The directories are added to the search paths of TeX, BibTeX, and biber after the
+    working directory and before the search paths in the environment, so that a copy
+    of a document in another directory finds the files next to the original.
+
+    """
+    token = _SEARCH_PATHS.set((*_SEARCH_PATHS.get(), *paths))
+    try:
+        yield
+    finally:
+        _SEARCH_PATHS.reset(token)
+
+
+def run_command(
+    cmd: Sequence[str],
+    *,
+    check: bool = True,
+    watch: ErrorWatcher | None = None,
+    **kwargs: Any,
+) -> subprocess.CompletedProcess[Any]:
+    """Run a command like :func:`subprocess.run` and measure its resource usage.
+
+    On POSIX systems, the child process is reaped with :func:`os.wait4` which returns
+    the CPU time and the peak memory of exactly this process.
+
+    While a task captures the output of its commands, stdout and stderr are streamed to
+    the log file of the task and a failing command reports the tail of its output in
+    :attr:`subprocess.CalledProcessError.output`.
+
+    If an :class:`~pytask_latex.errors.ErrorWatcher` is passed, the command runs in a
+    new process group which is terminated as soon as the output shows a fatal error,
+    and :class:`~pytask_latex.errors.FatalTeXError` is raised.
+
+    Directories added with :func:`add_search_paths` are added to the search paths in
+    the environment of the command.
+
+    """
+    if _SEARCH_PATHS.get():
+        kwargs = {**kwargs, "env": _add_search_paths_to_env(kwargs.get("env"))}
+    log = get_current_log() if "stdout" not in kwargs else None
+    if log is None and watch is not None:
+        log = OutputLog(None)
+    if log is not None:
+        kwargs = {**kwargs, "stdout": subprocess.PIPE, "stderr": subprocess.STDOUT}
+    if watch is not None and os.name == "posix":
+        kwargs["start_new_session"] = True
+
+    output = None
+    stopped = False
+    with subprocess.Popen(cmd, **kwargs) as process:  # noqa: S603
+        if log is not None:
+            output, stopped = log.stream(
+                cmd, cast("BufferedReader", process.stdout), watch
+            )
+        if stopped:
+            _terminate_process_group(process)
+        if hasattr(os, "wait4"):
+            _, status, rusage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            _record_rusage(rusage.ru_utime + rusage.ru_stime, rusage.ru_maxrss)
+        else:
+            process.wait()
+            _record_rusage(None, None)
+
+    if (
+        watch is not None
+        and watch.error is not None
+        and (stopped or process.returncode)
+    ):
+        raise FatalTeXError(process.returncode, list(cmd), output, watch.error)
+    if check and process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, cmd, output=output)
+    return subprocess.CompletedProcess(cmd, process.returncode)
+
+
+def _add_search_paths_to_env(env: dict[str, str] | None) -> dict[str, str]:
+    """Add the directories of :func:`add_search_paths` to the search paths."""
+    env = dict(os.environ if env is None else env)
+    directories = os.pathsep.join([".", *(str(path) for path in _SEARCH_PATHS.get())])
+    for name in _SEARCH_PATH_VARIABLES:
+        env[name] = f"{directories}{os.pathsep}{env.get(name, '')}"
+    return env
+
+
+def _terminate_process_group(process: subprocess.Popen[Any]) -> None:
+    """Terminate a process and all processes it started, like the engines of latexmk."""
+    if os.name == "posix":
+        with suppress(ProcessLookupError):
+            os.killpg(process.pid, signal.SIGTERM)
+    else:
+        process.kill()
+
+
+def _record_rusage(cpu_time: float | None, max_rss: int | None) -> None:
+    metrics = _CURRENT_STEP.get()
+    if metrics is None:
+        return
+    metrics.n_commands += 1
+    if cpu_time is not None:
+        metrics.cpu_time = (metrics.cpu_time or 0.0) + cpu_time
+    if max_rss is not None:
+        metrics.peak_rss = max(metrics.peak_rss or 0, max_rss * _RSS_FACTOR)
+
+
+def _append_metrics(path: Path, metrics: StepMetrics) -> None:
+    """Append one line to the metrics file.
+
+    Single appends of short lines are atomic, so that processes can share the file.
+
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    line = json.dumps(asdict(metrics)) + "\n"
+    with path.open("a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def read_metrics(path: Path) -> list[StepMetrics]:
+    """Read the measurements from a metrics file."""
+    if not path.exists():
+        return []
+    with path.open(encoding="utf-8") as f:
+        return [StepMetrics(**json.loads(line)) for line in f if line.strip()]
+
+
+@hookimpl(trylast=True)
+def pytask_execute_log_end(
+    session: Session,
+    reports: list[ExecutionReport],  # noqa: ARG001
+) -> None:
+    """Show the measurements of the compilation steps in a table."""
+    path = session.config.get("latex_metrics_path")
+    if path is None:
+        return
+    metrics = read_metrics(path)
+    if not metrics:
+        return
+
+    # Imported here to keep the startup of pytask fast.
+    from rich.table import Table  # noqa: PLC0415
+
+    # Only steps which optimize the document report the bytes they saved.
+    show_saved = any(item.bytes_saved is not None for item in metrics)
+    columns = ["Task", "Step", "Passes", "Wall", "CPU", "Peak RSS", "Output"]
+    table = Table(*columns, *(["Saved"] if show_saved else []))
+    for item in sorted(metrics, key=lambda x: x.wall_time, reverse=True):
+        row = [
+            item.task,
+            item.step if item.status == "success" else f"{item.step} (failed)",
+            _format(item.passes, "{}"),
+            _format(item.wall_time, "{:.2f}s"),
+            _format(item.cpu_time, "{:.2f}s"),
+            _format(item.peak_rss and item.peak_rss / 1024**2, "{:.1f} MB"),
+            _format(item.output_size and item.output_size / 1024, "{:.1f} KB"),
+        ]
+        if show_saved:
+            row.append(
+                _format(item.bytes_saved and item.bytes_saved / 1024, "{:.1f} KB")
+            )
+        table.add_row(*row)
+    console.print(table)
+    console.print(f"Measurements of the LaTeX compilation steps are in {path}.")
+
+
+def _format(value: float | None, template: str) -> str:
+    return "" if value is None else template.format(value)
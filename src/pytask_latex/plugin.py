@@ -6,17 +6,26 @@ from typing import TYPE_CHECKING
 
 from pytask import hookimpl
 
-from pytask_latex import collect
-from pytask_latex import config
-from pytask_latex import execute
-
 if TYPE_CHECKING:
     from pluggy import PluginManager
 
 
 @hookimpl
 def pytask_add_hooks(pm: PluginManager) -> None:
-    """Register some plugins."""
+    """Register some plugins.
+
+    The hooks of optional features are registered by
+    :func:`pytask_latex.config.pytask_post_parse` once the configuration is known.
+
+    """
+    # Imported here to keep the startup of pytask fast and to avoid circular imports.
+    # Importing pytask loads the plugin.
+    from pytask_latex import build  # noqa: PLC0415
+    from pytask_latex import collect  # noqa: PLC0415
+    from pytask_latex import config  # noqa: PLC0415
+    from pytask_latex import execute  # noqa: PLC0415
+
+    pm.register(build)
     pm.register(collect)
     pm.register(config)
     pm.register(execute)
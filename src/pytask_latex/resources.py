@@ -0,0 +1,173 @@
+"""Contains a session-wide pool of resources for LaTeX tasks.
+
+Every LaTeX task demands resources, by default a weight of one and no memory, which can
+be changed with ``@mark.latex(..., resources={"weight": 2, "memory": 4096})``. If the
+configuration value ``latex_resources`` limits the total weight or memory, a task waits
+before its compilation steps run until the pool has enough resources left.
+
+The pool is a file in the cache directory which is shared by all processes of a session,
+so it works independently of the number of workers of pytask-parallel. The file lists
+the resources held by each running task and is only changed while it is locked. Entries
+of processes which died are removed.
+
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from dataclasses import field
+from typing import TYPE_CHECKING
+from typing import Any
+
+from pytask import Session
+from pytask import hookimpl
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+    from pathlib import Path
+
+
+RESOURCES = ("weight", "memory")
+"""The resources which can be demanded by tasks and limited by the configuration."""
+
+DEFAULT_DEMAND = {"weight": 1, "memory": 0}
+
+
+def parse_resources(value: Any, name: str) -> dict[str, int]:
+    """Validate a mapping of resources to non-negative integers."""
+    if value is None:
+        return {}
+    if not isinstance(value, dict) or not all(
+        key in RESOURCES and isinstance(amount, int) and amount >= 0
+        for key, amount in value.items()
+    ):
+        msg = (
+            f"{name!r} must be a mapping from {' or '.join(map(repr, RESOURCES))} to "
+            f"non-negative integers, but it is {value!r}."
+        )
+        raise ValueError(msg)
+    return dict(value)
+
+
+@dataclass(frozen=True)
+class ResourcePool:
+    """A pool of resources shared by the processes of a session.
+
+    Attributes
+    ----------
+    path
+        The file which records the resources held by running tasks.
+    capacity
+        The total amount of each limited resource. Other resources are unlimited.
+    poll_interval
+        The time in seconds between attempts to acquire resources.
+
+    """
+
+    path: Path
+    capacity: dict[str, int] = field(default_factory=dict)
+    poll_interval: float = 0.1
+
+    def check(self, demand: dict[str, int], task_name: str) -> None:
+        """Check that the pool can ever satisfy the demand of a task."""
+        for resource, amount in demand.items():
+            if resource in self.capacity and amount > self.capacity[resource]:
+                msg = (
+                    f"Task {task_name!r} demands {amount} {resource}, but "
+                    f"'latex_resources' limits it to {self.capacity[resource]}."
+                )
+                raise ValueError(msg)
+
+    @contextmanager
+    def acquire(self, demand: dict[str, int]) -> Generator[None, None, None]:
+        """Wait until the demanded resources are available and hold them."""
+        demand = {**DEFAULT_DEMAND, **demand}
+        key = f"{os.getpid()}-{threading.get_ident()}-{uuid.uuid4().hex}"
+        while not self._try_acquire(key, demand):
+            time.sleep(self.poll_interval)
+        try:
+            yield
+        finally:
+            with self._locked() as holders:
+                holders.pop(key, None)
+
+    def _try_acquire(self, key: str, demand: dict[str, int]) -> bool:
+        with self._locked() as holders:
+            for resource, capacity in self.capacity.items():
+                used = sum(holder.get(resource, 0) for holder in holders.values())
+                # A task always starts if the pool is empty.
+                if holders and used + demand.get(resource, 0) > capacity:
+                    return False
+            holders[key] = demand
+            return True
+
+    @contextmanager
+    def _locked(self) -> Generator[dict[str, dict[str, int]], None, None]:
+        """Lock the file and yield the holders which are written back afterwards."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a+", encoding="utf-8") as f:
+            _lock(f.fileno())
+            try:
+                f.seek(0)
+                content = f.read()
+                holders = json.loads(content) if content else {}
+                holders = {
+                    key: value
+                    for key, value in holders.items()
+                    if _is_alive(int(key.split("-", 1)[0]))
+                }
+                yield holders
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(holders))
+                f.flush()
+            finally:
+                _unlock(f.fileno())
+
+
+if sys.platform == "win32":  # pragma: no cover
+    import msvcrt
+
+    def _lock(fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+    def _unlock(fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+    def _is_alive(pid: int) -> bool:  # noqa: ARG001
+        return True
+
+else:
+    import fcntl
+
+    def _lock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _is_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:  # pragma: no cover
+            return True
+        return True
+
+
+@hookimpl
+def pytask_unconfigure(session: Session) -> None:
+    """Remove the file of the resource pool."""
+    pool = session.config.get("latex_resource_pool")
+    if pool is not None:
+        pool.path.unlink(missing_ok=True)
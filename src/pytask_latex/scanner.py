@@ -0,0 +1,539 @@
+"""Scan LaTeX documents for included files.
+
+The scanner follows the rules of :func:`latex_dependency_scanner.scan`, but splits the
+work into two parts.
+
+1. Parsing extracts the inclusion instructions from a single file. The result depends
+   only on the content of the file and is stored in a persistent :class:`ScanCache` so
+   that unchanged files are never parsed twice.
+2. Resolving turns the instructions into paths. It depends on the location of the root
+   document and on which files exist. The :class:`IncludeGraph` resolves every file
+   once per session and shares the results between documents.
+
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from pathlib import Path
+from typing import Any
+from typing import NamedTuple
+
+from pytask_latex.filesystem import FileSystemIndex
+
+_CACHE_VERSION = 1
+
+_RACY_WINDOW_NS = 2_000_000_000
+"""int: Files modified less than two seconds before they were parsed are verified with
+their content hash on the next lookup since a later change might not alter their size or
+modification time."""
+
+
+class ScanBackend(Enum):
+    """The backends for scanning LaTeX documents concurrently."""
+
+    NONE = "none"
+    THREADS = "threads"
+    PROCESSES = "processes"
+
+
+class Include(NamedTuple):
+    r"""An inclusion instruction like ``\input{file}`` found in a LaTeX file."""
+
+    kind: str
+    relative_to: str | None
+    files: tuple[str, ...]
+
+
+def parse_includes(text: str) -> list[Include]:
+    """Parse the inclusion instructions from the content of a LaTeX file."""
+    # latex_dependency_scanner is imported in the functions which use it, so that the
+    # plugin does not slow down the startup of pytask in projects without LaTeX tasks.
+    from latex_dependency_scanner.scanner import REGEX_TEX  # noqa: PLC0415
+
+    return [
+        Include(
+            kind=match.group("type"),
+            relative_to=match.group("relative_to"),
+            files=tuple(file for file in match.group("file").split(",") if file),
+        )
+        for match in REGEX_TEX.finditer(text)
+        if match.group("type") not in ("usepackage", "RequirePackage")
+    ]
+
+
+class ScanCache:
+    """A persistent cache for the inclusion instructions of LaTeX files.
+
+    Entries are keyed by the path of a file and validated with its size and modification
+    time. If those changed, the content hash decides whether the file needs to be parsed
+    again. The least recently used entries are evicted when the cache holds more than
+    ``max_entries`` files.
+
+    Parameters
+    ----------
+    path
+        The path to the file which stores the cache. If it is ``None``, the cache only
+        lives in memory.
+    max_entries
+        The maximum number of files kept in the cache.
+
+    """
+
+    def __init__(self, path: Path | None = None, max_entries: int = 10_000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict[str, dict[str, Any]] = {}
+        self._accessed: set[str] = set()
+        self._clock = 0
+        self._modified = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        """Return the number of cached files."""
+        return len(self._entries)
+
+    def load(self) -> None:
+        """Load the cache from disk. A missing or broken file yields an empty cache."""
+        if self.path is None:
+            return
+        with contextlib.suppress(Exception):
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data["version"] == _CACHE_VERSION:
+                self._entries = data["entries"]
+                self._clock = data["clock"]
+
+    def save(self) -> None:
+        """Evict the least recently used entries and write the cache to disk.
+
+        Nothing is written if no file has been parsed or merged since the cache was
+        loaded or saved. Then, only the recency of entries would change.
+
+        """
+        if not self._modified:
+            return
+        self._modified = False
+
+        if len(self._entries) > self.max_entries:
+            keep = sorted(
+                self._entries, key=lambda key: self._entries[key]["used"], reverse=True
+            )[: self.max_entries]
+            self._entries = {key: self._entries[key] for key in keep}
+
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": _CACHE_VERSION,
+            "clock": self._clock,
+            "entries": self._entries,
+        }
+        tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(json.dumps(data), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+    def get_includes(
+        self, path: Path, stat: os.stat_result | None = None
+    ) -> list[Include]:
+        """Return the inclusion instructions of a file and parse it if necessary.
+
+        The status of the file can be passed if it is already known.
+
+        """
+        key = path.as_posix()
+        stat = path.stat() if stat is None else stat
+
+        with self._lock:
+            self._clock += 1
+            self._accessed.add(key)
+            entry = self._entries.get(key)
+            if (
+                entry is not None
+                and not entry["racy"]
+                and entry["size"] == stat.st_size
+                and entry["mtime_ns"] == stat.st_mtime_ns
+            ):
+                self.hits += 1
+                entry["used"] = self._clock
+                return _includes_from_entry(entry)
+
+        content = path.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()
+        if entry is not None and entry["hash"] == digest:
+            includes = _includes_from_entry(entry)
+            is_hit = True
+        else:
+            includes = parse_includes(content.decode("utf-8"))
+            is_hit = False
+
+        with self._lock:
+            self.hits += is_hit
+            self.misses += not is_hit
+            self._modified = True
+            self._entries[key] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "racy": time.time_ns() - stat.st_mtime_ns < _RACY_WINDOW_NS,
+                "hash": digest,
+                "includes": [list(include) for include in includes],
+                "used": self._clock,
+            }
+        return includes
+
+    def export_accessed(self) -> dict[str, dict[str, Any]]:
+        """Return the entries of all files accessed since the last export."""
+        with self._lock:
+            entries = {
+                key: self._entries[key]
+                for key in sorted(self._accessed)
+                if key in self._entries
+            }
+            self._accessed = set()
+        return entries
+
+    def merge(self, entries: dict[str, dict[str, Any]]) -> None:
+        """Merge entries exported from another cache, for example, in a subprocess."""
+        with self._lock:
+            self._modified |= bool(entries)
+            for key, entry in entries.items():
+                self._clock += 1
+                self._entries[key] = {**entry, "used": self._clock}
+
+    def clear(self) -> None:
+        """Remove all entries from the cache."""
+        with self._lock:
+            self._entries = {}
+            self._accessed = set()
+            self._clock = 0
+            self._modified = True
+
+
+def _includes_from_entry(entry: dict[str, Any]) -> list[Include]:
+    return [Include(kind, rel, tuple(files)) for kind, rel, files in entry["includes"]]
+
+
+class IncludeGraph:
+    """A graph of LaTeX files and the files they include.
+
+    The nodes of the graph are LaTeX files together with the directory their inclusion
+    instructions are relative to. Every node is parsed and resolved at most once, so
+    subtrees shared by many documents like a common preamble are only read once per
+    session. The dependencies of a document are collected by traversing the graph.
+
+    During a pytask session, the graph is available as
+    ``session.config["latex_include_graph"]``.
+
+    Parameters
+    ----------
+    cache
+        The cache for the inclusion instructions of files. If it is ``None``, a
+        temporary cache is used.
+    index
+        The index used to look up files. If it is ``None``, a new index is used.
+
+    """
+
+    def __init__(
+        self, cache: ScanCache | None = None, index: FileSystemIndex | None = None
+    ) -> None:
+        self.cache = ScanCache() if cache is None else cache
+        self.index = FileSystemIndex() if index is None else index
+        self._edges: dict[tuple[Path, Path], list[tuple[Path, Path | None]]] = {}
+        self._unexported: list[tuple[Path, Path]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def files(self) -> set[Path]:
+        """Return all LaTeX files which have been parsed."""
+        return {path for path, _ in self._edges}
+
+    def dependencies(self, path: Path, relative_to: Path | None = None) -> list[Path]:
+        """Return the document and all files it includes in the order they are found.
+
+        Missing files are represented by all paths which have been tried.
+
+        """
+        root = (path, path.parent if relative_to is None else relative_to)
+        return self._traverse([path], root, self.edges(*root))
+
+    def text_dependencies(self, text: str, path: Path) -> list[Path]:
+        """Return the files included by a text as if it were the content of a file.
+
+        The result does not contain ``path`` itself. It is used, for example, to find
+        the files included by the preamble of a document.
+
+        """
+        root = (path, path.parent)
+        edges = self._resolve_includes(parse_includes(text), *root)
+        return self._traverse([], root, edges)
+
+    def _traverse(
+        self,
+        nodes: list[Path],
+        root: tuple[Path, Path],
+        edges: list[tuple[Path, Path | None]],
+    ) -> list[Path]:
+        """Collect nodes by traversing the graph from the edges of a root."""
+        seen = set(nodes)
+        visited = {root}
+        stack = [iter(edges)]
+        while stack:
+            for target, relative_to in stack[-1]:
+                if target not in seen:
+                    seen.add(target)
+                    nodes.append(target)
+                if relative_to is not None and (target, relative_to) not in visited:
+                    visited.add((target, relative_to))
+                    stack.append(iter(self.edges(target, relative_to)))
+                    break
+            else:
+                stack.pop()
+        return nodes
+
+    def edges(
+        self, path: Path, relative_to: Path | None = None
+    ) -> list[tuple[Path, Path | None]]:
+        """Return the files included by a LaTeX file.
+
+        Each edge consists of the included path and, for LaTeX files, the directory
+        their inclusion instructions are relative to. For other files, it is ``None``.
+
+        """
+        key = (path, path.parent if relative_to is None else relative_to)
+        edges = self._edges.get(key)
+        if edges is None:
+            edges = self._resolve(*key)
+            with self._lock:
+                if key not in self._edges:
+                    self._edges[key] = edges
+                    self._unexported.append(key)
+        return edges
+
+    def export_edges(self) -> dict[tuple[Path, Path], list[tuple[Path, Path | None]]]:
+        """Return all edges resolved since the last export."""
+        with self._lock:
+            keys, self._unexported = self._unexported, []
+        return {key: self._edges[key] for key in keys}
+
+    def merge(
+        self, edges: dict[tuple[Path, Path], list[tuple[Path, Path | None]]]
+    ) -> None:
+        """Merge edges exported from another graph, for example, in a subprocess."""
+        with self._lock:
+            for key, value in edges.items():
+                if key not in self._edges:
+                    self._edges[key] = value
+                    self._unexported.append(key)
+
+    @property
+    def targets(self) -> set[Path]:
+        """Return all paths which parsed files include or tried to include."""
+        with self._lock:
+            return {target for edges in self._edges.values() for target, _ in edges}
+
+    def invalidate(self, paths: set[Path]) -> None:
+        """Forget the edges which might have changed with the given files.
+
+        Changed files are parsed and resolved again. Files including a file which was
+        created or deleted are resolved again since the inclusion might point to another
+        file now. All other edges are kept.
+
+        """
+        existed = {path: self.index.exists(path) for path in paths}
+        for path in paths:
+            self.index.invalidate(path)
+        created_or_deleted = {
+            path for path in paths if self.index.exists(path) != existed[path]
+        }
+        with self._lock:
+            stale = {
+                key
+                for key, edges in self._edges.items()
+                if key[0] in paths
+                or any(target in created_or_deleted for target, _ in edges)
+            }
+            for key in stale:
+                del self._edges[key]
+            self._unexported = [key for key in self._unexported if key not in stale]
+
+    def _resolve(self, path: Path, relative_to: Path) -> list[tuple[Path, Path | None]]:
+        """Resolve the inclusion instructions of a file to paths."""
+        stat = self.index.stat(path)
+        if stat is None:
+            raise FileNotFoundError(path)
+        return self._resolve_includes(
+            self.cache.get_includes(path, stat), path, relative_to
+        )
+
+    def _resolve_includes(
+        self, includes: list[Include], path: Path, relative_to: Path
+    ) -> list[tuple[Path, Path | None]]:
+        """Resolve inclusion instructions found in a file to paths."""
+        from latex_dependency_scanner.scanner import COMMON_TEX_EXTENSIONS  # noqa: PLC0415
+
+        edges: list[tuple[Path, Path | None]] = []
+        for include in includes:
+            for file in include.files:
+                target: Path | str
+                if include.kind == "import":
+                    target = relative_to.joinpath(include.relative_to or "", file)
+                elif include.kind == "subimport":
+                    target = path.parent.joinpath(include.relative_to or "", file)
+                    relative_to = target.parent
+                else:
+                    target = file
+
+                resolved = self.index.resolve(relative_to.joinpath(target))
+                candidates = [
+                    resolved.with_suffix(extension) if extension else resolved
+                    for extension in _get_common_extensions(include.kind, file)
+                ]
+                for candidate in candidates:
+                    if self.index.exists(candidate):
+                        is_tex = candidate.suffix in COMMON_TEX_EXTENSIONS
+                        edges.append((candidate, relative_to if is_tex else None))
+                        break
+                else:
+                    edges.extend((candidate, None) for candidate in candidates)
+        return edges
+
+
+def scan(paths: Path | list[Path], cache: ScanCache | None = None) -> list[Path]:
+    """Scan the documents provided as paths for included files.
+
+    The function returns the same paths as :func:`latex_dependency_scanner.scan`
+    including possible paths for files which were not found. Files which are included
+    multiple times with the same relative location are only traversed once.
+
+    Parameters
+    ----------
+    paths
+        Paths to LaTeX files which are scanned for included files.
+    cache
+        The cache for the inclusion instructions of files. If it is ``None``, a
+        temporary cache is used.
+
+    """
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+
+    graph = IncludeGraph(cache)
+    return list(
+        dict.fromkeys(node for path in paths for node in graph.dependencies(Path(path)))
+    )
+
+
+def scan_documents(
+    paths: list[Path],
+    graph: IncludeGraph,
+    backend: ScanBackend = ScanBackend.NONE,
+    n_workers: int = 1,
+) -> dict[Path, list[Path] | Exception]:
+    """Scan many LaTeX documents, possibly concurrently.
+
+    Every document is scanned only once even if it is passed multiple times. The results
+    are returned and merged into the graph and its cache in the order of the paths, so
+    they do not depend on the backend.
+
+    Parameters
+    ----------
+    paths
+        Paths to the LaTeX documents.
+    graph
+        The include graph which is extended with the scanned documents. Subprocesses
+        load the cache of the graph from disk and their results are merged back after
+        the scan.
+    backend
+        The backend used to scan the documents concurrently.
+    n_workers
+        The number of threads or processes.
+
+    Returns
+    -------
+    dict[Path, list[Path] | Exception]
+        A mapping from documents to the scanned paths or to the exception which was
+        raised while scanning.
+
+    """
+    unique_paths = list(dict.fromkeys(paths))
+
+    if backend == ScanBackend.NONE or n_workers <= 1 or len(unique_paths) <= 1:
+        return {path: _scan_safely(path, graph) for path in unique_paths}
+
+    if backend == ScanBackend.THREADS:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            results = executor.map(lambda p: _scan_safely(p, graph), unique_paths)
+            return dict(zip(unique_paths, results, strict=True))
+
+    scan_results: dict[Path, list[Path] | Exception] = {}
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        initializer=_initialize_worker,
+        initargs=(graph.cache.path,),
+    ) as executor:
+        chunksize = max(1, len(unique_paths) // (4 * n_workers))
+        results = executor.map(_scan_in_worker, unique_paths, chunksize=chunksize)
+        for path, (result, entries, edges) in zip(unique_paths, results, strict=True):
+            graph.cache.merge(entries)
+            graph.merge(edges)
+            scan_results[path] = result
+    return scan_results
+
+
+def _scan_safely(path: Path, graph: IncludeGraph) -> list[Path] | Exception:
+    try:
+        return graph.dependencies(path)
+    except Exception as e:  # noqa: BLE001
+        return e
+
+
+_WORKER_GRAPH = IncludeGraph()
+"""IncludeGraph: The include graph of a subprocess which scans documents."""
+
+
+def _initialize_worker(path: Path | None) -> None:
+    global _WORKER_GRAPH  # noqa: PLW0603
+    cache = ScanCache(path=path)
+    cache.load()
+    _WORKER_GRAPH = IncludeGraph(cache)
+
+
+def _scan_in_worker(
+    path: Path,
+) -> tuple[
+    list[Path] | Exception,
+    dict[str, dict[str, Any]],
+    dict[tuple[Path, Path], list[tuple[Path, Path | None]]],
+]:
+    result = _scan_safely(path, _WORKER_GRAPH)
+    return (
+        result,
+        _WORKER_GRAPH.cache.export_accessed(),
+        _WORKER_GRAPH.export_edges(),
+    )
+
+
+def _get_common_extensions(kind: str, file: str) -> list[str]:
+    """Get the extensions which are tried for an included file."""
+    from latex_dependency_scanner.scanner import COMMON_GRAPHICS_EXTENSIONS  # noqa: PLC0415
+
+    if kind in ("addbibresource", "bibliography", "putbib"):
+        return [".bib"]
+    if kind in ("input", "include", "import", "subimport"):
+        return [".tex"]
+    if kind == "includegraphics":
+        extension = Path(file).suffix
+        if extension in COMMON_GRAPHICS_EXTENSIONS:
+            return [extension]
+        return COMMON_GRAPHICS_EXTENSIONS
+    return [""]
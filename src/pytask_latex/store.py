@@ -0,0 +1,346 @@
+"""Contains a content-addressed store for the outputs of LaTeX tasks.
+
+Compiling a document is deterministic enough that the same inputs produce an equivalent
+document. The store keeps the products of compiled tasks under a key which is derived
+from the content of all dependencies and the compilation steps. When a workspace is
+restored or a branch is checked out again, the products are restored from the store
+instead of compiling the document again.
+
+"""
+
+from __future__ import annotations
+
+import enum
+import functools
+import hashlib
+import shutil
+import tempfile
+import threading
+import types
+from pathlib import Path
+from pathlib import PurePath
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import cast
+
+from pytask import ExecutionReport
+from pytask import Persisted
+from pytask import PPathNode
+from pytask import PTask
+from pytask import PythonNode
+from pytask import Session
+from pytask import console
+from pytask import has_mark
+from pytask import hookimpl
+from pytask.tree_util import tree_leaves
+
+from pytask_latex.utils import copy_file_atomically
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from collections.abc import Sequence
+
+_STORE_VERSION = 2
+
+_PRIMITIVE_TYPES = (bool, int, float, complex, str, bytes)
+
+
+class OutputStore:
+    """A content-addressed store for the products of LaTeX tasks.
+
+    Each entry is a directory named after its key which contains the products in the
+    order of their paths. The modification time of the directory is the time of the
+    last use and entries which have not been used for the longest time are evicted once
+    the store exceeds its maximum size.
+
+    Parameters
+    ----------
+    path
+        The directory of the store.
+    max_size
+        The maximum size of the store in bytes.
+    root
+        Paths are hashed relative to the root to allow moving the project.
+
+    """
+
+    def __init__(self, path: Path, max_size: int, root: Path) -> None:
+        self.path = path
+        self.max_size = max_size
+        self.root = root
+        self.hits = 0
+        self.misses = 0
+        self._keys: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def compute_key(
+        self,
+        signature: str,
+        dependencies: Sequence[Path],
+        products: Sequence[Path],
+        compilation_steps: Sequence[Callable[..., Any]],
+    ) -> str | None:
+        """Compute the key of a task and remember it under the signature of the task.
+
+        Returns ``None`` if a dependency is missing or a compilation step cannot be
+        fingerprinted. The products of the task are not cached then.
+
+        """
+        with self._lock:
+            self._keys.pop(signature, None)
+
+        hash_ = hashlib.sha256(f"{_STORE_VERSION}".encode())
+        for step in compilation_steps:
+            fingerprint = fingerprint_step(step)
+            if fingerprint is None:
+                return None
+            hash_.update(fingerprint.encode())
+        for path in sorted(dependencies):
+            hash_.update(f"\0dependency\0{self._relative(path)}\0".encode())
+            try:
+                hash_.update(_hash_file(path))
+            except OSError:
+                return None
+        for path in products:
+            hash_.update(f"\0product\0{self._relative(path)}".encode())
+
+        key = hash_.hexdigest()
+        with self._lock:
+            self._keys[signature] = key
+        return key
+
+    def contains(self, signature: str, products: Sequence[Path]) -> bool:
+        """Check whether the products of a task can be restored from the store."""
+        key = self._keys.get(signature)
+        return key is not None and all(
+            file.is_file() for file in self._get_files(key, products)
+        )
+
+    def restore(self, signature: str, products: Sequence[Path]) -> bool:
+        """Restore the products of a task from the store if they exist."""
+        key = self._keys.get(signature)
+        if key is None:
+            return False
+
+        entry = self.path / key
+        files = self._get_files(key, products)
+        if not all(file.is_file() for file in files):
+            with self._lock:
+                self.misses += 1
+            return False
+
+        for file, product in zip(files, products, strict=True):
+            copy_file_atomically(file, product)
+        # Mark the entry as recently used.
+        entry.touch()
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def _get_files(self, key: str, products: Sequence[Path]) -> list[Path]:
+        return [self.path / key / str(i) for i in range(len(products))]
+
+    def save(self, signature: str, products: Sequence[Path]) -> None:
+        """Save the products of a task in the store."""
+        key = self._keys.pop(signature, None)
+        if key is None or (self.path / key).exists():
+            return
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp_dir = Path(tempfile.mkdtemp(dir=self.path, prefix=".tmp-"))
+        try:
+            for i, product in enumerate(products):
+                shutil.copy2(product, tmp_dir / str(i))
+            tmp_dir.rename(self.path / key)
+        except OSError:
+            # Another process might have saved the same entry.
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def evict(self) -> None:
+        """Evict the least recently used entries until the store fits its size."""
+        if not self.path.exists():
+            return
+
+        entries = []
+        for entry in self.path.iterdir():
+            if entry.name.startswith(".tmp-"):
+                continue
+            size = sum(file.stat().st_size for file in entry.iterdir())
+            entries.append((entry.stat().st_mtime_ns, size, entry))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total_size -= size
+
+    def _relative(self, path: Path) -> str:
+        try:
+            return path.relative_to(self.root).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+
+def fingerprint_step(step: Any) -> str | None:
+    """Create a fingerprint of a compilation step.
+
+    The fingerprint consists of the name and the bytecode of the step including its
+    constants, its default arguments, and the values it closes over, for example, the
+    options passed to the step constructor.
+
+    Returns ``None`` if the step depends on a value which cannot be serialized stably.
+    The products of tasks with such steps are not cached.
+
+    """
+    if isinstance(step, functools.partial):
+        return _serialize((step.func, step.args, step.keywords))
+    if isinstance(step, (type, types.BuiltinFunctionType)):
+        return f"{step.__module__}.{step.__qualname__}"
+    if not isinstance(step, types.FunctionType):
+        return None
+
+    parts = [step.__module__ or "", step.__qualname__, _fingerprint_code(step.__code__)]
+    values = (
+        step.__defaults__ or (),
+        step.__kwdefaults__ or {},
+        tuple(cell.cell_contents for cell in step.__closure__ or ()),
+    )
+    serialized = _serialize(values)
+    if serialized is None:
+        return None
+    parts.append(serialized)
+    return "\0".join(parts)
+
+
+def _fingerprint_code(code: types.CodeType) -> str:
+    """Create a fingerprint of the bytecode, the constants and the names of a code."""
+    return "\0".join(
+        [code.co_code.hex(), _serialize(code.co_consts) or "", *code.co_names]
+    )
+
+
+def _serialize(value: Any) -> str | None:  # noqa: PLR0911
+    """Serialize a value stably or return ``None`` if it is not possible.
+
+    Only primitive values, containers of them, paths, and compilation steps are
+    serialized, because the representation of other objects might contain their
+    address in memory or might not reflect their state.
+
+    """
+    if value is None or value is Ellipsis or isinstance(value, _PRIMITIVE_TYPES):
+        return f"{type(value).__name__}:{value!r}"
+    if isinstance(value, PurePath):
+        return f"{type(value).__name__}:{value.as_posix()}"
+    if isinstance(value, enum.Enum):
+        return f"{type(value).__module__}.{type(value).__qualname__}.{value.name}"
+    if isinstance(value, types.CodeType):
+        return _fingerprint_code(value)
+    if callable(value):
+        return fingerprint_step(value)
+
+    if isinstance(value, (list, tuple)):
+        items = [_serialize(item) for item in value]
+    elif isinstance(value, (set, frozenset, dict)):
+        # The order of sets and of dictionaries with equal content might differ.
+        members = value.items() if isinstance(value, dict) else value
+        items = sorted((_serialize(item) for item in members), key=str)
+    else:
+        return None
+
+    if any(item is None for item in items):
+        return None
+    return f"{type(value).__name__}({','.join(cast('list[str]', items))})"
+
+
+def _hash_file(path: Path) -> bytes:
+    hash_ = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1024**2):
+            hash_.update(chunk)
+    return hash_.digest()
+
+
+@hookimpl(trylast=True)
+def pytask_execute_task_setup(session: Session, task: PTask) -> None:
+    """Restore the products of a LaTeX task from the output cache.
+
+    If the products are restored, the task is not executed and handled like a task with
+    a persisted product.
+
+    """
+    store = _get_store(session, task)
+    if store is None:
+        return
+
+    products = _compute_key(store, task)
+    if store.restore(task.signature, products):
+        raise Persisted
+
+
+def is_restorable(session: Session, task: PTask) -> bool:
+    """Check whether the products of a task would be restored from the output cache."""
+    store = _get_store(session, task)
+    if store is None:
+        return False
+    return store.contains(task.signature, _compute_key(store, task))
+
+
+def _get_store(session: Session, task: PTask) -> OutputStore | None:
+    """Get the output cache if it is used for the task.
+
+    It is not used during dry runs, which must not write products, and if the
+    execution is forced.
+
+    """
+    store = session.config.get("latex_output_store")
+    if (
+        store is None
+        or not has_mark(task, "latex")
+        or session.config.get("dry_run")
+        or session.config.get("explain")
+        or session.config.get("force")
+    ):
+        return None
+    return store
+
+
+def _compute_key(store: OutputStore, task: PTask) -> list[Path]:
+    """Compute the key of a task and return its products."""
+    steps_node = task.depends_on["_compilation_steps"]
+    steps = (
+        cast("list[Callable[..., Any]]", steps_node.value)
+        if isinstance(steps_node, PythonNode)
+        else []
+    )
+    products = _get_paths(task.produces)
+    store.compute_key(task.signature, _get_paths(task.depends_on), products, steps)
+    return products
+
+
+@hookimpl
+def pytask_execute_task_teardown(session: Session, task: PTask) -> None:
+    """Save the products of a compiled LaTeX document in the output cache."""
+    store = session.config.get("latex_output_store")
+    if store is not None and has_mark(task, "latex"):
+        store.save(task.signature, _get_paths(task.produces))
+
+
+@hookimpl(trylast=True)
+def pytask_execute_log_end(
+    session: Session,
+    reports: list[ExecutionReport],  # noqa: ARG001
+) -> None:
+    """Evict old entries from the output cache and report hits and misses."""
+    store = session.config.get("latex_output_store")
+    if store is not None:
+        store.evict()
+        if store.hits or store.misses:
+            console.print(
+                f"pytask-latex output cache: {store.hits} hits, {store.misses} misses."
+            )
+
+
+def _get_paths(nodes: Any) -> list[Path]:
+    """Get the paths of all path nodes."""
+    return [node.path for node in tree_leaves(nodes) if isinstance(node, PPathNode)]
@@ -0,0 +1,347 @@
+"""Contains a fake TeX toolchain for tests.
+
+The fake toolchain installs executables for latexmk, the engines, biber, and bibtex into
+a directory which is put on the ``PATH``. They do not compile anything, but behave like
+the real programs from the outside. They write the document, ``.aux``, ``.log``, and
+``.fls`` files, print output, take some time, need a number of passes to converge, and
+fail for selected documents. biber, bibtex, and latexmk fail if they do not find the
+databases of the bibliography in the working directory or on ``BIBINPUTS``. Every call
+is recorded, so that tests can check how many programs ran and whether they ran
+concurrently.
+
+.. code-block:: python
+
+    def test_build(tmp_path, monkeypatch):
+        toolchain = FakeTeXToolchain(tmp_path / "bin", latency=0.1, passes=2)
+        toolchain.install()
+        monkeypatch.setenv("PATH", toolchain.path)
+        ...
+        assert len(toolchain.calls()) == 4
+
+The executables are shell scripts and work on Linux and macOS.
+
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import re
+import stat
+import sys
+import time
+from dataclasses import asdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+__all__ = ["PROGRAMS", "FakeTeXToolchain"]
+
+PROGRAMS = ("latexmk", "pdflatex", "lualatex", "xelatex", "biber", "bibtex")
+
+_ENGINES = ("pdflatex", "lualatex", "xelatex")
+
+_REGEX_BIBLIOGRAPHY = re.compile(r"\\bibliography\{([^}]*)\}")
+_REGEX_ADDBIBRESOURCE = re.compile(r"\\addbibresource\{([^}]*)\}")
+_REGEX_BIBDATA = re.compile(r"^\\bibdata\{([^}]*)\}$", re.MULTILINE)
+_REGEX_BCF_DATASOURCE = re.compile(r"<bcf:datasource[^>]*>([^<]+)</bcf:datasource>")
+
+
+@dataclass
+class FakeTeXToolchain:
+    """A fake TeX toolchain.
+
+    Parameters
+    ----------
+    directory
+        The directory where the executables are installed.
+    latency
+        The duration of every pass in seconds.
+    passes
+        The number of passes until a document converges. latexmk runs all passes at
+        once, engines request a rerun in the ``.log`` file until the last pass.
+    fail
+        Documents fail to compile if their name contains one of these strings.
+    error
+        The error which is printed and written to the ``.log`` file for failing
+        documents.
+    error_delay
+        The time in seconds a failing program keeps running after it reported the
+        error, like an engine in nonstop mode.
+    output_size
+        The size of the document in bytes.
+    output_lines
+        The number of lines which are printed per pass.
+
+    """
+
+    directory: Path
+    latency: float = 0.0
+    passes: int = 1
+    fail: tuple[str, ...] = ()
+    error: str = "! Undefined control sequence.\nl.3 \\undefinedmacro"
+    error_delay: float = 0.0
+    output_size: int = 1024
+    output_lines: int = 5
+
+    @property
+    def path(self) -> str:
+        """The ``PATH`` with the fake toolchain taking precedence."""
+        return f"{self.directory}{os.pathsep}{os.environ.get('PATH', '')}"
+
+    @property
+    def path_to_calls(self) -> Path:
+        """The file which records the calls."""
+        return self.directory / "calls.jsonl"
+
+    def install(self) -> None:
+        """Install the executables and the configuration."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        config = {**asdict(self), "directory": self.directory.as_posix()}
+        path_to_config = self.directory / "config.json"
+        path_to_config.write_text(json.dumps(config))
+
+        for program in PROGRAMS:
+            path = self.directory / program
+            path.write_text(
+                "#!/bin/sh\n"
+                f'exec "{sys.executable}" -m pytask_latex.testing "{path_to_config}" '
+                f'{program} "$@"\n'
+            )
+            path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    def calls(self, program: str | None = None) -> list[dict[str, Any]]:
+        """Return the recorded calls, optionally only of one program.
+
+        Each call has the keys ``program``, ``args``, ``cwd``, ``pid``, ``start``,
+        ``end``, and ``returncode``.
+
+        """
+        if not self.path_to_calls.exists():
+            return []
+        calls = [
+            json.loads(line)
+            for line in self.path_to_calls.read_text().splitlines()
+            if line.strip()
+        ]
+        return [c for c in calls if program is None or c["program"] == program]
+
+    def max_concurrency(self) -> int:
+        """Return the maximum number of programs which ran at the same time."""
+        events = sorted(
+            [(call["start"], 1) for call in self.calls()]
+            + [(call["end"], -1) for call in self.calls()]
+        )
+        running = maximum = 0
+        for _, change in events:
+            running += change
+            maximum = max(maximum, running)
+        return maximum
+
+
+def _parse_args(args: list[str]) -> tuple[dict[str, str], list[str]]:
+    """Parse options like ``--jobname=name`` and ``-output-directory=dir``."""
+    options = {}
+    positional = []
+    for arg in args:
+        if arg.startswith("-"):
+            name, _, value = arg.lstrip("-").partition("=")
+            options[name] = value
+        else:
+            positional.append(arg)
+    return options, positional
+
+
+def _run_pass(
+    config: dict[str, Any],
+    path_to_tex: Path,
+    job: Path,
+    *,
+    dvi: bool = False,
+    file_line_error: bool = False,
+) -> int:
+    """Simulate one pass of an engine and return the exit code."""
+    time.sleep(config["latency"])
+
+    # The .aux file has one line per pass until the document converged.
+    path_to_aux = job.with_suffix(".aux")
+    previous = path_to_aux.read_text() if path_to_aux.exists() else ""
+    n_pass = min(previous.count("\\relax") + 1, config["passes"])
+    source = path_to_tex.read_text() if path_to_tex.exists() else ""
+    path_to_aux.write_text(
+        "\\relax\n" * n_pass
+        + "".join(
+            f"\\bibdata{{{names}}}\n" for names in _REGEX_BIBLIOGRAPHY.findall(source)
+        )
+    )
+    resources = _REGEX_ADDBIBRESOURCE.findall(source)
+    if resources:
+        job.with_suffix(".bcf").write_text(
+            "".join(
+                f'<bcf:datasource type="file">{name}</bcf:datasource>\n'
+                for name in resources
+            )
+        )
+
+    lines = [f"This is a fake TeX engine, pass {n_pass}."]
+    lines += [f"({path_to_tex.name} line {i})" for i in range(config["output_lines"])]
+
+    if any(pattern in path_to_tex.name for pattern in config["fail"]):
+        error = [*config["error"].splitlines(), "Emergency stop."]
+        if file_line_error and error[0].startswith("! "):
+            match = re.search(r"^l\.(\d+)", config["error"], re.MULTILINE)
+            line = match.group(1) if match else "1"
+            error[0] = f"./{path_to_tex.name}:{line}: {error[0][2:]}"
+        print("\n".join([*lines, *error]), flush=True)  # noqa: T201
+        job.with_suffix(".log").write_text("\n".join([*lines, *error]) + "\n")
+        time.sleep(config["error_delay"])
+        return 1
+
+    if n_pass < config["passes"]:
+        lines.append(
+            "LaTeX Warning: Label(s) may have changed. Rerun to get "
+            "cross-references right."
+        )
+    job.with_suffix(".dvi" if dvi else ".pdf").write_bytes(b"%" * config["output_size"])
+
+    print("\n".join(lines), flush=True)  # noqa: T201
+    job.with_suffix(".log").write_text("\n".join(lines) + "\n")
+    job.with_suffix(".fls").write_text(
+        f"PWD {Path.cwd().as_posix()}\n"
+        f"INPUT {path_to_tex.as_posix()}\n"
+        f"INPUT {path_to_aux.as_posix()}\n"
+        f"OUTPUT {path_to_aux.as_posix()}\n"
+    )
+    return 0
+
+
+def _run(program: str, args: list[str], config: dict[str, Any]) -> int:
+    options, positional = _parse_args(args)
+    if program in ("biber", "bibtex"):
+        time.sleep(config["latency"])
+        directory = Path(options.get("output-directory", "."))
+        return _run_bibliography(program, directory / positional[-1])
+
+    if "ini" in options:
+        directory = Path(options.get("output-directory", "."))
+        directory.joinpath(f"{options['jobname']}.fmt").write_text("format")
+        return 0
+
+    if program in _ENGINES:
+        path_to_tex, job = _get_job(positional[-1], options)
+        return _run_pass(
+            config,
+            path_to_tex,
+            job,
+            file_line_error="file-line-error" in options,
+        )
+
+    # latexmk skips documents which are newer than their source, runs the engine until
+    # the document converges, and continues with the next root file if one fails.
+    returncode = 0
+    cwd = Path.cwd()
+    for root_file in positional:
+        path_to_tex, job = _get_job(root_file, options)
+        path_to_output = job.with_suffix(".dvi" if "dvi" in options else ".pdf")
+        if (
+            path_to_output.exists()
+            and path_to_output.stat().st_mtime_ns >= path_to_tex.stat().st_mtime_ns
+        ):
+            print(f"Latexmk: All targets ({path_to_output}) are up-to-date", flush=True)  # noqa: T201
+            os.chdir(cwd)
+            continue
+        for i in range(config["passes"]):
+            print(f"Latexmk: Run number {i + 1} of rule 'pdflatex'", flush=True)  # noqa: T201
+            if _run_pass(
+                config,
+                path_to_tex,
+                job,
+                dvi="dvi" in options,
+                file_line_error="file-line-error" in options,
+            ):
+                returncode = 12
+                break
+        else:
+            # latexmk runs biber or bibtex if the document has a bibliography.
+            for tool in ("biber", "bibtex"):
+                if _get_databases(tool, job) and _run_bibliography(tool, job):
+                    returncode = 12
+        os.chdir(cwd)
+    return returncode
+
+
+def _get_databases(program: str, job: Path) -> list[str]:
+    """Get the databases of the bibliography from the .bcf or .aux file of a job."""
+    if program == "biber":
+        path = job.with_suffix(".bcf")
+        text = path.read_text() if path.exists() else ""
+        return _REGEX_BCF_DATASOURCE.findall(text)
+    path = job.with_suffix(".aux")
+    text = path.read_text() if path.exists() else ""
+    return [
+        f"{name.strip()}.bib"
+        for names in _REGEX_BIBDATA.findall(text)
+        for name in names.split(",")
+    ]
+
+
+def _run_bibliography(program: str, job: Path) -> int:
+    """Look up the databases in the working directory and on ``BIBINPUTS``."""
+    directories = [
+        Path(),
+        *(Path(d) for d in os.environ.get("BIBINPUTS", "").split(os.pathsep) if d),
+    ]
+    for name in _get_databases(program, job):
+        if not any(directory.joinpath(name).exists() for directory in directories):
+            print(f"I couldn't open database file {name}", flush=True)  # noqa: T201
+            return 2
+    job.with_suffix(".bbl").write_text("\\begin{thebibliography}")
+    return 0
+
+
+def _get_job(root_file: str, options: dict[str, str]) -> tuple[Path, Path]:
+    """Get the path to the source file and the job in the output directory."""
+    path_to_tex = Path(root_file)
+    if "cd" in options:
+        os.chdir(path_to_tex.parent)
+        path_to_tex = Path(path_to_tex.name)
+    if path_to_tex.suffix != ".tex":
+        path_to_tex = path_to_tex.with_suffix(".tex")
+    job = Path(options.get("output-directory", ".")).joinpath(
+        options.get("jobname", path_to_tex.stem)
+    )
+    job.parent.mkdir(parents=True, exist_ok=True)
+    return path_to_tex, job
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run a fake program and record the call.
+
+    Calls with ``--version`` are answered without recording them.
+
+    """
+    path_to_config, program, *args = sys.argv[1:] if argv is None else argv
+    if args == ["--version"]:
+        print(f"{program} (fake TeX toolchain)")  # noqa: T201
+        return 0
+    config = json.loads(Path(path_to_config).read_text())
+
+    start = time.time()
+    returncode = _run(program, args, config)
+    call = {
+        "program": program,
+        "args": args,
+        "cwd": Path.cwd().as_posix(),
+        "pid": os.getpid(),
+        "start": start,
+        "end": time.time(),
+        "returncode": returncode,
+    }
+    path_to_calls = Path(config["directory"], "calls.jsonl")
+    with path_to_calls.open("a") as f:
+        f.write(json.dumps(call) + "\n")
+    return returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
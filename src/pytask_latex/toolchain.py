@@ -0,0 +1,84 @@
+"""Contains the resolution of the programs needed by compilation steps.
+
+Compilation steps declare the programs they call in the attribute ``executables``. The
+programs are resolved once per session when the first task needing them is set up, see
+:func:`pytask_latex.execute.pytask_execute_task_setup`, and the steps receive the
+absolute paths with the :class:`Toolchain` of their context.
+
+"""
+
+from __future__ import annotations
+
+import shutil
+import subprocess
+from dataclasses import dataclass
+from dataclasses import field
+from typing import TYPE_CHECKING
+from typing import Any
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from collections.abc import Iterable
+
+
+@dataclass(frozen=True)
+class Tool:
+    """A program which is needed by compilation steps.
+
+    Attributes
+    ----------
+    name
+        The name of the program.
+    path
+        The absolute path to the executable.
+    version
+        The first line printed by ``<program> --version``.
+
+    """
+
+    name: str
+    path: str
+    version: str
+
+
+@dataclass
+class Toolchain:
+    """The programs of a session which are resolved once and shared by all tasks."""
+
+    tools: dict[str, Tool] = field(default_factory=dict)
+
+    def resolve(self, names: Iterable[str]) -> list[str]:
+        """Look up programs which are not resolved yet and return the missing ones."""
+        missing = []
+        for name in sorted(set(names) - set(self.tools)):
+            path = shutil.which(name)
+            if path is None:
+                missing.append(name)
+            else:
+                self.tools[name] = Tool(name, path, _get_version(path))
+        return missing
+
+    def path(self, name: str) -> str:
+        """Return the absolute path to a program or its name if it is not resolved."""
+        tool = self.tools.get(name)
+        return name if tool is None else tool.path
+
+    def version(self, name: str) -> str | None:
+        """Return the version of a program or ``None`` if it is not resolved."""
+        tool = self.tools.get(name)
+        return None if tool is None else tool.version
+
+
+def get_executables(step: Callable[..., Any]) -> tuple[str, ...]:
+    """Get the programs which are called by a compilation step."""
+    return tuple(getattr(step, "executables", ()))
+
+
+def _get_version(path: str) -> str:
+    try:
+        result = subprocess.run(  # noqa: S603
+            [path, "--version"], capture_output=True, text=True, check=False
+        )
+    except OSError:
+        return ""
+    return result.stdout.partition("\n")[0].strip()
@@ -2,9 +2,22 @@
 
 from __future__ import annotations
 
+import inspect
+import os
+import shutil
+import tempfile
 from collections.abc import Sequence
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
 from typing import Any
 
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from collections.abc import Generator
+
+    from pytask import PTask
+
 
 def to_list(scalar_or_iter: Any) -> list[Any]:
     """Convert scalars and iterables to list.
@@ -30,3 +43,60 @@ def to_list(scalar_or_iter: Any) -> list[Any]:
         if isinstance(scalar_or_iter, str) or not isinstance(scalar_or_iter, Sequence)
         else list(scalar_or_iter)
     )
+
+
+def copy_file_atomically(source: Path, destination: Path) -> None:
+    """Copy a file such that the destination is never partially written.
+
+    The file is copied to a temporary file next to the destination first which then
+    replaces the destination.
+
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = destination.with_name(f".{destination.name}.{os.getpid()}.tmp")
+    shutil.copy2(source, tmp_path)
+    tmp_path.replace(destination)
+
+
+@contextmanager
+def write_file_atomically(destination: Path) -> Generator[Path, None, None]:
+    """Create a file in a temporary directory and move it to its destination.
+
+    The context yields the path of the file in a temporary directory next to the
+    destination. If the block succeeds, the file replaces the destination.
+
+    Caches like formats, figures, and images are shared by tasks which might create the
+    same file at the same time. Replacing the file is atomic, so that no task reads a
+    partially written file, and since all results are identical, it does not matter
+    which task finishes last.
+
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=destination.parent) as tmp_dir:
+        path = Path(tmp_dir, destination.name)
+        yield path
+        path.replace(destination)
+
+
+def accepts_context(step: Callable[..., Any]) -> bool:
+    """Check whether a compilation step accepts the keyword argument ``context``."""
+    try:
+        parameters = inspect.signature(step).parameters
+    except (TypeError, ValueError):
+        return False
+    return "context" in parameters or any(
+        parameter.kind == inspect.Parameter.VAR_KEYWORD
+        for parameter in parameters.values()
+    )
+
+
+def is_skipped(task: PTask) -> bool:
+    """Check whether a task is skipped by a marker and does not need programs."""
+    for mark in task.markers:
+        if mark.name in ("skip", "skip_ancestor_failed"):
+            return True
+        if mark.name == "skipif":
+            condition = mark.args[0] if mark.args else mark.kwargs.get("condition")
+            if condition:
+                return True
+    return False
@@ -0,0 +1,354 @@
+"""Contains the watch mode which recompiles documents when files change.
+
+With ``pytask build --watch-latex``, the session is kept alive after the build. The
+collected tasks, the DAG, and the include graph stay in memory. When source files
+change, only the edges of the include graph which are affected by the change are
+resolved again, and only the tasks downstream of the changed files are executed.
+
+Changes are detected with inotify on Linux. On other platforms, the status of the files
+is polled.
+
+"""
+
+from __future__ import annotations
+
+import contextvars
+import os
+import select
+import struct
+import sys
+import time
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Protocol
+from typing import cast
+
+from pytask import ExecutionError
+from pytask import PPathNode
+from pytask import PTask
+from pytask import PTaskWithPath
+from pytask import Session
+from pytask import Traceback
+from pytask import console
+from pytask import has_mark
+from pytask import hookimpl
+from pytask.tree_util import tree_leaves
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+    from pathlib import Path
+
+    from pytask_latex.scanner import IncludeGraph
+
+
+_DEBOUNCE = 0.1
+"""float: The time in seconds to wait for more events after a change, since editors
+often write a file in several steps."""
+
+_POLL_INTERVAL = 0.5
+
+# The events of inotify which show that a file was written, moved, or deleted.
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_DELETE = 0x200
+_IN_IGNORED = 0x8000
+_IN_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE
+
+_EVENT = struct.Struct("iIII")
+
+_WATCHING: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "_WATCHING", default=False
+)
+
+
+class Watcher(Protocol):
+    """A protocol for objects which wait until files change."""
+
+    def wait(self, paths: set[Path]) -> set[Path]:
+        """Block until some of the paths changed and return them."""
+
+    def close(self) -> None:
+        """Release the resources of the watcher."""
+
+
+class InotifyWatcher:
+    """Wait for changes with inotify.
+
+    The directories of the paths are watched. Events of files which are not watched, for
+    example, documents which are written by the build, are ignored.
+
+    """
+
+    def __init__(self) -> None:
+        # Imported here since ctypes is only needed while watching.
+        import ctypes  # noqa: PLC0415
+        import ctypes.util  # noqa: PLC0415
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._directories: dict[int, Path] = {}
+
+    def wait(self, paths: set[Path]) -> set[Path]:
+        """Block until some of the paths changed and return them."""
+        for directory in {path.parent for path in paths} - set(
+            self._directories.values()
+        ):
+            descriptor = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(directory), _IN_MASK
+            )
+            if descriptor >= 0:
+                self._directories[descriptor] = directory
+
+        changed: set[Path] = set()
+        while not changed:
+            changed = self._read(timeout=None) & paths
+        while events := self._read(timeout=_DEBOUNCE):
+            changed |= events & paths
+        return changed
+
+    def close(self) -> None:
+        """Close the inotify instance."""
+        os.close(self._fd)
+
+    def _read(self, timeout: float | None) -> set[Path]:
+        """Read the paths of all pending events."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        data = os.read(self._fd, 64 * 1024)
+
+        paths = set()
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & _IN_IGNORED:
+                self._directories.pop(descriptor, None)
+            elif descriptor in self._directories and name:
+                paths.add(self._directories[descriptor] / os.fsdecode(name))
+        return paths
+
+
+class PollingWatcher:
+    """Wait for changes by comparing the status of the files in intervals."""
+
+    def __init__(self, interval: float = _POLL_INTERVAL) -> None:
+        self.interval = interval
+        self._signatures: dict[Path, tuple[int, int] | None] = {}
+
+    def wait(self, paths: set[Path]) -> set[Path]:
+        """Block until some of the paths changed and return them."""
+        for path in paths - self._signatures.keys():
+            self._signatures[path] = _get_signature(path)
+
+        while True:
+            time.sleep(self.interval)
+            changed = {
+                path for path in paths if _get_signature(path) != self._signatures[path]
+            }
+            if changed:
+                for path in changed:
+                    self._signatures[path] = _get_signature(path)
+                return changed
+
+    def close(self) -> None:
+        """Nothing to release."""
+
+
+def create_watcher() -> Watcher:
+    """Create a watcher with inotify on Linux or one which polls on other platforms."""
+    if sys.platform == "linux":
+        try:
+            return InotifyWatcher()
+        except (AttributeError, OSError):
+            pass
+    return PollingWatcher()
+
+
+def _get_signature(path: Path) -> tuple[int, int] | None:
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+@hookimpl(wrapper=True)
+def pytask_execute(session: Session) -> Generator[None, None, None]:
+    """Execute the tasks again whenever their source files change."""
+    if not session.config.get("watch_latex") or _WATCHING.get():
+        return (yield)
+
+    # pytask adds markers to tasks downstream of failed or skipped tasks. They are
+    # reset before every run, so that tasks are not skipped because of earlier runs.
+    markers = {task.signature: list(task.markers) for task in session.tasks}
+
+    error: ExecutionError | None = None
+    try:
+        yield
+    except ExecutionError as e:
+        error = e
+
+    token = _WATCHING.set(True)
+    watcher = create_watcher()
+    try:
+        while True:
+            paths = _get_source_paths(session)
+            console.print("[neutral]Watching for changes. Press Ctrl+C to stop.")
+            changed = watcher.wait(paths)
+            for task in session.tasks:
+                task.markers[:] = markers[task.signature]
+            try:
+                error = _execute_affected_tasks(session, changed)
+            except Exception:  # noqa: BLE001
+                console.print(Traceback(sys.exc_info()))
+    except KeyboardInterrupt:
+        console.print()
+    finally:
+        watcher.close()
+        _WATCHING.reset(token)
+
+    if error is not None:
+        raise error
+
+
+def _get_source_paths(session: Session) -> set[Path]:
+    """Get the paths which are not produced by tasks and might change the build.
+
+    These are the dependencies of tasks, the modules of tasks, and all files which
+    LaTeX documents include or try to include.
+
+    """
+    dag = session.dag
+    paths = {
+        cast("Path", node.path)
+        for node in dag.nodes.values()
+        if isinstance(node, PPathNode)
+    }
+    paths |= {task.path for task in session.tasks if isinstance(task, PTaskWithPath)}
+    graph: IncludeGraph | None = session.config.get("latex_include_graph")
+    if graph is not None:
+        paths |= graph.targets | graph.files
+    products = {
+        cast("Path", node.path)
+        for task in session.tasks
+        for node in tree_leaves(task.produces)  # ty: ignore[invalid-argument-type]
+        if isinstance(node, PPathNode)
+    }
+    return paths - products
+
+
+def _execute_affected_tasks(
+    session: Session, changed: set[Path]
+) -> ExecutionError | None:
+    """Update the include graph and execute the tasks affected by the changed files."""
+    names = ", ".join(sorted(path.name for path in changed))
+    console.rule(f"[neutral]Changed: {names}", style="neutral")
+
+    modules = {
+        task.path
+        for task in session.tasks
+        if isinstance(task, PTaskWithPath) and task.path in changed
+    }
+    if modules:
+        console.print(
+            "[warning]Task modules changed. Restart the build to collect them again."
+        )
+        changed -= modules
+
+    graph: IncludeGraph | None = session.config.get("latex_include_graph")
+    if graph is not None:
+        _rescan_documents(session, graph, changed)
+
+    affected = _get_affected_tasks(session, changed)
+    if not affected:
+        console.print("[neutral]No task is affected by the changes.")
+        return None
+
+    dag = session.dag
+    session.dag = _get_subgraph(dag, affected)
+    session.execution_reports = []
+    session.n_tasks_failed = 0
+    session.should_stop = False
+    # The table of the live display would also show the reports of previous runs.
+    # Without it, pytask prints the outcome of every task.
+    pm = session.config["pm"]
+    live_execution = pm.get_plugin("live_execution")
+    if live_execution is not None:
+        pm.unregister(live_execution)
+    try:
+        session.hook.pytask_execute(session=session)
+    except ExecutionError as e:
+        return e
+    finally:
+        session.dag = dag
+        if live_execution is not None:
+            pm.register(live_execution, "live_execution")
+    return None
+
+
+def _rescan_documents(
+    session: Session, graph: IncludeGraph, changed: set[Path]
+) -> None:
+    """Scan the documents again and update the dependencies of tasks in the DAG.
+
+    Only the edges of the include graph affected by the changed files are resolved
+    again.
+
+    """
+    # Imported here to avoid circular imports. Importing pytask loads the plugin.
+    from pytask_latex.collect import add_latex_dependencies  # noqa: PLC0415
+    from pytask_latex.collect import update_dag  # noqa: PLC0415
+    from pytask_latex.scanner import scan_documents  # noqa: PLC0415
+
+    graph.invalidate(changed)
+    latex_tasks = [task for task in session.tasks if has_mark(task, "latex")]
+    previous = [
+        tree_leaves(task.depends_on.get("_scanned_dependencies", []))  # ty: ignore[invalid-argument-type]
+        for task in latex_tasks
+    ]
+    scan_results = scan_documents(
+        [
+            node.path
+            for task in latex_tasks
+            if isinstance(node := task.depends_on["_path_to_tex"], PPathNode)
+        ],  # ty: ignore[invalid-argument-type]
+        graph,
+    )
+    graph.cache.save()
+    add_latex_dependencies(session, session.tasks, scan_results)
+    for task, nodes in zip(latex_tasks, previous, strict=True):
+        update_dag(session, task, nodes)
+
+
+def _get_affected_tasks(session: Session, changed: set[Path]) -> set[str]:
+    """Get the signatures of the tasks which are downstream of the changed files."""
+    dag = session.dag
+    affected = set()
+    for signature, node in dag.nodes.items():
+        if isinstance(node, PPathNode) and node.path in changed:
+            affected |= {
+                i for i in dag.descendants(signature) if isinstance(dag.nodes[i], PTask)
+            }
+    return affected
+
+
+def _get_subgraph(dag: Any, tasks: set[str]) -> Any:
+    """Get the part of the DAG with the given tasks, their dependencies and products."""
+    subgraph = type(dag)()
+    for task in tasks:
+        subgraph.add_node(task, dag.nodes[task])
+        for node in [*dag.predecessors(task), *dag.successors(task)]:
+            subgraph.add_node(node, dag.nodes[node])
+    for task in tasks:
+        for node in dag.predecessors(task):
+            subgraph.add_edge(node, task)
+        for node in dag.successors(task):
+            subgraph.add_edge(task, node)
+    return subgraph
@@ -13,6 +13,8 @@ import pytest
 from click.testing import CliRunner
 from pytask import storage
 
+from pytask_latex.testing import FakeTeXToolchain
+
 if TYPE_CHECKING:
     from collections.abc import Callable
 
@@ -91,3 +93,12 @@ class CustomCliRunner(CliRunner):
 @pytest.fixture
 def runner():
     return CustomCliRunner()
+
+
+@pytest.fixture
+def fake_tex(tmp_path_factory, monkeypatch):
+    """Put a fake TeX toolchain on the PATH."""
+    toolchain = FakeTeXToolchain(tmp_path_factory.mktemp("fake_tex"))
+    toolchain.install()
+    monkeypatch.setenv("PATH", toolchain.path)
+    return toolchain
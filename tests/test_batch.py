@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import sys
+import textwrap
+from contextlib import ExitStack as does_not_raise  # noqa: N813
+
+import pytest
+from pytask import ExitCode
+from pytask import TaskOutcome
+from pytask import build
+
+from pytask_latex import compilation_steps as cs
+from tests.conftest import restore_sys_path_and_module_after_test_execution
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="Uses the fake TeX toolchain."
+)
+
+_TASK_SOURCE = """
+from pathlib import Path
+from pytask import mark, task
+from pytask_latex import compilation_steps as cs
+
+for name in {names}:
+
+    @task(id=name)
+    @mark.latex(
+        script=Path(f"{{name}}.tex"),
+        document=Path(f"bld/{{name}}.pdf"),
+        compilation_steps=cs.latexmk(batch={batch}),
+    )
+    def task_compile_certificate():
+        pass
+"""
+
+
+def _write_project(tmp_path, names, *, batch=True):
+    source = _TASK_SOURCE.format(names=names, batch=batch)
+    tmp_path.joinpath("task_certificates.py").write_text(textwrap.dedent(source))
+    for name in names:
+        tmp_path.joinpath(f"{name}.tex").write_text("\\documentclass{report}")
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "expectation"),
+    [
+        ({"batch": True}, does_not_raise()),
+        (
+            {"batch": True, "persistent_build_dir": True},
+            pytest.raises(ValueError, match="'batch' cannot be combined"),
+        ),
+        (
+            {"batch": True, "fail_fast": True},
+            pytest.raises(ValueError, match="'batch' cannot be combined"),
+        ),
+    ],
+)
+def test_latexmk_with_batch(kwargs, expectation):
+    with expectation:
+        cs.latexmk(**kwargs)
+
+
+@pytest.mark.parametrize(("batch", "n_calls"), [(True, 1), (False, 3)])
+def test_compile_documents_in_batches(tmp_path, fake_tex, batch, n_calls):
+    names = ["alice", "bob", "carol"]
+    _write_project(tmp_path, names, batch=batch)
+
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    assert len(fake_tex.calls("latexmk")) == n_calls
+    for name in names:
+        assert tmp_path.joinpath("bld", f"{name}.pdf").exists()
+
+
+def test_report_failures_of_batch_per_task(tmp_path, fake_tex):
+    fake_tex.fail = ("bob",)
+    fake_tex.install()
+    _write_project(tmp_path, ["alice", "bob", "carol"])
+
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.FAILED
+    assert len(fake_tex.calls("latexmk")) == 1
+    outcomes = {
+        report.task.name.rsplit("[", 1)[-1].rstrip("]"): report.outcome
+        for report in session.execution_reports
+    }
+    assert outcomes == {
+        "alice": TaskOutcome.SUCCESS,
+        "bob": TaskOutcome.FAIL,
+        "carol": TaskOutcome.SUCCESS,
+    }
+    (failed,) = [r for r in session.execution_reports if r.exc_info is not None]
+    assert "Undefined control sequence" in str(failed.exc_info[1])  # ty: ignore[not-subscriptable]
+
+
+def test_wait_for_upstream_tasks_before_batching(tmp_path, fake_tex):
+    _write_project(tmp_path, ["alice", "bob"])
+    source = """
+    from pathlib import Path
+    from pytask import Product
+    from typing import Annotated
+
+    def task_write_carol(
+        alice: Path = Path("bld/alice.pdf"),
+        path: Annotated[Path, Product] = Path("carol.tex"),
+    ):
+        path.write_text("\\\\documentclass{report}")
+    """
+    tmp_path.joinpath("task_write.py").write_text(textwrap.dedent(source))
+    source = _TASK_SOURCE.format(names=["carol"], batch=True)
+    tmp_path.joinpath("task_carol.py").write_text(textwrap.dedent(source))
+
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    root_files = sorted(
+        len([arg for arg in call["args"] if arg.endswith(".tex")])
+        for call in fake_tex.calls("latexmk")
+    )
+    # alice is compiled first since it is needed to write carol which cannot be batched.
+    assert root_files == [1, 2]
+
+
+def test_skip_unchanged_documents_of_batch(tmp_path, fake_tex):
+    names = ["alice", "bob", "carol"]
+    _write_project(tmp_path, names)
+    # Reimport the task module which creates the tasks in a loop in the second build.
+    with restore_sys_path_and_module_after_test_execution():
+        assert build(paths=tmp_path).exit_code == ExitCode.OK
+    path_to_carol = tmp_path.joinpath("bld", "carol.pdf")
+    modified = path_to_carol.stat().st_mtime_ns
+
+    tmp_path.joinpath("bob.tex").write_text("\\documentclass{article}")
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    outcomes = sorted(report.outcome.name for report in session.execution_reports)
+    assert outcomes == ["SKIP_UNCHANGED", "SKIP_UNCHANGED", "SUCCESS"]
+    # The second call includes the documents which are not executed yet, but latexmk
+    # does not rebuild them if they are up to date.
+    calls = fake_tex.calls("latexmk")
+    assert len(calls) == 2  # noqa: PLR2004
+    assert tmp_path.joinpath("bob.tex").as_posix() in calls[1]["args"]
+    assert path_to_carol.stat().st_mtime_ns == modified
+
+
+def test_do_not_batch_documents_restored_from_output_cache(tmp_path, fake_tex):
+    names = ["alice", "bob"]
+    _write_project(tmp_path, names)
+    tmp_path.joinpath("pyproject.toml").write_text(
+        "[tool.pytask.ini_options]\nlatex_output_cache = true"
+    )
+    for content in ("first", "second"):
+        for name in names:
+            tmp_path.joinpath(f"{name}.tex").write_text(f"\\documentclass{{{content}}}")
+        with restore_sys_path_and_module_after_test_execution():
+            assert build(paths=tmp_path).exit_code == ExitCode.OK
+
+    # The document of bob is restored and must not be compiled with alice.
+    tmp_path.joinpath("alice.tex").write_text("\\documentclass{third}")
+    tmp_path.joinpath("bob.tex").write_text("\\documentclass{first}")
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    outcomes = {
+        report.task.name.rsplit("[", 1)[-1]: report.outcome
+        for report in session.execution_reports
+    }
+    assert outcomes == {"alice]": TaskOutcome.SUCCESS, "bob]": TaskOutcome.PERSISTENCE}
+    last_call = fake_tex.calls("latexmk")[-1]
+    assert tmp_path.joinpath("bob.tex").as_posix() not in last_call["args"]
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+PATH_TO_BENCHMARKS = Path(__file__).parents[1] / "benchmarks" / "run.py"
+
+
+def test_run_benchmarks(tmp_path):
+    path_to_results = tmp_path / "results.json"
+    cmd = [
+        sys.executable,
+        PATH_TO_BENCHMARKS.as_posix(),
+        "--tasks",
+        "2",
+        "--depths",
+        "1",
+        "3",
+        "--output",
+        path_to_results.as_posix(),
+    ]
+    subprocess.run(cmd, check=True, capture_output=True)  # noqa: S603
+
+    results = json.loads(path_to_results.read_text())
+    assert "commit" in results["environment"]
+    assert [(r["n_tasks"], r["depth"]) for r in results["results"]] == [(2, 1), (2, 3)]
+    assert all(r["build_time"] > 0 for r in results["results"])
+
+    cmd[-1] = (tmp_path / "new.json").as_posix()
+    result = subprocess.run(  # noqa: S603
+        [*cmd, "--compare", path_to_results.as_posix()],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    assert "collection_time" in result.stdout
@@ -1,8 +1,17 @@
 from __future__ import annotations
 
+import sys
+import textwrap
 from contextlib import ExitStack as does_not_raise  # noqa: N813
 
 import pytest
+from pytask import ExitCode
+from pytask import PathNode
+from pytask import TaskOutcome
+from pytask import build
+from pytask import get_marks
+from pytask import has_mark
+from pytask.tree_util import tree_leaves
 
 from pytask_latex.collect import latex
 
@@ -24,7 +33,7 @@ from pytask_latex.collect import latex
         (
             {"script": "script.tex", "document": "document.pdf"},
             does_not_raise(),
-            ("script.tex", "document.pdf", None),
+            ("script.tex", "document.pdf", None, None),
         ),
         (
             {
@@ -33,7 +42,7 @@ from pytask_latex.collect import latex
                 "compilation_steps": "latexmk",
             },
             does_not_raise(),
-            ("script.tex", "document.pdf", "latexmk"),
+            ("script.tex", "document.pdf", "latexmk", None),
         ),
     ],
 )
@@ -41,3 +50,138 @@ def test_latex(kwargs, expectation, expected):
     with expectation:
         result = latex(**kwargs)
         assert result == expected
+
+
+def test_only_tasks_with_unresolved_includes_are_delayed(tmp_path):
+    task_source = """
+    from pathlib import Path
+    from pytask import Product, mark
+    from typing import Annotated
+
+    @mark.skip
+    def task_plot(path: Annotated[Path, Product] = Path("plot.png")):
+        pass
+
+    @mark.skip
+    @mark.latex(script=Path("generated.tex"), document=Path("generated.pdf"))
+    def task_compile_generated():
+        pass
+
+    @mark.skip
+    @mark.latex(script=Path("unresolved.tex"), document=Path("unresolved.pdf"))
+    def task_compile_unresolved():
+        pass
+
+    @mark.skip
+    @mark.try_last
+    @mark.latex(script=Path("delayed.tex"), document=Path("delayed.pdf"))
+    def task_compile_delayed():
+        pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("chapter.tex").write_text("")
+    tmp_path.joinpath("generated.tex").write_text(
+        r"\input{chapter}\includegraphics{plot}"
+    )
+    tmp_path.joinpath("unresolved.tex").write_text(r"\input{chapter}\input{missing}")
+    tmp_path.joinpath("delayed.tex").write_text(r"\input{chapter}")
+
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    tasks = {task.name.rsplit("_", 1)[-1]: task for task in session.tasks}
+    delayed = {name for name, task in tasks.items() if has_mark(task, "try_last")}
+    assert delayed == {"unresolved", "delayed"}
+    assert len(get_marks(tasks["delayed"], "try_last")) == 1
+
+    # The product of the other task is a dependency of the document.
+    plot = next(
+        node.signature
+        for node in session.dag.nodes.values()
+        if isinstance(node, PathNode) and node.path == tmp_path / "plot.png"
+    )
+    assert tasks["generated"].signature in session.dag.successors(plot)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+@pytest.mark.usefixtures("fake_tex")
+def test_generated_documents_are_scanned_before_execution(tmp_path):
+    task_source = """
+    from pathlib import Path
+    from pytask import Product, mark
+    from typing import Annotated
+
+    @mark.latex(script=Path("document.tex"), document=Path("document.pdf"))
+    def task_compile_document():
+        pass
+
+    def task_fragment(path: Annotated[Path, Product] = Path("fragment.tex")):
+        path.write_text(r"\\input{data}")
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("document.tex").write_text(
+        r"\documentclass{report}\input{fragment}"
+    )
+    tmp_path.joinpath("data.tex").write_text("Data")
+
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    task = next(task for task in session.tasks if has_mark(task, "latex"))
+    assert any(
+        isinstance(node, PathNode) and node.path == tmp_path / "data.tex"
+        for node in tree_leaves(task.depends_on["_scanned_dependencies"])  # ty: ignore[invalid-argument-type]
+    )
+
+    # The state of the newly discovered file is recorded.
+    session = build(paths=tmp_path)
+    assert {report.outcome for report in session.execution_reports} == {
+        TaskOutcome.SKIP_UNCHANGED
+    }
+
+    tmp_path.joinpath("data.tex").write_text("Changed data")
+    session = build(paths=tmp_path)
+    outcomes = {
+        report.task.name.rsplit("_", 1)[-1]: report.outcome
+        for report in session.execution_reports
+    }
+    assert outcomes == {
+        "document": TaskOutcome.SUCCESS,
+        "fragment": TaskOutcome.SKIP_UNCHANGED,
+    }
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+@pytest.mark.usefixtures("fake_tex")
+def test_dependencies_which_are_not_included_anymore_are_removed(tmp_path):
+    task_source = """
+    from pathlib import Path
+    from pytask import Product, mark
+    from typing import Annotated
+
+    @mark.latex(script=Path("document.tex"), document=Path("document.pdf"))
+    def task_compile_document():
+        pass
+
+    def task_fragment(path: Annotated[Path, Product] = Path("fragment.tex")):
+        path.write_text(r"\\input{other}")
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("document.tex").write_text(
+        r"\documentclass{report}\input{fragment}"
+    )
+    tmp_path.joinpath("fragment.tex").write_text(r"\input{data}")
+    tmp_path.joinpath("data.tex").write_text("Data")
+    tmp_path.joinpath("other.tex").write_text("Other")
+
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    task = next(task for task in session.tasks if has_mark(task, "latex"))
+    dependencies = {
+        node.path
+        for signature in session.dag.predecessors(task.signature)
+        if isinstance(node := session.dag.nodes[signature], PathNode)
+    }
+    assert tmp_path / "other.tex" in dependencies
+    assert tmp_path / "data.tex" not in dependencies
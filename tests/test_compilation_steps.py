@@ -0,0 +1,782 @@
+from __future__ import annotations
+
+import os
+import shutil
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import pytest
+from pytask import ExitCode
+from pytask import PythonNode
+from pytask import build
+
+from pytask_latex import compilation_steps as cs
+from pytask_latex.collect import compile_latex_document
+from pytask_latex.metrics import measure_step
+from pytask_latex.metrics import read_metrics
+from pytask_latex.metrics import run_command
+from pytask_latex.toolchain import Tool
+from pytask_latex.toolchain import Toolchain
+
+_DOCUMENT = r"""
+\documentclass{article}
+\usepackage{macros}
+\input{preamble}
+\begin{document}
+%s
+\end{document}
+"""
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Record subprocess calls and simulate dumping formats and compiling documents."""
+    calls = []
+
+    def fake_run(cmd, **kwargs):
+        calls.append((cmd, kwargs))
+        options = dict(i.lstrip("-").split("=", 1) for i in cmd if "=" in i)
+        if "-ini" in cmd:
+            Path(options["output-directory"], f"{options['jobname']}.fmt").touch()
+        elif cmd[0] == "latexmk":
+            out_dir = Path(options["output-directory"])
+            out_dir.joinpath(f"{options['jobname']}.aux").touch()
+            out_dir.joinpath(f"{options['jobname']}.pdf").write_text(str(len(calls)))
+        elif cmd[0] == "biber":
+            Path(options["output-directory"], f"{cmd[-1]}.bbl").touch()
+        elif cmd[0] == "bibtex":
+            Path(kwargs["cwd"], f"{cmd[-1]}.bbl").touch()
+        elif cmd[0] in ("pdflatex", "lualatex", "xelatex"):
+            _run_fake_engine(cmd, kwargs["cwd"], options)
+        elif cmd[0] == "magick":
+            shutil.copy(cmd[1], cmd[-1])
+        elif cmd[0] == "gs":
+            shutil.copy(cmd[-1], options["sOutputFile"])
+        elif cmd[0] == "qpdf":
+            content = Path(cmd[-2]).read_bytes()
+            Path(cmd[-1]).write_bytes(content[: len(content) // 2])
+        return subprocess.CompletedProcess(cmd, 0, stdout="pdfTeX 3.14\n")
+
+    monkeypatch.setattr("pytask_latex.compilation_steps.run_command", fake_run)
+    return calls
+
+
+def _run_fake_engine(cmd, cwd, options):
+    """Simulate a LaTeX pass which writes the content of the document to the .aux."""
+    job = Path(options["output-directory"], options["jobname"])
+    path_to_tex = Path(cwd, cmd[-1])
+    path_to_aux = job.with_suffix(".aux")
+    path_to_bbl = job.with_suffix(".bbl")
+
+    old_aux = path_to_aux.read_text() if path_to_aux.exists() else None
+    new_aux = path_to_tex.read_text()
+    path_to_aux.write_text(new_aux)
+    job.with_suffix(".pdf").write_text(new_aux)
+
+    inputs = [path_to_tex.name, path_to_aux.as_posix()]
+    if path_to_bbl.exists():
+        inputs.append(path_to_bbl.as_posix())
+    job.with_suffix(".fls").write_text(
+        f"PWD {cwd}\n" + "".join(f"INPUT {i}\n" for i in inputs)
+    )
+    job.with_suffix(".log").write_text(
+        ""
+        if old_aux == new_aux
+        else "LaTeX Warning: Label(s) may have changed. "
+        "Rerun to get cross-references right."
+    )
+
+
+def _create_documents(tmp_path):
+    tmp_path.joinpath("macros.sty").write_text(r"\newcommand{\x}{x}")
+    tmp_path.joinpath("preamble.tex").write_text(r"\usepackage{amsmath}")
+    for name in ("a", "b"):
+        content = textwrap.dedent(_DOCUMENT % name)
+        tmp_path.joinpath(f"{name}.tex").write_text(content)
+
+
+def test_precompiled_preamble_is_shared_between_documents(tmp_path, calls):
+    _create_documents(tmp_path)
+    context = cs.CompilationContext(cache_dir=tmp_path / "cache")
+    step = cs.precompiled_preamble()
+
+    for name in ("a", "b"):
+        step(tmp_path / f"{name}.tex", tmp_path / f"{name}.pdf", context=context)
+
+    dumps = [cmd for cmd, _ in calls if "-ini" in cmd]
+    assert len(dumps) == 1
+    formats = list(tmp_path.joinpath("cache", "formats").glob("*.fmt"))
+    assert len(formats) == 1
+
+    cmd, kwargs = calls[-1]
+    assert cmd[0] == "latexmk"
+    assert f'-pdflatex="pdflatex" -fmt={formats[0].stem} %O %S' in cmd
+    assert kwargs["env"]["TEXFORMATS"].startswith(str(tmp_path / "cache" / "formats"))
+
+
+def test_precompiled_preamble_uses_programs_of_toolchain(tmp_path, calls):
+    _create_documents(tmp_path)
+    toolchain = Toolchain(
+        {
+            name: Tool(name, f"/opt/tex/{name}", f"{name} 1.0")
+            for name in ("latexmk", "pdflatex")
+        }
+    )
+    context = cs.CompilationContext(cache_dir=tmp_path / "cache", toolchain=toolchain)
+    step = cs.precompiled_preamble()
+
+    step(tmp_path / "a.tex", tmp_path / "a.pdf", context=context)
+
+    (dump,) = [cmd for cmd, _ in calls if "-ini" in cmd]
+    assert dump[0] == "/opt/tex/pdflatex"
+    cmd, _ = calls[-1]
+    assert cmd[0] == "/opt/tex/latexmk"
+    assert any(arg.startswith('-pdflatex="/opt/tex/pdflatex" -fmt=') for arg in cmd)
+
+
+@pytest.mark.parametrize(
+    ("option", "engine"),
+    [("--pdf", "pdflatex"), ("--xelatex", "xelatex"), ("--lualatex", "lualatex")],
+)
+def test_precompiled_preamble_derives_engine_from_options(
+    tmp_path, calls, option, engine
+):
+    _create_documents(tmp_path)
+    context = cs.CompilationContext(cache_dir=tmp_path / "cache")
+    step = cs.precompiled_preamble(options=(option, "--cd"))
+
+    step(tmp_path / "a.tex", tmp_path / "a.pdf", context=context)
+
+    (dump,) = [cmd for cmd, _ in calls if "-ini" in cmd]
+    assert dump[0] == engine
+    cmd, _ = calls[-1]
+    assert any(arg.startswith(f'-{engine}="{engine}" -fmt=') for arg in cmd)
+    assert step.executables == ("latexmk", engine)
+
+
+@pytest.mark.parametrize(
+    ("options", "engine", "match"),
+    [
+        (("--xelatex",), "pdflatex", "differs from the engine 'xelatex'"),
+        (("--cd",), None, "must choose exactly one engine.*none"),
+        (("--pdf", "--lualatex"), None, "exactly one engine.*lualatex, pdflatex"),
+    ],
+)
+def test_precompiled_preamble_with_invalid_engine(options, engine, match):
+    with pytest.raises(ValueError, match=match):
+        cs.precompiled_preamble(options=options, engine=engine)
+
+
+def test_precompiled_preamble_is_dumped_again_if_local_package_changes(tmp_path, calls):
+    _create_documents(tmp_path)
+    context = cs.CompilationContext(cache_dir=tmp_path / "cache")
+    step = cs.precompiled_preamble()
+
+    step(tmp_path / "a.tex", tmp_path / "a.pdf", context=context)
+    tmp_path.joinpath("preamble.tex").write_text(r"\usepackage{amssymb}")
+    step(tmp_path / "a.tex", tmp_path / "a.pdf", context=context)
+
+    assert len([cmd for cmd, _ in calls if "-ini" in cmd]) == 2  # noqa: PLR2004
+
+
+def test_compile_latex_document_passes_context_to_steps(tmp_path):
+    received = []
+
+    def step_with_context(path_to_tex, path_to_document, context):  # noqa: ARG001
+        received.append(context)
+
+    def step_without_context(path_to_tex, path_to_document):  # noqa: ARG001
+        received.append(None)
+
+    context = cs.CompilationContext(cache_dir=tmp_path)
+    compile_latex_document(
+        [step_with_context, step_without_context],
+        tmp_path / "document.tex",
+        tmp_path / "document.pdf",
+        _context=context,
+    )
+
+    assert received == [context, None]
+
+
+def test_latexmk_with_persistent_build_dir(tmp_path, calls):
+    tmp_path.joinpath("document.tex").write_text("")
+    build_dir = tmp_path / "cache" / "build" / "task"
+    context = cs.CompilationContext(cache_dir=tmp_path / "cache", build_dir=build_dir)
+    step = cs.latexmk(persistent_build_dir=True)
+
+    step(tmp_path / "document.tex", tmp_path / "bld" / "document.pdf", context=context)
+
+    cmd, _ = calls[-1]
+    assert f"--output-directory={build_dir.as_posix()}" in cmd
+    assert tmp_path.joinpath("bld", "document.pdf").read_text() == "1"
+    assert build_dir.joinpath("document.aux").exists()
+    assert not tmp_path.joinpath("bld", "document.aux").exists()
+
+
+@pytest.mark.usefixtures("calls")
+def test_latexmk_without_persistent_build_dir(tmp_path):
+    tmp_path.joinpath("document.tex").write_text("")
+    context = cs.CompilationContext(cache_dir=tmp_path, build_dir=tmp_path / "build")
+
+    cs.latexmk()(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+
+    assert tmp_path.joinpath("document.aux").exists()
+    assert not tmp_path.joinpath("build").exists()
+
+
+def _get_contexts(session):
+    return [
+        node.value
+        for task in session.tasks
+        if isinstance(node := task.depends_on["_context"], PythonNode)
+        and isinstance(node.value, cs.CompilationContext)
+    ]
+
+
+def test_parametrized_tasks_have_separate_build_dirs(tmp_path):
+    task_source = """
+    from pathlib import Path
+    from pytask import mark, task
+
+    for name in ("a", "b"):
+
+        @task(id=name)
+        @mark.skip
+        @mark.latex(script=Path("document.tex"), document=Path(f"{name}.pdf"))
+        def task_compile_document():
+            pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("document.tex").write_text("")
+
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    build_dirs = {context.build_dir for context in _get_contexts(session)}
+    assert len(build_dirs) == 2  # noqa: PLR2004
+    assert all(
+        path.is_relative_to(tmp_path / ".pytask" / "latex" / "build")
+        for path in build_dirs
+    )
+
+
+def test_latexmk_with_scratch_dir(tmp_path, calls):
+    tmp_path.joinpath("document.tex").write_text("")
+    scratch_dir = tmp_path / "scratch" / "task"
+    context = cs.CompilationContext(cache_dir=tmp_path, scratch_dir=scratch_dir)
+
+    compile_latex_document(
+        [cs.latexmk()],
+        tmp_path / "document.tex",
+        tmp_path / "bld" / "document.pdf",
+        context,
+    )
+
+    cmd, _ = calls[-1]
+    assert f"--output-directory={scratch_dir.as_posix()}" in cmd
+    assert tmp_path.joinpath("bld", "document.pdf").read_text() == "1"
+    assert list(tmp_path.joinpath("bld").iterdir()) == [
+        tmp_path / "bld" / "document.pdf"
+    ]
+    assert not scratch_dir.exists()
+
+
+@pytest.mark.parametrize(
+    ("exception", "expected"),
+    [
+        (subprocess.CalledProcessError(1, "latexmk"), RuntimeError),
+        (KeyboardInterrupt(), KeyboardInterrupt),
+    ],
+)
+def test_scratch_dir_is_removed_after_failure(tmp_path, exception, expected):
+    scratch_dir = tmp_path / "scratch" / "task"
+    scratch_dir.mkdir(parents=True)
+    scratch_dir.joinpath("stale.aux").touch()
+    context = cs.CompilationContext(cache_dir=tmp_path, scratch_dir=scratch_dir)
+
+    def failing_step(path_to_tex, path_to_document, context):  # noqa: ARG001
+        assert not context.scratch_dir.joinpath("stale.aux").exists()
+        context.scratch_dir.joinpath("document.aux").touch()
+        raise exception
+
+    with pytest.raises(expected):
+        compile_latex_document(
+            [failing_step],
+            tmp_path / "document.tex",
+            tmp_path / "document.pdf",
+            context,
+        )
+
+    assert not scratch_dir.exists()
+
+
+def test_scratch_dirs_of_tasks_are_separate(tmp_path):
+    task_source = """
+    from pathlib import Path
+    from pytask import mark, task
+
+    for name in ("a", "b"):
+
+        @task(id=name)
+        @mark.skip
+        @mark.latex(script=Path("document.tex"), document=Path(f"{name}.pdf"))
+        def task_compile_document():
+            pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("document.tex").write_text("")
+    tmp_path.joinpath("pyproject.toml").write_text(
+        "[tool.pytask.ini_options]\nlatex_scratch_dir = 'scratch'"
+    )
+
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    scratch_dirs = {context.scratch_dir for context in _get_contexts(session)}
+    assert len(scratch_dirs) == 2  # noqa: PLR2004
+    assert all(
+        path is not None and path.is_relative_to(tmp_path / "scratch" / "pytask-latex")
+        for path in scratch_dirs
+    )
+
+
+_BCF = """<?xml version="1.0" encoding="UTF-8"?>
+<bcf:controlfile xmlns:bcf="https://sourceforge.net/projects/biblatex">
+  <bcf:bibdata section="0">
+    <bcf:datasource type="file" datatype="bibtex" glob="false">references.bib</bcf:datasource>
+  </bcf:bibdata>
+  <bcf:section number="0">
+    <bcf:citekey order="1" intorder="1">%s</bcf:citekey>
+  </bcf:section>
+</bcf:controlfile>
+"""  # noqa: E501
+
+
+def _tool_calls(calls, tool):
+    return sum(cmd[0] == tool for cmd, _ in calls)
+
+
+def test_biber_is_skipped_if_bibliography_is_unchanged(tmp_path, calls):
+    tmp_path.joinpath("document.tex").write_text("")
+    tmp_path.joinpath("references.bib").write_text("@book{a}")
+    tmp_path.joinpath("document.bcf").write_text(_BCF % "a")
+    context = cs.CompilationContext(cache_dir=tmp_path / "cache")
+    step = cs.biber()
+
+    def run():
+        step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+        return _tool_calls(calls, "biber")
+
+    assert run() == 1
+    assert run() == 1
+
+    tmp_path.joinpath("references.bib").write_text("@book{a}\n@book{b}")
+    assert run() == 2  # noqa: PLR2004
+
+    tmp_path.joinpath("document.bcf").write_text(_BCF % "b")
+    assert run() == 3  # noqa: PLR2004
+
+    tmp_path.joinpath("document.bbl").unlink()
+    assert run() == 4  # noqa: PLR2004
+    assert run() == 4  # noqa: PLR2004
+
+
+def test_bibtex_is_skipped_if_citations_are_unchanged(tmp_path, calls):
+    tmp_path.joinpath("document.tex").write_text("")
+    tmp_path.joinpath("references.bib").write_text("@book{a}")
+    tmp_path.joinpath("document.aux").write_text(
+        "\\relax\n\\citation{a}\n\\@input{chapter.aux}\n"
+        "\\bibstyle{plain}\n\\bibdata{references}\n"
+    )
+    tmp_path.joinpath("chapter.aux").write_text("\\citation{b}\n")
+    context = cs.CompilationContext(cache_dir=tmp_path / "cache")
+    step = cs.bibtex()
+
+    def run():
+        step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+        return _tool_calls(calls, "bibtex")
+
+    assert run() == 1
+    _, kwargs = calls[-1]
+    assert kwargs["env"]["BIBINPUTS"].startswith(str(tmp_path))
+
+    # Changes to other lines, for example, labels, do not matter.
+    with tmp_path.joinpath("document.aux").open("a") as f:
+        f.write("\\newlabel{sec}{{1}{1}}\n")
+    assert run() == 1
+
+    tmp_path.joinpath("chapter.aux").write_text("\\citation{c}\n")
+    assert run() == 2  # noqa: PLR2004
+
+    tmp_path.joinpath("references.bib").write_text("@book{a}\n@book{c}")
+    assert run() == 3  # noqa: PLR2004
+
+
+def _engine_passes(calls, engine="pdflatex"):
+    return sum(cmd[0] == engine and "-ini" not in cmd for cmd, _ in calls)
+
+
+def test_engine_runs_until_document_converged(tmp_path, calls):
+    tmp_path.joinpath("document.tex").write_text("first")
+    context = cs.CompilationContext(cache_dir=tmp_path / "cache")
+    step = cs.pdflatex()
+
+    def run():
+        step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+        return _engine_passes(calls)
+
+    # The first pass creates the .aux file and the second one reads it.
+    assert run() == 2  # noqa: PLR2004
+    assert tmp_path.joinpath("document.pdf").read_text() == "first"
+    cmd, kwargs = calls[-1]
+    assert "-recorder" in cmd
+    assert kwargs["cwd"] == tmp_path
+
+    # Nothing changed.
+    assert run() == 2  # noqa: PLR2004
+
+    tmp_path.joinpath("document.tex").write_text("second")
+    assert run() == 4  # noqa: PLR2004
+
+    # A new bibliography needs one pass since the .aux file does not change.
+    tmp_path.joinpath("document.bbl").write_text("bibliography")
+    assert run() == 5  # noqa: PLR2004
+
+
+def test_file_signature_hashes_files_only_if_their_status_changed(tmp_path):
+    path = tmp_path / "article.cls"
+    path.write_text("class")
+    signature = cs._get_file_signature(path)  # noqa: SLF001
+
+    # Files with the same size and modification time are not read again.
+    path.write_text("other")
+    os.utime(path, ns=(0, 0))
+    previous = cs._get_file_signature(path)  # noqa: SLF001
+    path.write_text("again")
+    os.utime(path, ns=(0, 0))
+    assert cs._get_file_signature(path, previous) == previous  # noqa: SLF001
+
+    # A file which is only touched keeps its content.
+    path.write_text("class")
+    assert cs._has_same_content(path, signature)  # noqa: SLF001
+    path.write_text("changed")
+    assert not cs._has_same_content(path, signature)  # noqa: SLF001
+
+
+@pytest.mark.parametrize("engine", ["lualatex", "xelatex"])
+def test_engine_stops_after_max_passes(tmp_path, calls, engine):
+    tmp_path.joinpath("document.tex").write_text("first")
+    context = cs.CompilationContext(
+        cache_dir=tmp_path / "cache", build_dir=tmp_path / "build"
+    )
+    step = getattr(cs, engine)(max_passes=1, persistent_build_dir=True)
+
+    with pytest.warns(UserWarning, match="did not converge"):
+        step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+
+    assert _engine_passes(calls, engine) == 1
+    assert tmp_path.joinpath("build", "document.aux").exists()
+    assert tmp_path.joinpath("document.pdf").read_text() == "first"
+
+
+def test_engine_with_invalid_max_passes():
+    with pytest.raises(ValueError, match="'max_passes' must be at least 1"):
+        cs.pdflatex(max_passes=0)
+
+
+_RERUN_LOGS = {
+    "LaTeX Warning: Label(s) may have changed. Rerun to get cross-references.": True,
+    "(rerunfilecheck)                Rerun to get outlines right": True,
+    "Package longtable Warning: Table widths have changed. Rerun LaTeX.": True,
+    "Package biblatex Warning: Please rerun LaTeX.": True,
+    "(biblatex)                and rerun LaTeX afterwards.": False,
+    "LaTeX Warning: There were undefined references.": False,
+}
+
+
+@pytest.mark.parametrize(("log", "expected"), _RERUN_LOGS.items())
+def test_detect_rerun_requests_in_log(log, expected):
+    assert (cs._REGEX_RERUN.search(log) is not None) is expected  # noqa: SLF001
+
+
+_FIGURES_DOCUMENT = r"""
+\documentclass{article}
+\usepackage{tikz}
+\begin{document}
+\begin{tikzpicture}\draw (0,0) -- (1,1);\end{tikzpicture}
+\input{chapter}
+\begin{tikzpicture}
+\draw (0,0) circle (%s);
+\end{tikzpicture}
+\end{document}
+"""
+
+
+def _figures(tmp_path):
+    return sorted(tmp_path.joinpath("cache", "figures").glob("figure-*.pdf"))
+
+
+def test_externalize_figures(tmp_path, calls):
+    tmp_path.joinpath("document.tex").write_text(_FIGURES_DOCUMENT % 1)
+    context = cs.CompilationContext(
+        cache_dir=tmp_path / "cache", build_dir=tmp_path / "build"
+    )
+    step = cs.externalize_figures()
+
+    step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+
+    figures = _figures(tmp_path)
+    assert len(figures) == 2  # noqa: PLR2004
+    assert len([cmd for cmd, _ in calls if cmd[0] == "pdflatex"]) == 2  # noqa: PLR2004
+    cmd, _ = calls[-1]
+    assert cmd[0] == "latexmk"
+    assert cmd[-1] == tmp_path.joinpath("build", "document.tex").as_posix()
+
+    copy = tmp_path.joinpath("build", "document.tex").read_text()
+    assert "tikzpicture" not in copy
+    assert "\\input{chapter}" in copy
+    assert f"\\def\\input@path{{{{{tmp_path.as_posix()}/}}}}" in copy
+    for path in figures:
+        assert f"\\includegraphics{{{path.as_posix()}}}" in copy
+
+
+def test_externalize_figures_builds_only_changed_figures(tmp_path, calls):
+    context = cs.CompilationContext(
+        cache_dir=tmp_path / "cache", build_dir=tmp_path / "build"
+    )
+    step = cs.externalize_figures()
+
+    for radius in (1, 2):
+        tmp_path.joinpath("document.tex").write_text(_FIGURES_DOCUMENT % radius)
+        step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+
+    assert len(_figures(tmp_path)) == 3  # noqa: PLR2004
+    assert len([cmd for cmd, _ in calls if cmd[0] == "pdflatex"]) == 3  # noqa: PLR2004
+
+
+@pytest.mark.usefixtures("calls")
+def test_externalize_figures_skips_commented_figures(tmp_path):
+    document = (_FIGURES_DOCUMENT % 1).replace(
+        "\\input{chapter}",
+        "% \\begin{tikzpicture}\\draw (0,0);\\end{tikzpicture}\n50\\% of all",
+    )
+    tmp_path.joinpath("document.tex").write_text(document)
+    context = cs.CompilationContext(
+        cache_dir=tmp_path / "cache", build_dir=tmp_path / "build"
+    )
+    step = cs.externalize_figures()
+
+    step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+
+    assert len(_figures(tmp_path)) == 2  # noqa: PLR2004
+    copy = tmp_path.joinpath("build", "document.tex").read_text()
+    assert "% \\begin{tikzpicture}\\draw (0,0);\\end{tikzpicture}\n50\\%" in copy
+    assert copy.count("\\includegraphics") == 2  # noqa: PLR2004
+
+
+def test_externalize_figures_without_figures(tmp_path, calls):
+    tmp_path.joinpath("document.tex").write_text(_DOCUMENT % "No figures.")
+    context = cs.CompilationContext(cache_dir=tmp_path / "cache")
+    step = cs.externalize_figures()
+
+    step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+
+    ((cmd, _),) = calls
+    assert cmd[0] == "latexmk"
+    assert cmd[-1] == tmp_path.joinpath("document.tex").as_posix()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+def test_externalize_figures_reports_failing_figure(tmp_path, fake_tex):
+    fake_tex.fail = ("figure",)
+    fake_tex.install()
+    tmp_path.joinpath("document.tex").write_text(_FIGURES_DOCUMENT % 1)
+    context = cs.CompilationContext(
+        cache_dir=tmp_path / "cache", build_dir=tmp_path / "build"
+    )
+    step = cs.externalize_figures()
+
+    with pytest.raises(subprocess.CalledProcessError) as exc_info:
+        step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+
+    assert "Undefined control sequence" in exc_info.value.output
+    assert fake_tex.calls("latexmk") == []
+    assert _figures(tmp_path) == []
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+@pytest.mark.parametrize(
+    "bibliography", ["\\bibliography{references}", "\\addbibresource{references.bib}"]
+)
+def test_externalize_figures_finds_bibliography_next_to_document(
+    tmp_path, fake_tex, bibliography
+):
+    document = (_FIGURES_DOCUMENT % 1).replace("\\input{chapter}", bibliography)
+    tmp_path.joinpath("document.tex").write_text(document)
+    tmp_path.joinpath("references.bib").write_text("@book{key, title={Title}}")
+    context = cs.CompilationContext(
+        cache_dir=tmp_path / "cache", build_dir=tmp_path / "build"
+    )
+    step = cs.externalize_figures()
+
+    step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+
+    (call,) = fake_tex.calls("latexmk")
+    assert call["returncode"] == 0
+    assert call["args"][-1] == tmp_path.joinpath("build", "document.tex").as_posix()
+    assert tmp_path.joinpath("document.pdf").exists()
+
+
+_IMAGES_DOCUMENT = r"""
+\documentclass{article}
+\usepackage{graphicx}
+\begin{document}
+\includegraphics[width=\textwidth]{image}
+\includegraphics{diagram}
+\input{chapters/one}
+\end{document}
+"""
+
+
+def _create_images_document(tmp_path):
+    tmp_path.joinpath("document.tex").write_text(_IMAGES_DOCUMENT)
+    tmp_path.joinpath("image.png").write_bytes(b"png")
+    tmp_path.joinpath("diagram.pdf").write_bytes(b"pdf")
+    tmp_path.joinpath("chapters").mkdir()
+    tmp_path.joinpath("chapters", "one.tex").write_text("\\includegraphics{scan.tiff}")
+    tmp_path.joinpath("scan.tiff").write_bytes(b"tiff")
+
+
+def _magick_calls(calls):
+    return [cmd for cmd, _ in calls if cmd[0] == "magick"]
+
+
+def test_preprocess_images(tmp_path, calls):
+    _create_images_document(tmp_path)
+    context = cs.CompilationContext(
+        cache_dir=tmp_path / "cache", build_dir=tmp_path / "build"
+    )
+    step = cs.preprocess_images(dpi=100, max_width=5)
+
+    step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+
+    assert len(_magick_calls(calls)) == 2  # noqa: PLR2004
+    assert "500x500>" in _magick_calls(calls)[0]
+    images = sorted(tmp_path.joinpath("cache", "images").iterdir())
+    assert [path.suffix for path in images] == [".png", ".png"]
+
+    cmd, _ = calls[-1]
+    assert cmd[0] == "latexmk"
+    assert cmd[-1] == tmp_path.joinpath("build", "document.tex").as_posix()
+    copy = tmp_path.joinpath("build", "document.tex").read_text()
+    chapter = tmp_path.joinpath("build", "chapters", "one.tex").read_text()
+    assert "\\includegraphics{diagram}" in copy
+    assert "{image}" not in copy
+    assert "scan.tiff" not in chapter
+    assert all(path.as_posix() in copy + chapter for path in images)
+
+
+@pytest.mark.usefixtures("calls")
+def test_preprocess_images_finds_files_next_to_document(tmp_path):
+    _create_images_document(tmp_path)
+    context = cs.CompilationContext(
+        cache_dir=tmp_path / "cache", build_dir=tmp_path / "build"
+    )
+    path_to_env = tmp_path / "env.txt"
+
+    def compile_document(path_to_tex, path_to_document):  # noqa: ARG001
+        code = "import os, sys; open(sys.argv[1], 'w').write(os.environ['BIBINPUTS'])"
+        run_command([sys.executable, "-c", code, path_to_env.as_posix()])
+
+    step = cs.preprocess_images(compile_document)
+
+    step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+
+    assert str(tmp_path) in path_to_env.read_text().split(os.pathsep)
+
+
+def test_preprocess_images_skips_unchanged_images(tmp_path, calls):
+    _create_images_document(tmp_path)
+    context = cs.CompilationContext(
+        cache_dir=tmp_path / "cache", build_dir=tmp_path / "build"
+    )
+    step = cs.preprocess_images(extension=".jpg")
+
+    step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+    step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+    tmp_path.joinpath("image.png").write_bytes(b"changed")
+    step(tmp_path / "document.tex", tmp_path / "document.pdf", context=context)
+
+    assert len(_magick_calls(calls)) == 3  # noqa: PLR2004
+    images = list(tmp_path.joinpath("cache", "images").iterdir())
+    assert {path.suffix for path in images} == {".jpg"}
+
+
+def _optimize_pdf_calls(calls):
+    return [cmd for cmd, _ in calls if cmd[0] in ("gs", "qpdf")]
+
+
+@pytest.mark.parametrize(
+    ("deduplicate", "programs"), [(True, ["gs", "qpdf"]), (False, ["qpdf"])]
+)
+def test_optimize_pdf(tmp_path, calls, deduplicate, programs):
+    path_to_document = tmp_path / "document.pdf"
+    path_to_document.write_bytes(b"%" * 1000)
+    path_to_metrics = tmp_path / "metrics.jsonl"
+    context = cs.CompilationContext(cache_dir=tmp_path / "cache")
+    step = cs.optimize_pdf(deduplicate=deduplicate)
+
+    with measure_step("task", "optimize_pdf", path_to_document, path_to_metrics):
+        step(tmp_path / "document.tex", path_to_document, context=context)
+
+    assert [cmd[0] for cmd in _optimize_pdf_calls(calls)] == programs
+    assert "--linearize" in _optimize_pdf_calls(calls)[-1]
+    assert path_to_document.stat().st_size == 500  # noqa: PLR2004
+    (metrics,) = read_metrics(path_to_metrics)
+    assert metrics.bytes_saved == 500  # noqa: PLR2004
+
+
+def test_optimize_pdf_reuses_optimized_documents(tmp_path, calls):
+    path_to_document = tmp_path / "document.pdf"
+    path_to_document.write_bytes(b"%" * 1000)
+    context = cs.CompilationContext(cache_dir=tmp_path / "cache")
+    step = cs.optimize_pdf()
+
+    step(tmp_path / "document.tex", path_to_document, context=context)
+    assert len(_optimize_pdf_calls(calls)) == 2  # noqa: PLR2004
+
+    # The optimized document is not optimized again.
+    step(tmp_path / "document.tex", path_to_document, context=context)
+    assert len(_optimize_pdf_calls(calls)) == 2  # noqa: PLR2004
+
+    # The same compiled document is replaced with the cached optimized document.
+    path_to_document.write_bytes(b"%" * 1000)
+    step(tmp_path / "document.tex", path_to_document, context=context)
+    assert len(_optimize_pdf_calls(calls)) == 2  # noqa: PLR2004
+    assert path_to_document.stat().st_size == 500  # noqa: PLR2004
+
+    # A changed document is optimized again.
+    path_to_document.write_bytes(b"%" * 2000)
+    step(tmp_path / "document.tex", path_to_document, context=context)
+    assert len(_optimize_pdf_calls(calls)) == 4  # noqa: PLR2004
+    assert path_to_document.stat().st_size == 1000  # noqa: PLR2004
+
+
+def test_evict_least_recently_used_optimized_documents(tmp_path):
+    for i, name in enumerate(("a", "b", "c")):
+        path = tmp_path.joinpath(f"{name}.pdf")
+        path.write_bytes(b"%" * 5)
+        os.utime(path, ns=(i, i))
+    os.utime(tmp_path / "a.pdf")
+
+    cs._evict_optimized_pdfs(tmp_path, max_size=10)  # noqa: SLF001
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.pdf", "c.pdf"]
+
+
+def test_optimize_pdf_with_invalid_compression_level():
+    with pytest.raises(ValueError, match="'compression_level' must be between"):
+        cs.optimize_pdf(compression_level=10)
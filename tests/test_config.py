@@ -1,8 +1,38 @@
 from __future__ import annotations
 
+import subprocess
+import sys
+
+from pytask import ExitCode
 from pytask import build
 
+from pytask_latex.config import _SCAN_BACKENDS
+from pytask_latex.scanner import ScanBackend
+
 
 def test_marker_is_configured(tmp_path):
     session = build(paths=tmp_path)
     assert "latex" in session.config["markers"]
+
+
+def test_invalid_scan_backend(tmp_path):
+    tmp_path.joinpath("pyproject.toml").write_text(
+        "[tool.pytask.ini_options]\nlatex_scan_backend = 'gpu'"
+    )
+    session = build(paths=tmp_path)
+    assert session.exit_code == ExitCode.CONFIGURATION_FAILED
+
+
+def test_scan_backends_match_scanner():
+    assert tuple(backend.value for backend in ScanBackend) == _SCAN_BACKENDS
+
+
+def test_parsing_the_configuration_does_not_import_the_scanner(tmp_path):
+    code = (
+        "import sys\n"
+        "from pathlib import Path\n"
+        "from pytask_latex.config import pytask_parse_config\n"
+        f"pytask_parse_config({{'markers': {{}}, 'root': Path({str(tmp_path)!r})}})\n"
+        "assert 'pytask_latex.scanner' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)  # noqa: S603
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import sys
+import textwrap
+import time
+
+import pytest
+from pytask import ExitCode
+from pytask import build
+
+from pytask_latex.errors import ErrorWatcher
+from pytask_latex.errors import FatalTeXError
+from pytask_latex.errors import TeXError
+from pytask_latex.metrics import run_command
+
+_OUTPUTS = {
+    "undefined": (
+        (
+            "(./document.tex\n! Undefined control sequence.\n"
+            "<recently read> \\foo\n\nl.3 \\foo\n         bar"
+        ),
+        TeXError("Undefined control sequence.", None, 3),
+    ),
+    "file-line-error": (
+        "(./document.tex\n./chapter.tex:12: Undefined control sequence.\nl.12 \\foo",
+        TeXError("Undefined control sequence.", "./chapter.tex", 12),
+    ),
+    "missing-file": (
+        (
+            "! LaTeX Error: File `missing.sty' not found.\n\nType X to quit.\n\n"
+            "! Emergency stop.\n<read *>"
+        ),
+        TeXError("LaTeX Error: File `missing.sty' not found."),
+    ),
+    "emergency-stop": (
+        "*** (job aborted, no legal \\end found)\n\n! Emergency stop.",
+        TeXError("Emergency stop."),
+    ),
+    "latexmk-missing-file": (
+        "Latexmk: Missing input file 'chapter.tex' (or dependence on it)",
+        TeXError("Latexmk: Missing input file 'chapter.tex' (or dependence on it)"),
+    ),
+}
+
+
+@pytest.mark.parametrize(("output", "expected"), _OUTPUTS.values(), ids=_OUTPUTS)
+def test_error_watcher(output, expected):
+    watcher = ErrorWatcher()
+    stopped = [watcher(line) for line in output.splitlines()]
+    assert any(stopped)
+    assert watcher.error == expected
+
+
+def test_error_watcher_ignores_warnings():
+    watcher = ErrorWatcher()
+    output = (
+        "LaTeX Warning: Reference `fig' on page 1 undefined on input line 5.\n"
+        "Overfull \\hbox (1.2pt too wide) in paragraph at lines 3--4\n"
+        "Output written on document.pdf (1 page, 1024 bytes)."
+    )
+    assert not any(watcher(line) for line in output.splitlines())
+    assert watcher.error is None
+
+
+def test_run_command_terminates_at_fatal_error():
+    code = (
+        "import time; print('! Undefined control sequence.'); print('l.3 \\\\foo', "
+        "flush=True); time.sleep(30)"
+    )
+    start = time.perf_counter()
+    with pytest.raises(FatalTeXError) as exc_info:
+        run_command([sys.executable, "-c", code], watch=ErrorWatcher())
+    assert time.perf_counter() - start < 10  # noqa: PLR2004
+    assert exc_info.value.error == TeXError("Undefined control sequence.", None, 3)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+@pytest.mark.parametrize(
+    "step", ["cs.latexmk(fail_fast=True)", "cs.pdflatex(fail_fast=True)"]
+)
+def test_fail_fast_reports_location(tmp_path, fake_tex, step):
+    fake_tex.fail = ("document",)
+    fake_tex.error_delay = 30
+    fake_tex.install()
+    source = f"""
+    from pytask import mark
+    from pytask_latex import compilation_steps as cs
+
+    @mark.latex(
+        script="document.tex", document="document.pdf", compilation_steps={step}
+    )
+    def task_compile_document():
+        pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(source))
+    tmp_path.joinpath("document.tex").write_text("\\documentclass{report}")
+
+    start = time.perf_counter()
+    session = build(paths=tmp_path)
+
+    assert time.perf_counter() - start < 20  # noqa: PLR2004
+    assert session.exit_code == ExitCode.FAILED
+    exc_info = session.execution_reports[0].exc_info
+    assert exc_info is not None
+    assert "./document.tex:3: Undefined control sequence." in str(exc_info[1])
@@ -1,40 +1,19 @@
 from __future__ import annotations
 
 import textwrap
-from pathlib import Path
 from typing import cast
 
 import pytest
 from pytask import ExitCode
-from pytask import Mark
 from pytask import Skipped
-from pytask import Task
 from pytask import build
 from pytask import cli
 
-from pytask_latex.execute import pytask_execute_task_setup
 from tests.conftest import TEST_RESOURCES
 from tests.conftest import needs_latexmk
 from tests.conftest import skip_on_github_actions_with_win
 
 
-def test_pytask_execute_task_setup(monkeypatch):
-    """Make sure that the task setup raises errors."""
-    # Act like latexmk is installed since we do not test this.
-    monkeypatch.setattr(
-        "pytask_latex.execute.shutil.which",
-        lambda x: None,  # noqa: ARG005
-    )
-    task = Task(
-        base_name="example",
-        path=Path(),
-        function=lambda: None,
-        markers=[Mark("latex", (), {})],
-    )
-    with pytest.raises(RuntimeError, match="latexmk is needed"):
-        pytask_execute_task_setup(task)
-
-
 @needs_latexmk
 @skip_on_github_actions_with_win
 def test_compile_latex_document(runner, tmp_path):
@@ -178,16 +157,14 @@ def test_raise_error_if_latexmk_is_not_found(tmp_path, monkeypatch):
 
     # Hide latexmk if available.
     monkeypatch.setattr(
-        "pytask_latex.execute.shutil.which",
+        "pytask_latex.toolchain.shutil.which",
         lambda x: None,  # noqa: ARG005
     )
 
     session = build(paths=tmp_path)
 
     assert session.exit_code == ExitCode.FAILED
-    assert session.execution_reports is not None
-    execution_reports = cast("list", session.execution_reports)
-    assert isinstance(execution_reports[0].exc_info[1], RuntimeError)
+    assert session.execution_reports == []
 
 
 @skip_on_github_actions_with_win
@@ -213,7 +190,7 @@ def test_skip_even_if_latexmk_is_not_found(tmp_path, monkeypatch):
 
     # Hide latexmk if available.
     monkeypatch.setattr(
-        "pytask_latex.execute.shutil.which",
+        "pytask_latex.toolchain.shutil.which",
         lambda x: None,  # noqa: ARG005
     )
 
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import os
+import sys
+
+import pytest
+
+from pytask_latex import filesystem
+from pytask_latex.filesystem import FileSystemIndex
+from pytask_latex.scanner import IncludeGraph
+
+
+@pytest.fixture
+def count_scandir(monkeypatch):
+    calls = []
+    scandir = os.scandir
+
+    def _scandir(path):
+        calls.append(path)
+        return scandir(path)
+
+    monkeypatch.setattr(filesystem.os, "scandir", _scandir)
+    return calls
+
+
+def test_index_lists_directory_once(tmp_path, count_scandir):
+    tmp_path.joinpath("a.tex").write_text("a")
+    index = FileSystemIndex()
+
+    assert index.exists(tmp_path / "a.tex")
+    assert not index.exists(tmp_path / "b.tex")
+    stat = index.stat(tmp_path / "a.tex")
+    assert stat is not None
+    assert stat.st_mtime_ns == tmp_path.joinpath("a.tex").stat().st_mtime_ns
+    assert index.stat(tmp_path / "b.tex") is None
+    assert index.exists(tmp_path)
+    assert len(count_scandir) == 2  # noqa: PLR2004
+
+
+def test_index_is_a_snapshot(tmp_path):
+    index = FileSystemIndex()
+    assert not index.exists(tmp_path / "a.tex")
+
+    tmp_path.joinpath("a.tex").touch()
+    assert not index.exists(tmp_path / "a.tex")
+
+    index.invalidate(tmp_path / "a.tex")
+    assert index.exists(tmp_path / "a.tex")
+
+
+def test_index_handles_missing_directories(tmp_path):
+    index = FileSystemIndex()
+    assert not index.exists(tmp_path / "missing" / "a.tex")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Symlinks need privileges.")
+def test_resolve_is_equivalent_to_pathlib(tmp_path):
+    tmp_path.joinpath("real").mkdir()
+    tmp_path.joinpath("real", "a.tex").touch()
+    tmp_path.joinpath("link").symlink_to(tmp_path / "real")
+    tmp_path.joinpath("real", "b.tex").symlink_to(tmp_path / "real" / "a.tex")
+    tmp_path.joinpath("broken.tex").symlink_to(tmp_path / "missing.tex")
+
+    index = FileSystemIndex()
+    for path in (
+        tmp_path / "link" / "a.tex",
+        tmp_path / "link" / "missing.tex",
+        tmp_path / "real" / ".." / "link" / "b.tex",
+        tmp_path / "real" / "..",
+    ):
+        assert index.resolve(path) == path.resolve()
+    assert not index.exists(tmp_path / "broken.tex")
+
+
+def test_include_graph_uses_index(tmp_path, count_scandir):
+    tmp_path.joinpath("document.tex").write_text(
+        "\n".join(rf"\includegraphics{{figure_{i}}}" for i in range(100))
+    )
+    graph = IncludeGraph()
+    dependencies = graph.dependencies(tmp_path / "document.tex")
+
+    assert len(dependencies) == 501  # noqa: PLR2004
+    assert count_scandir == [tmp_path]
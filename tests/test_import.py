@@ -0,0 +1,68 @@
+"""Check the cost which the plugin adds to the startup of pytask."""
+
+from __future__ import annotations
+
+import json
+import pkgutil
+import subprocess
+import sys
+
+import pytest
+
+import pytask_latex
+
+# The plugin needs about 10ms without cached bytecode. The budget leaves room for slow
+# machines, but not for importing the modules of optional features at startup.
+_IMPORT_TIME_BUDGET = 0.02
+
+_DEFERRED_MODULES = (
+    "latex_dependency_scanner",
+    "pytask_latex.compilation_steps",
+    "pytask_latex.filesystem",
+    "pytask_latex.scanner",
+)
+
+_PUBLIC_MODULES = sorted(
+    module.name
+    for module in pkgutil.iter_modules(pytask_latex.__path__, "pytask_latex.")
+    if not module.name.rpartition(".")[2].startswith("_")
+)
+
+
+def _run_python(*args: str) -> subprocess.CompletedProcess[str]:
+    return subprocess.run(  # noqa: S603
+        [sys.executable, *args], capture_output=True, text=True, check=True
+    )
+
+
+def test_pytask_startup_defers_heavy_imports():
+    result = _run_python(
+        "-c", "import json, sys, pytask; print(json.dumps(sorted(sys.modules)))"
+    )
+    modules = set(json.loads(result.stdout))
+
+    if "pytask_latex.plugin" not in modules:  # pragma: no cover
+        pytest.skip("pytask-latex is not installed as a plugin.")
+    assert not modules.intersection(_DEFERRED_MODULES)
+
+
+def test_import_time_of_plugin():
+    result = _run_python("-X", "importtime", "-c", "import pytask")
+
+    import_time = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_time, _, name = line.removeprefix("import time:").split("|")
+        if name.strip().startswith(("pytask_latex", "latex_dependency_scanner")):
+            import_time += int(self_time)
+
+    if import_time == 0:  # pragma: no cover
+        pytest.skip("pytask-latex is not installed as a plugin.")
+    assert import_time / 1e6 < _IMPORT_TIME_BUDGET
+
+
+@pytest.mark.parametrize("module", _PUBLIC_MODULES)
+def test_import_module_in_fresh_interpreter(module):
+    """Importing a module first must not fail because pytask loads the plugin."""
+    _run_python("-c", f"import {module}")
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import build
+
+from pytask_latex.logs import OutputLog
+from pytask_latex.logs import capture_output
+from pytask_latex.metrics import run_command
+
+
+def test_output_log_streams_to_file_and_keeps_tail(tmp_path):
+    path_to_log = tmp_path / "task.log"
+    cmd = [sys.executable, "-c", "for i in range(1000): print(f'line {i}')"]
+
+    log = OutputLog(path_to_log, tail_lines=3)
+    with subprocess.Popen(cmd, stdout=subprocess.PIPE) as process:  # noqa: S603
+        tail, stopped = log.stream(cmd, process.stdout)  # ty: ignore[invalid-argument-type]
+
+    assert tail == "line 997\nline 998\nline 999"
+    assert not stopped
+    content = path_to_log.read_text().splitlines()
+    assert content[0].startswith("$ ")
+    assert content[1:] == [f"line {i}" for i in range(1000)]
+
+
+def test_run_command_reports_tail_of_failing_command(tmp_path):
+    path_to_log = tmp_path / "task.log"
+    cmd = [sys.executable, "-c", "import sys; print('! Error'); sys.exit(1)"]
+
+    with (
+        capture_output(path_to_log),
+        pytest.raises(subprocess.CalledProcessError) as exc_info,
+    ):
+        run_command(cmd)
+
+    assert exc_info.value.output == "! Error"
+    assert "! Error" in path_to_log.read_text()
+
+
+def test_run_command_without_capture(capfd):
+    run_command([sys.executable, "-c", "print('hello')"])
+    assert "hello" in capfd.readouterr().out
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+def test_failing_task_shows_tail_and_log(tmp_path, fake_tex):
+    fake_tex.fail = ("document",)
+    fake_tex.output_lines = 100
+    fake_tex.install()
+    source = """
+    from pytask import mark
+
+    @mark.latex(script="document.tex", document="document.pdf")
+    def task_compile_document():
+        pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(source))
+    tmp_path.joinpath("document.tex").write_text("\\documentclass{report}")
+
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.FAILED
+    exc_info = session.execution_reports[0].exc_info
+    assert exc_info is not None
+    message = str(exc_info[1])
+    assert "Undefined control sequence" in message
+    assert "line 0)" not in message
+    path_to_log = next(tmp_path.joinpath(".pytask", "latex", "logs").glob("*.log"))
+    assert str(path_to_log) in message
+    assert "(document.tex line 0)" in path_to_log.read_text()
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import cli
+
+from pytask_latex.metrics import add_search_paths
+from pytask_latex.metrics import measure_step
+from pytask_latex.metrics import read_metrics
+from pytask_latex.metrics import record
+from pytask_latex.metrics import run_command
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Needs os.wait4.")
+def test_measure_step_with_command(tmp_path):
+    path_to_metrics = tmp_path / "metrics.jsonl"
+    path_to_document = tmp_path / "document.pdf"
+    code = (
+        "import pathlib; x = bytearray(100_000_000); "
+        f"pathlib.Path({path_to_document.as_posix()!r}).write_bytes(b'0' * 2048)"
+    )
+
+    with measure_step("task", "step", path_to_document, path_to_metrics):
+        run_command([sys.executable, "-c", code])
+        record(passes=2)
+
+    (metrics,) = read_metrics(path_to_metrics)
+    assert metrics.task == "task"
+    assert metrics.status == "success"
+    assert metrics.n_commands == 1
+    assert metrics.passes == 2  # noqa: PLR2004
+    assert metrics.output_size == 2048  # noqa: PLR2004
+    assert metrics.cpu_time is not None
+    assert metrics.cpu_time > 0
+    assert metrics.peak_rss is not None
+    assert metrics.peak_rss > 100_000_000  # noqa: PLR2004
+    assert metrics.wall_time > 0
+
+
+def test_measure_failing_step(tmp_path):
+    path_to_metrics = tmp_path / "metrics.jsonl"
+
+    with (
+        pytest.raises(subprocess.CalledProcessError),
+        measure_step("task", "step", tmp_path / "document.pdf", path_to_metrics),
+    ):
+        run_command([sys.executable, "-c", "raise SystemExit(1)"])
+
+    (metrics,) = read_metrics(path_to_metrics)
+    assert metrics.status == "failed"
+    assert metrics.output_size is None
+
+
+def test_run_command_with_search_paths(tmp_path, monkeypatch):
+    monkeypatch.setenv("BIBINPUTS", "existing")
+    monkeypatch.delenv("TEXINPUTS", raising=False)
+    path = tmp_path / "env.txt"
+    code = (
+        "import os, sys; open(sys.argv[1], 'w').write("
+        "os.environ['TEXINPUTS'] + '\\n' + os.environ['BIBINPUTS'])"
+    )
+
+    with add_search_paths(tmp_path / "a"), add_search_paths(tmp_path / "b"):
+        run_command([sys.executable, "-c", code, path.as_posix()])
+
+    directories = os.pathsep.join([".", str(tmp_path / "a"), str(tmp_path / "b")])
+    assert path.read_text().splitlines() == [
+        f"{directories}{os.pathsep}",
+        f"{directories}{os.pathsep}existing",
+    ]
+
+
+def test_show_metrics_after_build(runner, tmp_path):
+    task_source = """
+    import sys
+    from pathlib import Path
+    from pytask import mark
+    from pytask_latex.metrics import run_command
+
+    def write_document(path_to_tex, path_to_document):
+        run_command(
+            [sys.executable, "-c", f"open({str(path_to_document)!r}, 'w').write('')"]
+        )
+
+    @mark.latex(
+        script=Path("document.tex"),
+        document=Path("document.pdf"),
+        compilation_steps=write_document,
+    )
+    def task_compile_document():
+        pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(task_source))
+    tmp_path.joinpath("document.tex").write_text("")
+    tmp_path.joinpath("pyproject.toml").write_text(
+        "[tool.pytask.ini_options]\nlatex_metrics = true"
+    )
+    result = runner.invoke(cli, [tmp_path.as_posix()])
+
+    assert result.exit_code == ExitCode.OK
+    assert "Peak RSS" in result.output
+    assert "write_document" in result.output
+    (path_to_metrics,) = tmp_path.joinpath(".pytask", "latex", "metrics").iterdir()
+    (metrics,) = read_metrics(path_to_metrics)
+    assert metrics.task.endswith("task_compile_document")
+    assert metrics.output_size == 0
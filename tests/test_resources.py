@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import sys
+import textwrap
+import threading
+import time
+from contextlib import ExitStack as does_not_raise  # noqa: N813
+
+import pytest
+from pytask import ExitCode
+from pytask import build
+
+from pytask_latex.resources import ResourcePool
+from pytask_latex.resources import parse_resources
+
+try:
+    import pytask_parallel  # noqa: F401
+except ImportError:  # pragma: no cover
+    _IS_PYTASK_PARALLEL_INSTALLED = False
+else:
+    _IS_PYTASK_PARALLEL_INSTALLED = True
+
+
+@pytest.mark.parametrize(
+    ("value", "expectation", "expected"),
+    [
+        (None, does_not_raise(), {}),
+        (
+            {"weight": 2, "memory": 4096},
+            does_not_raise(),
+            {"weight": 2, "memory": 4096},
+        ),
+        ({"cpus": 2}, pytest.raises(ValueError, match="must be a mapping"), None),
+        ({"weight": -1}, pytest.raises(ValueError, match="must be a mapping"), None),
+        ({"memory": "4GB"}, pytest.raises(ValueError, match="must be a mapping"), None),
+        (2, pytest.raises(ValueError, match="must be a mapping"), None),
+    ],
+)
+def test_parse_resources(value, expectation, expected):
+    with expectation:
+        assert parse_resources(value, "resources") == expected
+
+
+def _run_in_threads(pool, demands, duration=0.2):
+    """Hold the demanded resources in threads and return the maximum concurrency."""
+    running = []
+    maximum = []
+    lock = threading.Lock()
+
+    def run(demand):
+        with pool.acquire(demand):
+            with lock:
+                running.append(demand)
+                maximum.append(len(running))
+            time.sleep(duration)
+            with lock:
+                running.remove(demand)
+
+    threads = [threading.Thread(target=run, args=(demand,)) for demand in demands]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return max(maximum)
+
+
+@pytest.mark.parametrize(
+    ("capacity", "demands", "expected"),
+    [
+        ({}, [{}] * 4, 4),
+        ({"weight": 2}, [{}] * 4, 2),
+        ({"weight": 2}, [{"weight": 2}] * 3, 1),
+        ({"memory": 1000}, [{"memory": 400}] * 4, 2),
+        ({"weight": 4, "memory": 1000}, [{"memory": 600}] * 3, 1),
+    ],
+)
+def test_resource_pool_limits_concurrency(tmp_path, capacity, demands, expected):
+    pool = ResourcePool(tmp_path / "pool.json", capacity, poll_interval=0.01)
+    assert _run_in_threads(pool, demands) == expected
+    assert pool.path.read_text() == "{}"
+
+
+def test_resource_pool_ignores_holders_of_dead_processes(tmp_path):
+    pool = ResourcePool(tmp_path / "pool.json", {"weight": 1}, poll_interval=0.01)
+    pool.path.write_text('{"999999999-1-abc": {"weight": 1, "memory": 0}}')
+    with pool.acquire({}):
+        pass
+
+
+def test_demand_exceeding_capacity_fails_at_collection(tmp_path):
+    source = """
+    from pytask import mark
+
+    @mark.latex(
+        script="document.tex", document="document.pdf", resources={"memory": 8000}
+    )
+    def task_compile_document():
+        pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(source))
+    tmp_path.joinpath("document.tex").write_text("\\documentclass{report}")
+
+    session = build(paths=tmp_path, latex_resources={"memory": 4000})
+
+    assert session.exit_code == ExitCode.COLLECTION_FAILED
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+@pytest.mark.skipif(
+    not _IS_PYTASK_PARALLEL_INSTALLED, reason="Tests require pytask-parallel."
+)
+def test_resources_limit_parallel_tasks(tmp_path, fake_tex):
+    fake_tex.latency = 0.5
+    fake_tex.install()
+    source = """
+    from pytask import mark, task
+
+    for i in range(4):
+
+        @task
+        @mark.latex(
+            script=f"document_{i}.tex",
+            document=f"document_{i}.pdf",
+            resources={"memory": 3000},
+        )
+        def task_compile_latex_document():
+            pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(source))
+    for i in range(4):
+        tmp_path.joinpath(f"document_{i}.tex").write_text("\\documentclass{report}")
+
+    session = build(paths=tmp_path, n_workers=4, latex_resources={"memory": 6000})
+
+    assert session.exit_code == ExitCode.OK
+    assert len(fake_tex.calls("latexmk")) == 4  # noqa: PLR2004
+    assert fake_tex.max_concurrency() == 2  # noqa: PLR2004
+    assert not list(tmp_path.joinpath(".pytask", "latex", "resources").iterdir())
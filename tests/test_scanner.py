@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+import os
+import textwrap
+
+import latex_dependency_scanner as lds
+import pytest
+from pytask import ExitCode
+from pytask import build
+from pytask import cli
+
+from pytask_latex.scanner import Include
+from pytask_latex.scanner import IncludeGraph
+from pytask_latex.scanner import ScanBackend
+from pytask_latex.scanner import ScanCache
+from pytask_latex.scanner import parse_includes
+from pytask_latex.scanner import scan
+from pytask_latex.scanner import scan_documents
+
+
+def _create_document(tmp_path):
+    latex_source = r"""
+    \documentclass{report}
+    \usepackage{graphicx}
+    \begin{document}
+    \input{sub/chapter}
+    \includegraphics{image}
+    \import{other/}{section}
+    \bibliography{references,missing}
+    \end{document}
+    """
+    tmp_path.joinpath("document.tex").write_text(textwrap.dedent(latex_source))
+    tmp_path.joinpath("sub").mkdir()
+    tmp_path.joinpath("sub", "chapter.tex").write_text(r"\input{sub/table}")
+    tmp_path.joinpath("sub", "table.tex").write_text("A table.")
+    tmp_path.joinpath("other").mkdir()
+    tmp_path.joinpath("other", "section.tex").write_text(r"\includegraphics{plot}")
+    tmp_path.joinpath("other", "plot.png").touch()
+    tmp_path.joinpath("image.png").touch()
+    tmp_path.joinpath("references.bib").touch()
+    return tmp_path.joinpath("document.tex")
+
+
+def test_parse_includes():
+    text = r"""
+    \usepackage{graphicx}
+    \input{chapter}
+    \subimport{sub/}{a,b}
+    """
+    assert parse_includes(text) == [
+        Include("input", None, ("chapter",)),
+        Include("subimport", "sub/", ("a", "b")),
+    ]
+
+
+def test_scan_is_equivalent_to_latex_dependency_scanner(tmp_path):
+    path = _create_document(tmp_path)
+    assert set(scan(path)) == set(lds.scan(path))
+
+
+def test_scan_with_cycle(tmp_path):
+    tmp_path.joinpath("a.tex").write_text(r"\input{b}")
+    tmp_path.joinpath("b.tex").write_text(r"\input{a}")
+    assert set(scan(tmp_path / "a.tex")) == {tmp_path / "a.tex", tmp_path / "b.tex"}
+
+
+def test_scan_deep_include_tree(tmp_path):
+    for i in range(2_000):
+        tmp_path.joinpath(f"{i}.tex").write_text(rf"\input{{{i + 1}}}")
+    assert len(scan(tmp_path / "0.tex")) == 2_001  # noqa: PLR2004
+
+
+def test_graph_parses_shared_files_once(tmp_path):
+    tmp_path.joinpath("preamble.tex").write_text(r"\input{macros}")
+    tmp_path.joinpath("macros.tex").write_text("")
+    for name in ("a", "b"):
+        tmp_path.joinpath(f"{name}.tex").write_text(r"\input{preamble}")
+
+    graph = IncludeGraph()
+    for name in ("a", "b"):
+        assert graph.dependencies(tmp_path / f"{name}.tex") == [
+            tmp_path / f"{name}.tex",
+            tmp_path / "preamble.tex",
+            tmp_path / "macros.tex",
+        ]
+
+    assert graph.cache.misses == 4  # noqa: PLR2004
+    assert graph.cache.hits == 0
+    assert graph.edges(tmp_path / "preamble.tex") == [
+        (tmp_path / "macros.tex", tmp_path)
+    ]
+
+
+def test_cache_skips_parsing_unchanged_files(tmp_path):
+    path = _create_document(tmp_path)
+    cache = ScanCache(path=tmp_path / "cache.json")
+    scan(path, cache)
+    cache.save()
+    assert cache.misses == 4  # noqa: PLR2004
+
+    # Pretend the files were written a while ago to avoid verifying the hashes.
+    for file in tmp_path.rglob("*.tex"):
+        os.utime(file, ns=(0, 0))
+
+    cache = ScanCache(path=tmp_path / "cache.json")
+    cache.load()
+    expected = scan(path, cache)
+    cache.save()
+
+    cache = ScanCache(path=tmp_path / "cache.json")
+    cache.load()
+    assert scan(path, cache) == expected
+    assert cache.hits == 4  # noqa: PLR2004
+    assert cache.misses == 0
+
+
+def test_cache_is_not_written_if_no_file_was_parsed(tmp_path):
+    path = _create_document(tmp_path)
+    for file in tmp_path.rglob("*.tex"):
+        os.utime(file, ns=(0, 0))
+    cache = ScanCache(path=tmp_path / "cache.json")
+    scan(path, cache)
+    cache.save()
+    os.utime(tmp_path / "cache.json", ns=(0, 0))
+
+    cache = ScanCache(path=tmp_path / "cache.json")
+    cache.load()
+    scan(path, cache)
+    cache.save()
+
+    assert tmp_path.joinpath("cache.json").stat().st_mtime_ns == 0
+
+
+def test_cache_detects_changed_files(tmp_path):
+    path = _create_document(tmp_path)
+    cache = ScanCache()
+    scan(path, cache)
+
+    tmp_path.joinpath("sub", "chapter.tex").write_text(r"\input{sub/other}")
+    tmp_path.joinpath("sub", "other.tex").write_text("Other.")
+    result = scan(path, cache)
+
+    assert tmp_path.joinpath("sub", "other.tex") in result
+    assert tmp_path.joinpath("sub", "table.tex") not in result
+
+
+def test_graph_invalidates_only_affected_edges(tmp_path):
+    path = _create_document(tmp_path)
+    graph = IncludeGraph()
+    graph.dependencies(path)
+    section = (tmp_path / "other" / "section.tex", tmp_path)
+    edges_of_section = graph.edges(*section)
+
+    # A changed file and the files trying to include a created file are resolved again.
+    tmp_path.joinpath("sub", "table.tex").write_text(r"\input{sub/new}")
+    tmp_path.joinpath("missing.bib").touch()
+    graph.invalidate({tmp_path / "sub" / "table.tex", tmp_path / "missing.bib"})
+
+    assert graph.files == {tmp_path / "sub" / "chapter.tex", section[0]}
+    assert graph.edges(*section) is edges_of_section
+    dependencies = graph.dependencies(path)
+    assert tmp_path / "sub" / "new.tex" in dependencies
+    assert tmp_path / "missing.bib" in dependencies
+    assert tmp_path / "missing.bib" in graph.targets
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path):
+    for name in ("a", "b", "c"):
+        tmp_path.joinpath(f"{name}.tex").write_text(name)
+
+    cache = ScanCache(path=tmp_path / "cache.json", max_entries=2)
+    for name in ("a", "b", "c", "a"):
+        cache.get_includes(tmp_path / f"{name}.tex")
+    cache.save()
+
+    cache = ScanCache(path=tmp_path / "cache.json", max_entries=2)
+    cache.load()
+    assert len(cache) == 2  # noqa: PLR2004
+    cache.get_includes(tmp_path / "b.tex")
+    assert cache.misses == 1
+
+
+@pytest.mark.parametrize("content", ["", "{", '{"version": 0}'])
+def test_load_broken_cache(tmp_path, content):
+    tmp_path.joinpath("cache.json").write_text(content)
+    cache = ScanCache(path=tmp_path / "cache.json")
+    cache.load()
+    assert len(cache) == 0
+
+
+def test_scan_cache_is_persisted_and_cleared(runner, tmp_path):
+    task_source = """
+    from pathlib import Path
+    from pytask import mark
+
+    @mark.skip
+    @mark.latex(script=Path("document.tex"), document=Path("document.pdf"))
+    def task_compile_document():
+        pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(task_source))
+    _create_document(tmp_path)
+
+    session = build(paths=tmp_path)
+    assert session.exit_code == ExitCode.OK
+    path_to_cache = tmp_path / ".pytask" / "latex" / "scan_cache.json"
+    assert path_to_cache.exists()
+
+    tmp_path.joinpath(".pytask", "latex", "stale").touch()
+    result = runner.invoke(cli, [tmp_path.as_posix(), "--clear-latex-cache"])
+    assert result.exit_code == ExitCode.OK
+    assert not tmp_path.joinpath(".pytask", "latex", "stale").exists()
+    assert path_to_cache.exists()
+
+
+@pytest.mark.parametrize("backend", list(ScanBackend))
+def test_scan_documents_with_backends(tmp_path, backend):
+    path = _create_document(tmp_path)
+    tmp_path.joinpath("other.tex").write_text(r"\input{sub/table}")
+    tmp_path.joinpath("broken.tex").write_bytes(b"\xff")
+    paths = [path, tmp_path / "other.tex", path, tmp_path / "broken.tex"]
+
+    cache = ScanCache(path=tmp_path / "cache.json")
+    graph = IncludeGraph(cache)
+    results = scan_documents(paths, graph, backend=backend, n_workers=2)
+
+    assert list(results) == [path, tmp_path / "other.tex", tmp_path / "broken.tex"]
+    assert results[path] == scan(path)
+    assert results[tmp_path / "other.tex"] == scan(tmp_path / "other.tex")
+    assert isinstance(results[tmp_path / "broken.tex"], UnicodeDecodeError)
+    assert len(cache) == 5  # noqa: PLR2004
+    assert tmp_path / "other.tex" in graph.files
+
+
+@pytest.mark.parametrize("backend", ["threads", "processes"])
+def test_warn_per_task_if_scan_fails(tmp_path, backend):
+    task_source = """
+    from pathlib import Path
+    from pytask import mark, task
+
+    for name in ("document", "broken"):
+
+        @task(id=name)
+        @mark.skip
+        @mark.latex(script=Path(f"{name}.tex"), document=Path(f"{name}.pdf"))
+        def task_compile_document():
+            pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(task_source))
+    _create_document(tmp_path)
+    tmp_path.joinpath("broken.tex").write_bytes(b"\xff")
+    tmp_path.joinpath("pyproject.toml").write_text(
+        f"[tool.pytask.ini_options]\nlatex_scan_backend = {backend!r}\n"
+        "latex_scan_workers = 2"
+    )
+
+    session = build(paths=tmp_path)
+
+    assert session.exit_code == ExitCode.OK
+    assert len(session.tasks) == 2  # noqa: PLR2004
+    messages = [report.message for report in session.warnings]
+    assert sum("failed to scan" in message for message in messages) == 1
+
+    graph = session.config["latex_include_graph"]
+    assert tmp_path / "document.tex" in graph.files
+    assert tmp_path / "sub" / "table.tex" in graph.files
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import os
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import TaskOutcome
+from pytask import build
+
+from pytask_latex import compilation_steps as cs
+from pytask_latex.store import OutputStore
+from pytask_latex.store import fingerprint_step
+
+_TASK_SOURCE = """
+from pathlib import Path
+from pytask import mark
+
+def copy_tex(path_to_tex, path_to_document):
+    with Path(__file__).parent.joinpath("runs.txt").open("a") as f:
+        f.write("run\\n")
+    path_to_document.write_text(path_to_tex.read_text())
+
+@mark.latex(
+    script=Path("document.tex"),
+    document=Path("document.pdf"),
+    compilation_steps=copy_tex,
+)
+def task_compile_document():
+    pass
+"""
+
+
+@pytest.fixture
+def project(tmp_path):
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(_TASK_SOURCE))
+    tmp_path.joinpath("pyproject.toml").write_text(
+        "[tool.pytask.ini_options]\nlatex_output_cache = true"
+    )
+    return tmp_path
+
+
+def test_restore_document_from_output_cache(project):
+    project.joinpath("document.tex").write_text("first")
+    session = build(paths=project)
+    assert session.exit_code == ExitCode.OK
+    assert session.config["latex_output_store"].misses == 1
+
+    project.joinpath("document.tex").write_text("second")
+    session = build(paths=project)
+    assert session.exit_code == ExitCode.OK
+    assert project.joinpath("document.pdf").read_text() == "second"
+
+    # Like switching back to a branch.
+    project.joinpath("document.tex").write_text("first")
+    session = build(paths=project)
+
+    assert session.exit_code == ExitCode.OK
+    assert session.execution_reports[0].outcome == TaskOutcome.PERSISTENCE
+    assert session.config["latex_output_store"].hits == 1
+    assert project.joinpath("document.pdf").read_text() == "first"
+    assert project.joinpath("runs.txt").read_text().count("run") == 2  # noqa: PLR2004
+
+    session = build(paths=project)
+    assert session.execution_reports[0].outcome == TaskOutcome.SKIP_UNCHANGED
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "outcome", "expected"),
+    [
+        ({"dry_run": True}, TaskOutcome.WOULD_BE_EXECUTED, "second"),
+        ({"force": True}, TaskOutcome.SUCCESS, "first"),
+    ],
+)
+def test_output_cache_is_not_used_for_dry_runs_and_forced_runs(
+    project, kwargs, outcome, expected
+):
+    for content in ("first", "second"):
+        project.joinpath("document.tex").write_text(content)
+        assert build(paths=project).exit_code == ExitCode.OK
+    runs = project.joinpath("runs.txt").read_text()
+
+    project.joinpath("document.tex").write_text("first")
+    session = build(paths=project, **kwargs)
+
+    assert session.exit_code == ExitCode.OK
+    assert session.execution_reports[0].outcome == outcome
+    assert project.joinpath("document.pdf").read_text() == expected
+    assert session.config["latex_output_store"].hits == 0
+    compiled = project.joinpath("runs.txt").read_text() != runs
+    assert compiled == kwargs.get("force", False)
+
+
+def test_output_cache_is_disabled_by_default(project):
+    project.joinpath("pyproject.toml").unlink()
+    project.joinpath("document.tex").write_text("first")
+    session = build(paths=project)
+    assert session.exit_code == ExitCode.OK
+    assert "latex_output_store" not in session.config
+    assert not project.joinpath(".pytask", "latex", "outputs").exists()
+
+
+def test_evict_least_recently_used_entries(tmp_path):
+    store = OutputStore(tmp_path / "outputs", max_size=10, root=tmp_path)
+    for i, name in enumerate(("a", "b", "c")):
+        tmp_path.joinpath(f"{name}.tex").write_text(name)
+        tmp_path.joinpath(f"{name}.pdf").write_text("12345")
+        key = store.compute_key(name, [tmp_path / f"{name}.tex"], [], [])
+        store.save(name, [tmp_path / f"{name}.pdf"])
+        assert key is not None
+        os.utime(store.path / key, ns=(i, i))
+
+    # Use the oldest entry to keep it.
+    store.compute_key("a", [tmp_path / "a.tex"], [], [])
+    assert store.restore("a", [tmp_path / "a.pdf"])
+    store.evict()
+
+    for name, expected in (("a", True), ("b", False), ("c", True)):
+        store.compute_key(name, [tmp_path / f"{name}.tex"], [], [])
+        assert store.restore(name, [tmp_path / f"{name}.pdf"]) is expected
+
+
+def test_fingerprint_depends_on_options():
+    assert fingerprint_step(cs.latexmk()) == fingerprint_step(cs.latexmk())
+    assert fingerprint_step(cs.latexmk()) != fingerprint_step(
+        cs.latexmk(options="--dvi")
+    )
+    assert fingerprint_step(cs.latexmk()) != fingerprint_step(cs.precompiled_preamble())
+
+
+def _create_step(source):
+    namespace = {}
+    exec(textwrap.dedent(source), namespace)  # noqa: S102
+    return namespace["step"]
+
+
+@pytest.mark.parametrize(
+    ("source", "other_source"),
+    [
+        pytest.param(
+            "def step(path_to_tex, path_to_document): print('a')",
+            "def step(path_to_tex, path_to_document): print('b')",
+            id="constants",
+        ),
+        pytest.param(
+            "def step(path_to_tex, path_to_document): return lambda: 'a'",
+            "def step(path_to_tex, path_to_document): return lambda: 'b'",
+            id="constants of nested code",
+        ),
+        pytest.param(
+            "def step(path_to_tex, path_to_document, engine='a'): pass",
+            "def step(path_to_tex, path_to_document, engine='b'): pass",
+            id="defaults",
+        ),
+        pytest.param(
+            "def step(path_to_tex, path_to_document, *, engine='a'): pass",
+            "def step(path_to_tex, path_to_document, *, engine='b'): pass",
+            id="keyword defaults",
+        ),
+    ],
+)
+def test_fingerprint_depends_on_code_and_defaults(source, other_source):
+    assert fingerprint_step(_create_step(source)) == fingerprint_step(
+        _create_step(source)
+    )
+    assert fingerprint_step(_create_step(source)) != fingerprint_step(
+        _create_step(other_source)
+    )
+
+
+def test_fingerprint_serializes_closures_stably():
+    def create_step(value):
+        def step(path_to_tex, path_to_document):  # noqa: ARG001
+            return value
+
+        return step
+
+    value = {"b": [1, 2.0], "a": (None, True, "x")}
+    assert fingerprint_step(create_step(value)) == fingerprint_step(
+        create_step(dict(reversed(value.items())))
+    )
+    assert fingerprint_step(create_step(value)) != fingerprint_step(
+        create_step({"b": [1, 2.0], "a": (None, True, "y")})
+    )
+    assert fingerprint_step(create_step(object())) is None
+    assert fingerprint_step(create_step({"a": [object()]})) is None
+
+
+def test_do_not_cache_steps_which_cannot_be_fingerprinted(tmp_path):
+    def create_step(value):
+        def step(path_to_tex, path_to_document):  # noqa: ARG001
+            return value
+
+        return step
+
+    store = OutputStore(tmp_path / "outputs", max_size=1024, root=tmp_path)
+    tmp_path.joinpath("document.tex").write_text("a")
+    tmp_path.joinpath("document.pdf").write_text("a")
+
+    key = store.compute_key(
+        "task", [tmp_path / "document.tex"], [], [create_step(object())]
+    )
+    store.save("task", [tmp_path / "document.pdf"])
+
+    assert key is None
+    assert not store.path.exists()
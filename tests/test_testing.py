@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import sys
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import cli
+
+try:
+    import pytask_parallel  # noqa: F401
+except ImportError:  # pragma: no cover
+    _IS_PYTASK_PARALLEL_INSTALLED = False
+else:
+    _IS_PYTASK_PARALLEL_INSTALLED = True
+
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="The fake toolchain uses shell scripts."
+)
+
+LATEX_SOURCE = r"""
+\documentclass{report}
+\begin{document}
+Ain't no sunshine.
+\end{document}
+"""
+
+
+def _write_tasks(tmp_path, n_tasks, compilation_steps="cs.latexmk()"):
+    source = f"""
+    from pytask import mark, task
+    from pytask_latex import compilation_steps as cs
+
+    for i in range({n_tasks}):
+
+        @task
+        @mark.latex(
+            script=f"document_{{i}}.tex",
+            document=f"document_{{i}}.pdf",
+            compilation_steps={compilation_steps},
+        )
+        def task_compile_latex_document():
+            pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(source))
+    for i in range(n_tasks):
+        tmp_path.joinpath(f"document_{i}.tex").write_text(LATEX_SOURCE)
+
+
+def test_compile_with_latexmk(runner, tmp_path, fake_tex):
+    fake_tex.passes = 2
+    fake_tex.install()
+    _write_tasks(tmp_path, 1)
+
+    result = runner.invoke(cli, [tmp_path.as_posix()])
+
+    assert result.exit_code == ExitCode.OK
+    assert tmp_path.joinpath("document_0.pdf").exists()
+    calls = fake_tex.calls("latexmk")
+    assert len(calls) == 1
+    assert calls[0]["returncode"] == 0
+
+
+def test_compile_with_engine_until_convergence(runner, tmp_path, fake_tex):
+    fake_tex.passes = 3
+    fake_tex.install()
+    _write_tasks(tmp_path, 1, "cs.pdflatex()")
+
+    result = runner.invoke(cli, [tmp_path.as_posix()])
+
+    assert result.exit_code == ExitCode.OK
+    assert tmp_path.joinpath("document_0.pdf").exists()
+    # The last pass confirms that the .aux file did not change anymore.
+    assert len(fake_tex.calls("pdflatex")) == 4  # noqa: PLR2004
+
+
+def test_compile_fails(runner, tmp_path, fake_tex):
+    fake_tex.fail = ("document_1",)
+    fake_tex.install()
+    _write_tasks(tmp_path, 2)
+
+    result = runner.invoke(cli, [tmp_path.as_posix()])
+
+    assert result.exit_code == ExitCode.FAILED
+    assert tmp_path.joinpath("document_0.pdf").exists()
+    assert not tmp_path.joinpath("document_1.pdf").exists()
+    assert sorted(c["returncode"] for c in fake_tex.calls("latexmk")) == [0, 12]
+
+
+@pytest.mark.skipif(
+    not _IS_PYTASK_PARALLEL_INSTALLED, reason="Tests require pytask-parallel."
+)
+def test_compile_in_parallel(runner, tmp_path, fake_tex):
+    fake_tex.latency = 0.5
+    fake_tex.install()
+    _write_tasks(tmp_path, 4)
+
+    result = runner.invoke(cli, [tmp_path.as_posix(), "-n", 2])
+
+    assert result.exit_code == ExitCode.OK
+    assert len(fake_tex.calls("latexmk")) == 4  # noqa: PLR2004
+    assert fake_tex.max_concurrency() == 2  # noqa: PLR2004
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import sys
+import textwrap
+
+import pytest
+from pytask import ExitCode
+from pytask import cli
+
+from pytask_latex import compilation_steps as cs
+from pytask_latex.toolchain import Toolchain
+from pytask_latex.toolchain import get_executables
+
+
+@pytest.mark.parametrize(
+    ("step", "expected"),
+    [
+        (cs.latexmk(), ("latexmk", "pdflatex")),
+        (
+            cs.latexmk(options=("--xelatex", "--interaction=nonstopmode")),
+            ("latexmk", "xelatex"),
+        ),
+        (cs.lualatex(), ("lualatex",)),
+        (cs.externalize_figures(), ("latexmk", "pdflatex")),
+        (cs.preprocess_images(), ("latexmk", "pdflatex", "magick")),
+        (
+            cs.externalize_figures(cs.xelatex(), engine="lualatex"),
+            ("xelatex", "lualatex"),
+        ),
+        (cs.optimize_pdf(), ("gs", "qpdf")),
+        (cs.optimize_pdf(deduplicate=False), ("qpdf",)),
+        (cs.biber(), ("biber",)),
+        (cs.bibtex(), ("bibtex",)),
+        (lambda path_to_tex, path_to_document: None, ()),  # noqa: ARG005
+    ],
+)
+def test_get_executables(step, expected):
+    assert get_executables(step) == expected
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+def test_resolve_programs_once(fake_tex, monkeypatch):
+    toolchain = Toolchain()
+
+    missing = toolchain.resolve(["latexmk", "pdflatex", "missing-program"])
+
+    assert missing == ["missing-program"]
+    assert toolchain.path("latexmk") == (fake_tex.directory / "latexmk").as_posix()
+    assert toolchain.version("latexmk") == "latexmk (fake TeX toolchain)"
+    assert toolchain.path("biber") == "biber"
+    assert toolchain.version("biber") is None
+
+    # Resolved programs are not looked up again.
+    monkeypatch.setattr("pytask_latex.toolchain.shutil.which", lambda x: None)  # noqa: ARG005
+    assert toolchain.resolve(["latexmk", "pdflatex"]) == []
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+def test_missing_program_fails_before_execution(runner, tmp_path, fake_tex):
+    fake_tex.directory.joinpath("biber").unlink()
+    source = """
+    from pytask import mark
+    from pytask_latex import compilation_steps as cs
+
+    @mark.latex(script="document.tex", document="document.pdf")
+    def task_compile_document():
+        pass
+
+    @mark.latex(
+        script="document_w_bib.tex",
+        document="document_w_bib.pdf",
+        compilation_steps=[cs.pdflatex(), cs.biber(), cs.pdflatex()],
+    )
+    def task_compile_document_w_bib():
+        pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(source))
+    tmp_path.joinpath("document.tex").write_text("\\documentclass{report}")
+    tmp_path.joinpath("document_w_bib.tex").write_text("\\documentclass{report}")
+
+    result = runner.invoke(cli, [tmp_path.as_posix()])
+
+    assert result.exit_code == ExitCode.FAILED
+    assert "- biber, needed by task_dummy.py::task_compile_document_w_bib" in (
+        result.output
+    )
+    assert fake_tex.calls("latexmk") == []
+    assert fake_tex.calls("pdflatex") == []
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+@pytest.mark.parametrize(
+    ("decorator", "args"),
+    [
+        ("@mark.skip", []),
+        ('@mark.skipif(True, reason="No TeX.")', []),
+        ("", ["--dry-run"]),
+    ],
+)
+def test_skipped_tasks_and_dry_runs_do_not_need_programs(
+    runner, tmp_path, fake_tex, decorator, args
+):
+    source = f"""
+    from pytask import mark
+
+    {decorator}
+    @mark.latex(script="document.tex", document="document.pdf")
+    def task_compile_document():
+        pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(source))
+    tmp_path.joinpath("document.tex").write_text("\\documentclass{report}")
+    fake_tex.directory.joinpath("latexmk").unlink()
+
+    result = runner.invoke(cli, [tmp_path.as_posix(), *args])
+
+    assert result.exit_code == ExitCode.OK
+    assert "not found on your PATH" not in result.output
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+def test_steps_call_resolved_programs(runner, tmp_path, fake_tex):
+    source = """
+    from pytask import mark
+
+    @mark.latex(script="document.tex", document="document.pdf")
+    def task_compile_document():
+        pass
+    """
+    tmp_path.joinpath("task_dummy.py").write_text(textwrap.dedent(source))
+    tmp_path.joinpath("document.tex").write_text("\\documentclass{report}")
+    log = tmp_path.joinpath(".pytask", "latex", "logs")
+
+    result = runner.invoke(cli, [tmp_path.as_posix()])
+
+    assert result.exit_code == ExitCode.OK
+    assert len(fake_tex.calls("latexmk")) == 1
+    (path_to_log,) = log.iterdir()
+    assert f"$ {fake_tex.directory / 'latexmk'}" in path_to_log.read_text()
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import sys
+import textwrap
+import threading
+import time
+from pathlib import Path
+
+import pytest
+from pytask import ExitCode
+from pytask import build
+
+from pytask_latex.collect import update_dag
+from pytask_latex.watch import InotifyWatcher
+from pytask_latex.watch import PollingWatcher
+
+_TASK_SOURCE = """
+from pathlib import Path
+from pytask import mark
+
+@mark.latex(script=Path("a.tex"), document=Path("bld/a.pdf"))
+def task_compile_a():
+    pass
+
+@mark.latex(script=Path("b.tex"), document=Path("bld/b.pdf"))
+def task_compile_b():
+    pass
+"""
+
+
+class FakeWatcher:
+    """A watcher which applies changes instead of waiting for them."""
+
+    def __init__(self, changes):
+        self.changes = list(changes)
+        self.paths = []
+
+    def wait(self, paths):
+        self.paths.append(paths)
+        if not self.changes:
+            raise KeyboardInterrupt
+        change = self.changes.pop(0)
+        return change()
+
+    def close(self):
+        pass
+
+
+def _write(path, text):
+    def change():
+        path.write_text(text)
+        return {path}
+
+    return change
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+def test_watch_executes_only_affected_tasks(tmp_path, fake_tex, monkeypatch):
+    tmp_path.joinpath("task_documents.py").write_text(textwrap.dedent(_TASK_SOURCE))
+    tmp_path.joinpath("a.tex").write_text("\\documentclass{report}")
+    tmp_path.joinpath("b.tex").write_text("\\documentclass{report}\\input{chapter}")
+    tmp_path.joinpath("chapter.tex").write_text("Chapter")
+    watcher = FakeWatcher(
+        [
+            _write(tmp_path / "chapter.tex", "Changed chapter"),
+            # A new file is included and the dependencies of a are updated.
+            _write(tmp_path / "a.tex", "\\documentclass{report}\\input{new}"),
+            _write(tmp_path / "new.tex", "New"),
+        ]
+    )
+    monkeypatch.setattr("pytask_latex.watch.create_watcher", lambda: watcher)
+
+    session = build(paths=tmp_path, watch_latex=True)
+
+    assert session.exit_code == ExitCode.OK
+    compiled = [
+        Path(next(arg for arg in call["args"] if arg.endswith(".tex"))).name
+        for call in fake_tex.calls("latexmk")
+    ]
+    assert sorted(compiled[:2]) == ["a.tex", "b.tex"]
+    assert compiled[2:] == ["b.tex", "a.tex", "a.tex"]
+    assert tmp_path / "chapter.tex" in watcher.paths[0]
+    assert tmp_path / "new.tex" in watcher.paths[2]
+    assert tmp_path / "bld" / "a.pdf" not in watcher.paths[0]
+    (report,) = session.execution_reports
+    assert report.task.name.endswith("task_compile_a")
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+def test_watch_removes_dependencies_which_are_not_included_anymore(
+    tmp_path, fake_tex, monkeypatch
+):
+    tmp_path.joinpath("task_documents.py").write_text(textwrap.dedent(_TASK_SOURCE))
+    tmp_path.joinpath("a.tex").write_text("\\documentclass{report}")
+    tmp_path.joinpath("b.tex").write_text("\\documentclass{report}\\input{chapter}")
+    tmp_path.joinpath("chapter.tex").write_text("Chapter")
+    watcher = FakeWatcher(
+        [
+            _write(tmp_path / "b.tex", "\\documentclass{report}"),
+            _write(tmp_path / "chapter.tex", "Changed chapter"),
+        ]
+    )
+    monkeypatch.setattr("pytask_latex.watch.create_watcher", lambda: watcher)
+
+    session = build(paths=tmp_path, watch_latex=True)
+
+    assert session.exit_code == ExitCode.OK
+    compiled = [
+        Path(next(arg for arg in call["args"] if arg.endswith(".tex"))).name
+        for call in fake_tex.calls("latexmk")
+    ]
+    assert compiled[2:] == ["b.tex"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+def test_watch_does_not_skip_tasks_because_of_earlier_failures(
+    tmp_path, fake_tex, monkeypatch
+):
+    source = """
+    from pathlib import Path
+    from pytask import mark
+
+    @mark.latex(script=Path("a.tex"), document=Path("bld/a.pdf"))
+    def task_compile_a():
+        pass
+
+    def task_copy(
+        path: Path = Path("bld/a.pdf"), produces: Path = Path("bld/copy.pdf")
+    ) -> None:
+        produces.write_bytes(path.read_bytes())
+    """
+    tmp_path.joinpath("task_documents.py").write_text(textwrap.dedent(source))
+    tmp_path.joinpath("a.tex").write_text("\\documentclass{report}")
+    fake_tex.fail = ("a",)
+    fake_tex.install()
+
+    def fix():
+        fake_tex.fail = ()
+        fake_tex.install()
+        return _write(tmp_path / "a.tex", "\\documentclass{report}Fixed")()
+
+    watcher = FakeWatcher([fix])
+    monkeypatch.setattr("pytask_latex.watch.create_watcher", lambda: watcher)
+
+    session = build(paths=tmp_path, watch_latex=True)
+
+    assert session.exit_code == ExitCode.OK
+    assert tmp_path.joinpath("bld", "copy.pdf").exists()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Uses the fake TeX toolchain.")
+@pytest.mark.usefixtures("fake_tex")
+def test_watch_continues_after_errors(tmp_path, monkeypatch):
+    tmp_path.joinpath("task_documents.py").write_text(textwrap.dedent(_TASK_SOURCE))
+    tmp_path.joinpath("a.tex").write_text("\\documentclass{report}")
+    tmp_path.joinpath("b.tex").write_text("\\documentclass{report}")
+    watcher = FakeWatcher(
+        [
+            _write(tmp_path / "a.tex", "\\documentclass{report}Changed"),
+            _write(tmp_path / "b.tex", "\\documentclass{report}Changed"),
+        ]
+    )
+    monkeypatch.setattr("pytask_latex.watch.create_watcher", lambda: watcher)
+    errors = [RuntimeError("Broken DAG.")]
+
+    def _update_dag(session, task, previous):
+        if errors:
+            raise errors.pop()
+        update_dag(session, task, previous)
+
+    monkeypatch.setattr("pytask_latex.collect.update_dag", _update_dag)
+
+    session = build(paths=tmp_path, watch_latex=True)
+
+    assert session.exit_code == ExitCode.OK
+    assert not watcher.changes
+    (report,) = session.execution_reports
+    assert report.task.name.endswith("task_compile_b")
+
+
+def test_polling_watcher_detects_changes(tmp_path):
+    path = tmp_path / "document.tex"
+    path.write_text("")
+    watcher = PollingWatcher(interval=0.01)
+    timer = threading.Timer(0.05, lambda: path.write_text("changed"))
+
+    timer.start()
+    assert watcher.wait({path, tmp_path / "missing.tex"}) == {path}
+    timer.join()
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="inotify is only on Linux.")
+def test_inotify_watcher_detects_changes(tmp_path):
+    path = tmp_path / "document.tex"
+    path.write_text("")
+    watcher = InotifyWatcher()
+
+    def change():
+        tmp_path.joinpath("document.pdf").write_text("ignored")
+        time.sleep(0.01)
+        path.write_text("changed")
+
+    timer = threading.Timer(0.05, change)
+    timer.start()
+    try:
+        assert watcher.wait({path}) == {path}
+    finally:
+        timer.join()
+        watcher.close()